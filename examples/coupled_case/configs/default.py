@@ -9,6 +9,15 @@ def get_config():
 
     config.mode = "train"
 
+    # Sampler
+    config.sampler = sampler = ml_collections.ConfigDict()
+    sampler.sampler_name = "uniform" # "uniform" or "rad" (residual-based adaptive sampling)
+    sampler.resample_every_steps = 1000
+    sampler.num_rad_points = 100_000
+    sampler.pool = "sobol"
+    sampler.c = 1
+    sampler.k = 1
+
     # Weights & Biases
     config.wandb = wandb = ml_collections.ConfigDict()
     wandb.project = "PINN-Coupled-case"
@@ -61,6 +70,9 @@ def get_config():
     weighting.use_causal = True
     weighting.causal_tol = 1.0
     weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
 
     # Logging
     config.logging = logging = ml_collections.ConfigDict()
@@ -76,6 +88,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = 10000
     saving.num_keep_ckpts = 10
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 2
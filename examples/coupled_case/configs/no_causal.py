@@ -58,6 +58,9 @@ def get_config():
     weighting.use_causal = False
     weighting.causal_tol = 1.0
     weighting.num_chunks = 16
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
 
     # Logging
     config.logging = logging = ml_collections.ConfigDict()
@@ -73,6 +76,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = None
     saving.num_keep_ckpts = 10
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 2
@@ -4,8 +4,9 @@ import jax.numpy as jnp
 from jax import lax, jit, grad, vmap
 
 from jaxpi.models import ForwardIVP
+from jaxpi.derivatives import fields, grid_derivs
 from jaxpi.evaluator import BaseEvaluator
-from jaxpi.utils import ntk_fn, flatten_pytree
+from jaxpi.utils import diag_ntk_fn, flatten_pytree
 
 from matplotlib import pyplot as plt
 
@@ -45,11 +46,23 @@ class CoupledCase(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))
-        self.n_pred_fn = vmap(vmap(self.scaled_n_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0))
+    def u_pred_fn(self, params, *args):
+        if self.separable:
+            u, _ = self.field_grid(params, *args)
+            return u
+        return vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))(params, *args)
 
+    def n_pred_fn(self, params, *args):
+        if self.separable:
+            _, n = self.field_grid(params, *args)
+            return self.n_scale * n
+        return vmap(vmap(self.scaled_n_net, (None, None, 0)), (None, 0, None))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        # Residuals at the collocation points, or on their grid t × x for a separable arch
+        if self.separable:
+            return self.r_grid(params, *args)
+        return vmap(self.r_net, (None, 0, 0))(params, *args)
 
     def neural_net(self, params, t, x):
         z = jnp.stack([t, x])
@@ -61,9 +74,14 @@ class CoupledCase(ForwardIVP):
         n = outputs[1]
         return u, n
     
-    def u_net(self, params, t, x):
-        u, _ = self.neural_net(params, t, x)
+    def field_net(self, params, t, x):
+        # u with its hard boundary condition and n, both from one pass over the network
+        u, n = self.neural_net(params, t, x)
         u = (self.x1-x)/(self.x1-self.x0) * self.u_0 + (x-self.x0)*(self.x1 - x) * u # hard boundary
+        return u, n
+
+    def u_net(self, params, t, x):
+        u, _ = self.field_net(params, t, x)
         return u
 
     def n_net(self, params, t, x):
@@ -74,18 +92,35 @@ class CoupledCase(ForwardIVP):
         return self.n_scale*self.n_net(params, t, x)
 
     def r_net(self, params, t, x):
-        u, n = self.neural_net(params, t, x)
-        du_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x)
-        dn_t = grad(self.n_net, argnums=1)(params, t, x)
-        dn_x = grad(self.n_net, argnums=2)(params, t, x)
-        dn_xx = grad(grad(self.n_net, argnums=2), argnums=2)(params, t, x)
+        # Both fields and all their derivatives share one forward pass
+        (u, n), (du, dn) = fields(self.field_net, params, t, x, orders={"t": 1, "x": 2})
 
-        E = -grad(self.u_net, argnums=2)(params, t, x)
+        E = -du["x"]
         W = self.mu_n * E
         source = (self.q / self.epsilon * n) * self.n_scale # scale back with n_inj  # TODO: makes sense?
         
-        rn = 1/W*dn_t + dn_x - self.Diff/W*dn_xx
-        ru = du_xx + source
+        rn = 1/W*dn["t"] + dn["x"] - self.Diff/W*dn["xx"]
+        ru = du["xx"] + source
+        return ru, rn
+
+    def field_grid(self, params, t, x):
+        # u with its hard boundary condition and n on the grid t × x, for a separable arch
+        outputs = self.grid_net(params, t, x)
+        u, n = outputs[..., 0], outputs[..., 1]
+        u = (self.x1-x)/(self.x1-self.x0) * self.u_0 + (x-self.x0)*(self.x1 - x) * u # hard boundary
+        return u, n
+
+    def r_grid(self, params, t, x):
+        values, d = grid_derivs(self.field_grid, params, t, x, orders={"t": 1, "x": 2})
+        n = values[..., 1]
+        du = {key: value[..., 0] for key, value in d.items()}
+        dn = {key: value[..., 1] for key, value in d.items()}
+
+        W = self.mu_n * -du["x"]
+        source = (self.q / self.epsilon * n) * self.n_scale
+
+        rn = 1/W*dn["t"] + dn["x"] - self.Diff/W*dn["xx"]
+        ru = du["xx"] + source
         return ru, rn
 
     def ru_net(self, params, t, x):
@@ -96,7 +131,7 @@ class CoupledCase(ForwardIVP):
         _, rn = self.r_net(params, t, x)
         return rn
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing temporal weights
         t_sorted = batch[:, 0].sort()
@@ -118,7 +153,7 @@ class CoupledCase(ForwardIVP):
 
         return ru_l, rn_l, gamma
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial loss 
         n_pred = vmap(self.n_net, (None, None, 0))(params, self.t0, self.x_star)
@@ -159,16 +194,16 @@ class CoupledCase(ForwardIVP):
         }
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         # n(t=0)
-        ics_ntk = vmap(ntk_fn, (None, None, None, 0))(
+        ics_ntk = self.diag_ntk(
             self.n_net, params, self.t0, self.x_star
         )
         #TODO: Do we need to specify boundary values somewhere?
         # Boundary loss: n(x=0)=n_inj
         x_0 = 0
-        bcs_n_ntk = vmap(ntk_fn, (None, None, 0, None))(self.n_net, params, self.t_star, x_0)
+        bcs_n_ntk = self.diag_ntk(self.n_net, params, self.t_star, x_0)
 
         # Boundary loss: U(x=0)=u_0
         #bcs_inner_ntk = vmap(ntk_fn, (None, None, 0, None))(self.u_net, params, self.t_star, x_0)
@@ -182,11 +217,13 @@ class CoupledCase(ForwardIVP):
             # sort the time step for causal loss
             batch = jnp.array([batch[:, 0].sort(), batch[:, 1]]).T
             
-            u_res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
-                self.u_net, params, batch[:, 0], batch[:, 1]
+            u_res_ntk = diag_ntk_fn(
+                self.u_net, params, batch[:, 0], batch[:, 1],
+                chunk_size=self.config.weighting.ntk_chunk_size,
             )
-            n_res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
-                self.n_net, params, batch[:, 0], batch[:, 1]
+            n_res_ntk = diag_ntk_fn(
+                self.n_net, params, batch[:, 0], batch[:, 1],
+                chunk_size=self.config.weighting.ntk_chunk_size,
             )
 
             # shape: (num_chunks, -1)
@@ -202,10 +239,10 @@ class CoupledCase(ForwardIVP):
             u_res_ntk *= casual_weights
             n_res_ntk *= casual_weights
         else:
-            u_res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            u_res_ntk = self.diag_ntk(
                 self.u_net, params, batch[:, 0], batch[:, 1]
             )
-            n_res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            n_res_ntk = self.diag_ntk(
                 self.n_net, params, batch[:, 0], batch[:, 1]
             )
 
@@ -221,7 +258,7 @@ class CoupledCase(ForwardIVP):
         return ntk_dict
 
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_ref, n_ref):
         #TODO: Other methods have implemented for general t,x arrays, should we? 
         u_pred = self.u_pred_fn(params, self.t_star, self.x_star)
@@ -244,8 +281,8 @@ class CoupledCaseEvalutor(BaseEvaluator):
     def log_preds(self, params):
         pass
 
-    def __call__(self, state, batch, u_ref, n_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref, n_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -254,6 +291,9 @@ class CoupledCaseEvalutor(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref, n_ref)
 
+    def __call__(self, state, batch, u_ref, n_ref):
+        self.log_dict = super().__call__(state, batch, u_ref, n_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
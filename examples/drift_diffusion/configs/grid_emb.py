@@ -0,0 +1,109 @@
+import ml_collections
+
+import jax.numpy as jnp
+
+
+def get_config():
+    """Get the default hyperparameter configuration."""
+    config = ml_collections.ConfigDict()
+
+    config.mode = "train"
+
+    # Problem setting 
+    config.setting = setting = ml_collections.ConfigDict()
+    setting.n_inj = 1e9
+    setting.n_0 = 0.1
+    setting.E_ext = 1e6
+    setting.mu_n = 2e-4
+
+    # Sampler
+    config.sampler = sampler = ml_collections.ConfigDict()
+    sampler.sampler_name = "uniform" # "uniform" or "rad" (residual-based adaptive sampling)
+    sampler.resample_every_steps = 1000
+    sampler.num_rad_points = 100_000
+    sampler.pool = "sobol"
+    sampler.c = 1
+    sampler.k = 1
+
+    # Weights & Biases
+    config.wandb = wandb = ml_collections.ConfigDict()
+    wandb.project = "PINN-Drift-diffusion"
+    wandb.name = "grid_emb"
+    wandb.tag = None
+
+    # Arch, a small MLP on trainable multi-resolution grid features of (t, x)
+    config.arch = arch = ml_collections.ConfigDict()
+    arch.arch_name = "MlpDriftDiffusion"
+    arch.num_layers = 2
+    arch.layer_size = 64
+    arch.out_dim = 1
+    arch.activation = "sigmoid"
+    arch.periodicity = False
+    arch.fourier_emb = None
+    arch.grid_emb = ml_collections.ConfigDict(
+        {
+            "num_levels": 8,
+            "features_per_level": 2,
+            "base_resolution": 8,
+            "growth_factor": 1.5,
+            "table_size": 2**14,
+            "interpolation": "smooth",
+            "bounds": ((0.0, 0.007), (0.0, 1.0)),  # (t, x) domain of utils.get_dataset
+        }
+    )
+    arch.reparam = ml_collections.ConfigDict({"type": "weight_fact", "mean": 1.0, "stddev": 0.1})
+
+    # Optim
+    config.optim = optim = ml_collections.ConfigDict()
+    optim.optimizer = "Adam"
+    optim.beta1 = 0.9
+    optim.beta2 = 0.999
+    optim.eps = 1e-8
+    optim.learning_rate = 1e-3
+    optim.decay_rate = 0.9
+    optim.decay_steps = 2000
+    optim.grad_accum_steps = 0
+
+    # Training
+    config.training = training = ml_collections.ConfigDict()
+    training.max_steps = 200000
+    training.batch_size_per_device = 1024
+
+    # Weighting
+    config.weighting = weighting = ml_collections.ConfigDict()
+    weighting.scheme = None
+    weighting.init_weights = ml_collections.ConfigDict({"ics": 1.0, "res": 1.0, "bcs" : 1.0})
+    weighting.momentum = 0.9
+    weighting.update_every_steps = 1000
+
+    weighting.use_causal = True
+    weighting.causal_tol = 1.0
+    weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
+
+    # Logging
+    config.logging = logging = ml_collections.ConfigDict()
+    logging.log_every_steps = 100
+    logging.log_errors = True
+    logging.log_losses = True
+    logging.log_weights = True
+    logging.log_grads = False
+    logging.log_ntk = False
+    logging.log_preds = False
+
+    # Saving
+    config.saving = saving = ml_collections.ConfigDict()
+    saving.save_every_steps = 10_000
+    saving.num_keep_ckpts = 1
+    saving.plot = True
+    saving.resume = False
+
+    # # Input shape for initializing Flax models
+    config.input_dim = 2
+
+    # Integer for PRNG random seed.
+    config.seed = 42
+
+    return config
@@ -45,7 +45,7 @@ def evaluate(config: ml_collections.ConfigDict, workdir: str, step=''):
     plt.grid()
     plt.title('Charge density predictions')
     plt.xlabel("Distance [m]")
-    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3}$]')
+    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3$]')
     plt.legend()
     plt.tight_layout()
 
@@ -68,7 +68,7 @@ def evaluate(config: ml_collections.ConfigDict, workdir: str, step=''):
     plt.grid()
     plt.title('Predicted and Analytical Charge Density')
     plt.xlabel("Distance [m]")
-    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3}$]')
+    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3$]')
 
     plt.legend()
     plt.tight_layout()
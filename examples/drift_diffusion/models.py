@@ -5,7 +5,8 @@ from jax import lax, jit, grad, vmap
 
 from jaxpi.models import ForwardIVP
 from jaxpi.evaluator import BaseEvaluator
-from jaxpi.utils import ntk_fn, flatten_pytree
+from jaxpi.utils import diag_ntk_fn, flatten_pytree
+from jaxpi.derivatives import derivs, grid_derivs
 
 from matplotlib import pyplot as plt
 
@@ -40,9 +41,15 @@ class DriftDiffusion(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.scaled_u_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))
+    def u_pred_fn(self, params, *args):
+        if self.separable:
+            return self.n_inj_scale * self.u_grid(params, *args)
+        return vmap(vmap(self.scaled_u_net, (None, None, 0)), (None, 0, None))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        if self.separable:
+            return self.r_grid(params, *args)
+        return vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))(params, *args)
 
     def u_net(self, params, t, x):
         # Forward pass through the network to obtain û(t,x)
@@ -55,25 +62,37 @@ class DriftDiffusion(ForwardIVP):
         return self.n_inj_scale * self.u_net(params, t, x)
 
     def r_net(self, params, t, x):
-        dn_t = grad(self.u_net, argnums=1)(params, t, x)
-        dn_x = grad(self.u_net, argnums=2)(params, t, x)
-        dn_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x)
-        return 1/self.W*dn_t + dn_x - self.Diff/self.W*dn_xx
+        _, dn = derivs(self.u_net, params, t, x, orders={"t": 1, "x": 2})
+        return 1/self.W*dn["t"] + dn["x"] - self.Diff/self.W*dn["xx"]
+
+    def u_grid(self, params, t, x):
+        # û on the grid t × x, for a separable arch
+        return self.grid_net(params, t, x)[..., 0]
+
+    def r_grid(self, params, t, x):
+        _, dn = grid_derivs(self.u_grid, params, t, x, orders={"t": 1, "x": 2})
+        return 1/self.W*dn["t"] + dn["x"] - self.Diff/self.W*dn["xx"]
+
+    def res_pred(self, params, t, x):
+        # Residuals at the collocation points, or on their grid t × x for a separable arch
+        if self.separable:
+            return self.r_grid(params, t, x)
+        return vmap(self.r_net, (None, 0, 0))(params, t, x)
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing  temporal weights
         t_sorted = batch[:, 0].sort()
         # Compute residuals over the full domain
-        r_pred = vmap(self.r_net, (None, 0, 0))(params, t_sorted, batch[:, 1])
-        # Split residuals into chunks
+        r_pred = self.res_pred(params, t_sorted, batch[:, 1])
+        # Split residuals into chunks, along t first for a grid
         r_pred = r_pred.reshape(self.num_chunks, -1)
         l = jnp.mean(r_pred**2, axis=1)
         # Compute temporal weights
         w = lax.stop_gradient(jnp.exp(-self.tol * (self.M @ l)))
         return l, w
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         
         # Initial loss 
@@ -90,15 +109,15 @@ class DriftDiffusion(ForwardIVP):
             l, w = self.res_and_w(params, batch)
             res_loss = jnp.mean(l * w)
         else:
-            r_pred = vmap(self.r_net, (None, 0, 0))(params, batch[:, 0], batch[:, 1]) 
+            r_pred = self.res_pred(params, batch[:, 0], batch[:, 1])
             res_loss = jnp.mean((r_pred) ** 2)
 
         loss_dict = {"ics": ics_loss, "bcs": bcs_loss, "res": res_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
-        ics_ntk = vmap(ntk_fn, (None, None, None, 0))(
+        ics_ntk = self.diag_ntk(
             self.u_net, params, self.t0, self.x_star
         )
 
@@ -106,8 +125,9 @@ class DriftDiffusion(ForwardIVP):
         if self.config.weighting.use_causal:
             # sort the time step for causal loss
             batch = jnp.array([batch[:, 0].sort(), batch[:, 1]]).T
-            res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
-                self.r_net, params, batch[:, 0], batch[:, 1]
+            res_ntk = diag_ntk_fn(
+                self.r_net, params, batch[:, 0], batch[:, 1],
+                chunk_size=self.config.weighting.ntk_chunk_size,
             )
 
             res_ntk = res_ntk.reshape(self.num_chunks, -1)  # shape: (num_chunks, -1)
@@ -117,7 +137,7 @@ class DriftDiffusion(ForwardIVP):
             _, casual_weights = self.res_and_w(params, batch)
             res_ntk = res_ntk * casual_weights  # multiply by causal weights
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0], batch[:, 1]
             )
 
@@ -125,7 +145,7 @@ class DriftDiffusion(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.t_star, self.x_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -147,8 +167,8 @@ class DriftDiffusionEvalutor(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -157,6 +177,9 @@ class DriftDiffusionEvalutor(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -39,9 +39,7 @@ def get_config():
     arch.layer_size = 256
     arch.out_dim = 1
     arch.activation = "gelu"
-    arch.periodicity = ml_collections.ConfigDict(
-        {"period": (1.0,), "axis": (1,), "trainable": (False,)} 
-    )
+    arch.periodicity = None
 
     arch.fourier_emb = ml_collections.ConfigDict({"embed_scale": 10.0, "embed_dim": 256})
     arch.reparam = ml_collections.ConfigDict({"type": "weight_fact", "mean": 1.0, "stddev": 0.1})
@@ -77,6 +75,9 @@ def get_config():
     weighting.use_causal = False 
     weighting.causal_tol = 1.0
     weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
 
     # Logging
     config.logging = logging = ml_collections.ConfigDict()
@@ -92,6 +93,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = 10_000
     saving.num_keep_ckpts = 2
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 1
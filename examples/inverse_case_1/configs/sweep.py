@@ -36,9 +36,7 @@ def get_config():
     arch.layer_size = 256
     arch.out_dim = 1
     arch.activation = "gelu"
-    arch.periodicity = ml_collections.ConfigDict(
-        {"period": (1.0,), "axis": (1,), "trainable": (False,)} 
-    )
+    arch.periodicity = None
 
     arch.fourier_emb = None
     arch.reparam = None
@@ -74,6 +72,9 @@ def get_config():
     weighting.use_causal = False 
     weighting.causal_tol = 1.0
     weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
 
     # Logging
     config.logging = logging = ml_collections.ConfigDict()
@@ -90,6 +91,7 @@ def get_config():
     saving.save_every_steps = None
     saving.num_keep_ckpts = 1
     saving.plot = False
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 1
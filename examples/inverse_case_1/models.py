@@ -36,9 +36,12 @@ class InversePoisson(ForwardIVP):
             self.obs_u = self.add_noise_to_data(self.true_rho, self.obs_r) 
         else:
             self.obs_u = self.analytical_potential(self.true_rho, self.obs_r) 
-  
-        self.u_pred_fn = vmap(self.u_net, (None, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0))
+
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0))(params, *args)
 
     def analytical_potential(self, true_rho, r): 
         return self.C_1 + self.C_2 * jnp.log(r) - (true_rho * r**2) / (4 * self.eps)
@@ -54,8 +57,8 @@ class InversePoisson(ForwardIVP):
         
     def u_net(self, params, r):
         # params = weights for NN 
-        r_reshape = jnp.reshape(r, (1, -1)) # make it a 2d array with just one column to emulate jnp.stack()
-        u = self.state.apply_fn(params, r_reshape) # gives r to the neural network's (self.state) forward pass (apply_fn)
+        z = jnp.stack([r])
+        u = self.state.apply_fn(params, z) # gives r to the neural network's (self.state) forward pass (apply_fn)
         return (self.r1-r)/(self.r1-self.r0) * self.u0 + (r-self.r0)*(self.r1 - r)*u[0] # hard boundary
     
     def r_net(self, params, r):
@@ -64,11 +67,11 @@ class InversePoisson(ForwardIVP):
         rho = params['params']['rho_param'][0]
         return r * du_rr + du_r + (self.rho_scale * rho/self.eps) * r 
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch): #TODO: think should never be called
         raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):    #TODO: Implement loss for observed synthetic data.
         # Residual loss
         if self.config.weighting.use_causal == True:
@@ -89,7 +92,7 @@ class InversePoisson(ForwardIVP):
             "observ": obs_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         #ics_ntk = vmap(ntk_fn, (None, None, 0))(
         #    self.u_net, params, self.r_star
@@ -102,7 +105,7 @@ class InversePoisson(ForwardIVP):
             raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
 
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0]
             )
         #ntk_dict = {"ics": ics_ntk, "res": res_ntk}
@@ -110,7 +113,7 @@ class InversePoisson(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.r_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -142,8 +145,8 @@ class LaplaceEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -153,6 +156,9 @@ class LaplaceEvaluator(BaseEvaluator):
             self.log_errors(state.params, u_ref)
             self.log_param_errors(state.params, self.config)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -0,0 +1,48 @@
+import os
+
+# os.environ["XLA_FLAGS"] = '--xla_gpu_autotune_level=0'
+os.environ["TF_CUDNN_DETERMINISTIC"] = "1"  # For better reproducible!  ~35% slower !
+
+import itertools
+
+from absl import app
+from absl import flags
+
+from ml_collections import config_flags
+
+import train
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("workdir", ".", "Directory to store model data.")
+config_flags.DEFINE_config_file(
+    "config",
+    "./configs/sweep.py",
+    "File path to the training hyperparameter configuration.",
+)
+
+
+def main(argv):
+    config = FLAGS.config
+    workdir = FLAGS.workdir
+
+    # Same grid as sweep_noise.py, but every n_obs trains all its noise levels and
+    # seeds as one vmapped ensemble instead of one run per grid point
+    n_obs_values = [1_000, 100, 10]
+    noise_values = [None, 0.1, 0.25, 0.5]
+    seed_values = [42, 43, 44, 45, 46]
+
+    for n_obs in n_obs_values:
+        config.setting.n_obs = n_obs
+        config.wandb.name = f"Noise-ensemble-n_obs={n_obs}"
+
+        members = [
+            {"setting.guassian_noise_perc": noise, "seed": seed}
+            for noise, seed in itertools.product(noise_values, seed_values)
+        ]
+        train.train_ensemble(config, workdir, members)
+
+
+if __name__ == "__main__":
+    flags.mark_flags_as_required(["config", "workdir"])
+    app.run(main)
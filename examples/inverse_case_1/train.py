@@ -1,5 +1,6 @@
 import os
 import time
+import copy
 
 import jax
 import jax.numpy as jnp
@@ -12,7 +13,8 @@ import wandb
 
 from jaxpi.samplers import BaseSampler, init_sampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.models import Ensemble
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset
@@ -33,7 +35,7 @@ class OneDimensionalUniformSampler(BaseSampler):
         self.dom = dom
         self.dim = 1
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
         "Generates data containing batch_size samples"
         batch = random.uniform(
@@ -48,8 +50,21 @@ class OneDimensionalUniformSampler(BaseSampler):
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     logger = Logger()
+    ckpt_manager = CheckpointManager(
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        keep=config.saving.get("num_keep_ckpts", 5),
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = ckpt_manager.restore_context() if config.saving.resume else None
+
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
 
     # Problem setup
     r_0 = config.setting.r_0  # inner radius
@@ -79,15 +94,40 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     sampler = OneDimensionalUniformSampler(dom, config.training.batch_size_per_device)
     res_sampler = iter(sampler)
 
+    start_step = 0
+    if context is not None:
+        model.state = ckpt_manager.restore(model.state, step=context["step"])
+        # Adaptive sampling replaces the initial uniform sampler at the first resampling
+        if (
+            config.sampler.sampler_name != "random"
+            and context["step"] > config.sampler.resample_every_steps
+        ):
+            sampler = init_sampler(model, config)
+        sampler.load_state_dict(context["sampler"])
+        res_sampler = iter(sampler)
+        start_step = context["step"]
+
     evaluator = models.LaplaceEvaluator(config, model)
 
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         start_time = time.time()
 
         # Update RAD points
-        if config.sampler.sampler_name != "random":
+        if (
+            config.sampler.sampler_name == "rad-persistent"
+            and step > config.sampler.resample_every_steps
+        ):
+            # Once built at the first resampling, it refreshes the next window of cached
+            # residuals far more often, so the whole pool is refreshed every few thousand steps
+            if step % config.sampler.refresh_every_steps == 0:
+                sampler.update(model, model.state)
+
+                if config.sampler.plot_rad == True and step % config.sampler.resample_every_steps == 0:
+                    sampler.plot(workdir, step, config.wandb.name)
+
+        elif config.sampler.sampler_name != "random":
             if step % config.sampler.resample_every_steps == 0 and step != 0:
                 
                 if config.sampler.sampler_name == "rad-cosine" and step != config.sampler.resample_every_steps: 
@@ -120,11 +160,18 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             fig.savefig(fig_path, bbox_inches="tight", dpi=800)
             plt.close(fig)
 
-        model.state = model.step(model.state, batch)
-
-        # Update weights
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
+
+            # Update weights
+            if update_weights:
                 model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
@@ -148,9 +195,112 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(workdir, "ckpt", config.wandb.name)
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "step": step + 1,
+                    "sampler": sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                ckpt_manager.save(model.state, step=step + 1, context=context)
                 if config.saving.plot == True:
+                    ckpt_manager.wait()
                     evaluate(config, workdir, step +1)
 
-    return model
\ No newline at end of file
+    # Block until the last checkpoints are written
+    ckpt_manager.wait()
+
+    return model
+
+
+def train_ensemble(config: ml_collections.ConfigDict, workdir: str, members):
+    """Trains one member per dict of config overrides, e.g. {"seed": 43}, in one program.
+
+    The overrides may change everything that is fixed when a member is built, such as
+    the seed or the noise level of the observations, but not the shapes of its arrays,
+    so all members need the same `setting.n_obs`. They share the collocation batches.
+    """
+    logger = Logger()
+    wandb_config = config.wandb
+    wandb.init(project=wandb_config.project, name=wandb_config.name)
+
+    # Problem setup
+    r_0 = config.setting.r_0  # inner radius
+    r_1 = config.setting.r_1  # outer radius
+    n_r = config.setting.n_r  # number of spatial points
+
+    true_rho = config.setting.true_rho
+    rho_scale = config.setting.rho_scale
+
+    u0 = config.setting.u0
+    u1 = config.setting.u1
+
+    # Get  dataset
+    u_ref, r_star = get_dataset(r_0, r_1, n_r, true_rho, u0)
+
+    dom = jnp.array([r_star[0], r_star[-1]])
+
+    # Initialize one model per member
+    member_models, member_names = [], []
+    for overrides in members:
+        member_config = copy.deepcopy(config)
+        with member_config.ignore_type():
+            member_config.update_from_flattened_dict(overrides)
+        member_models.append(
+            models.InversePoisson(member_config, u0, u1, r_star, true_rho, rho_scale)
+        )
+        member_names.append(",".join(f"{k}={v}" for k, v in overrides.items()))
+
+    ensemble = Ensemble(member_models)
+    evaluator = models.LaplaceEvaluator(ensemble.config, member_models[0])
+
+    res_sampler = iter(OneDimensionalUniformSampler(dom, config.training.batch_size_per_device))
+
+    print("Waiting for JIT...")
+    for step in range(config.training.max_steps):
+        start_time = time.time()
+
+        batch = next(res_sampler)
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            ensemble.state, _ = ensemble.step_with_weights(ensemble.state, batch)
+        else:
+            ensemble.state = ensemble.step(ensemble.state, batch)
+
+            # Update weights
+            if update_weights:
+                ensemble.state = ensemble.update_weights(ensemble.state, batch)
+
+        # Log the metrics of every member, only use host 0 to record results
+        if jax.process_index() == 0:
+            if step % config.logging.log_every_steps == 0:
+                state = jax.device_get(tree_map(lambda x: x[0], ensemble.state))
+                batch = jax.device_get(tree_map(lambda x: x[0], batch))
+
+                member_log_dict = ensemble.evaluate(evaluator, state, batch, u_ref)
+                member_log_dict["rho_param"] = (
+                    state.params["params"]["rho_param"][:, 0] * config.setting.rho_scale
+                )
+
+                log_dict = {}
+                for idx, name in enumerate(member_names):
+                    for key, values in member_log_dict.items():
+                        log_dict[f"{name}/{key}"] = values[idx]
+                wandb.log(log_dict, step)
+                end_time = time.time()
+
+                logger.log_iter(step, start_time, end_time, log_dict)
+
+    # Save every member in its own directory
+    if config.saving.save_every_steps is not None:
+        for name, member_state in zip(member_names, ensemble.member_states()):
+            ckpt_manager = CheckpointManager(
+                os.path.join(workdir, "ckpt", config.wandb.name, name),
+                keep=config.saving.get("num_keep_ckpts", 5),
+            )
+            ckpt_manager.save(member_state)
+            ckpt_manager.wait()
+
+    return ensemble
@@ -31,10 +31,6 @@ class InversePoisson(ForwardIVP):
         self.q = 1.602e-19
         self.epsilon = 8.85e-12
 
-        # mappings  
-        self.u_pred_fn = vmap(self.u_net, (None, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0))
-
         # Number of points to sample for observation loss
         if config.setting.guassian_noise_perc is not None:
             self.obs_x, self.obs_u = get_noisy_observations(config)
@@ -43,11 +39,6 @@ class InversePoisson(ForwardIVP):
 
         self.k = config.setting.k   
 
-        #new 
-        self.u_pred_fn = vmap(self.u_net, (None, 0))
-        self.n_pred_fn = vmap(self.n_net, (None, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0))
-
         # Check so that the paths are passed in the config file, if None, not used. 
         if config.eval.potential_file_path is not None and config.eval.field_file_path is not None:
             self.x_ref, self.E_ref, self.u_ref = get_reference_dataset(config, config.eval.field_file_path, config.eval.potential_file_path)
@@ -55,13 +46,21 @@ class InversePoisson(ForwardIVP):
             if config.logging.log_errors == True:
                 print('Missing reference data: Setting log_errors to False')
                 config.logging.log_errors = False
-                
+
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0))(params, *args)
+
+    def n_pred_fn(self, params, *args):
+        return vmap(self.n_net, (None, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0))(params, *args)
+
     def neural_net(self, params, x):
         # params = weights for NN 
-        # make it a 2d array with just one column to emulate jnp.stack()
-        x_reshape = jnp.reshape(x, (1, -1)) 
+        z = jnp.stack([x])
         # gives r to the neural network's (self.state) forward pass (apply_fn)
-        y = self.state.apply_fn(params, x_reshape) 
+        y = self.state.apply_fn(params, z) 
         u = y[0] # first output of the neural network
         n = y[1] # second output of the neural network
         return u, n
@@ -87,11 +86,11 @@ class InversePoisson(ForwardIVP):
         a = 0.5
         return 1 - 1 / (1 + jnp.exp(-2 * k * (x - a)))
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         raise NotImplementedError(f"Casual weights not supported for 1D Laplace!")
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch): 
 
         # Residual loss
@@ -109,7 +108,7 @@ class InversePoisson(ForwardIVP):
         loss_dict = {"res": res_loss, "observ": obs_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         #ics_ntk = vmap(ntk_fn, (None, None, 0))(
         #    self.u_net, params, self.r_star
@@ -123,7 +122,7 @@ class InversePoisson(ForwardIVP):
             raise NotImplementedError(f"Casual weights not supported for 1D Laplace!")
 
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0]
             )
         #ntk_dict = {"ics": ics_ntk, "res": res_ntk}
@@ -131,7 +130,7 @@ class InversePoisson(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, _):
         # Compute n_l2 error:
         n_pred = self.n_pred_fn(params, self.x_star)
@@ -162,8 +161,8 @@ class InversePoissonEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -172,6 +171,9 @@ class InversePoissonEvaluator(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -12,7 +12,7 @@ import wandb
 
 from jaxpi.samplers import BaseSampler, UniformSampler, init_sampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset, get_reference_dataset
@@ -35,7 +35,7 @@ class OneDimensionalUniformSampler(BaseSampler):
         self.dom = dom
         self.dim = 1
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
         "Generates data containing batch_size samples"
         batch = random.uniform(
@@ -51,8 +51,21 @@ class OneDimensionalUniformSampler(BaseSampler):
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     logger = Logger()
+    ckpt_manager = CheckpointManager(
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        keep=config.saving.get("num_keep_ckpts", 5),
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = ckpt_manager.restore_context() if config.saving.resume else None
+
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
 
     # Problem setup
     n_x = config.setting.n_x    # number of spatial points (old: 128 TODO: INCREASE A LOT?)
@@ -80,15 +93,31 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     sampler = init_sampler(model, config)
     res_sampler = iter(sampler)
 
+    start_step = 0
+    if context is not None:
+        model.state = ckpt_manager.restore(model.state, step=context["step"])
+        sampler.load_state_dict(context["sampler"])
+        res_sampler = iter(sampler)
+        start_step = context["step"]
+
     evaluator = models.InversePoissonEvaluator(config, model)
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         
         start_time = time.time()
     
         # Update RAD points
-        if config.sampler.sampler_name != "random":
+        if config.sampler.sampler_name == "rad-persistent":
+            # Refreshes the next window of cached residuals, far more often than a
+            # full resampling, so the whole pool is refreshed every few thousand steps
+            if step % config.sampler.refresh_every_steps == 0 and step != 0:
+                sampler.update(model, model.state)
+
+                if config.sampler.plot_rad == True and step % config.sampler.resample_every_steps == 0:
+                    sampler.plot(workdir, step, config.wandb.name)
+
+        elif config.sampler.sampler_name != "random":
             if step % config.sampler.resample_every_steps == 0 and step != 0:
                 
                 if config.sampler.sampler_name == "rad-cosine": #and step!= config.sampler.resample_every_steps: 
@@ -124,11 +153,18 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             plt.close(fig)
 
 
-        model.state = model.step(model.state, batch)
-
-        # Update weights
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
+
+            # Update weights
+            if update_weights:
                 model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
@@ -146,8 +182,17 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
         # Saving
         if config.saving.save_every_steps is not None:
             if (step + 1) % config.saving.save_every_steps == 0 or (step + 1) == config.training.max_steps:
-                path = os.path.join(workdir, "ckpt", config.wandb.name)
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "step": step + 1,
+                    "sampler": sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                ckpt_manager.save(model.state, step=step + 1, context=context)
                 if config.saving.plot == True:
+                    ckpt_manager.wait()
                     evaluate(config, workdir, step + 1)
+
+    # Block until the last checkpoints are written
+    ckpt_manager.wait()
+
     return model
\ No newline at end of file
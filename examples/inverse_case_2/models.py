@@ -4,7 +4,7 @@ import jax.numpy as jnp
 from jax import lax, jit, grad, vmap
 from jaxpi.models import ForwardIVP
 from jaxpi.evaluator import BaseEvaluator
-from jaxpi.utils import ntk_fn, flatten_pytree
+from jaxpi.utils import diag_ntk_fn, flatten_pytree
 
 from utils import get_dataset
 
@@ -50,9 +50,11 @@ class InverseDriftDiffusion(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))
+    def u_pred_fn(self, params, *args):
+        return vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))(params, *args)
 
     def add_noise_to_data(self, u_exact):
         noise_level = self.config.setting.noise_level
@@ -80,7 +82,7 @@ class InverseDriftDiffusion(ForwardIVP):
         dn_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x)
         return 1/W*dn_t + dn_x - Diff/W*dn_xx
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing  temporal weights
         t_sorted = batch[:, 0].sort()
@@ -93,7 +95,7 @@ class InverseDriftDiffusion(ForwardIVP):
         w = lax.stop_gradient(jnp.exp(-self.tol * (self.M @ l)))
         return l, w
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial loss 
         u_pred = vmap(self.u_net, (None, None, 0))(params, self.t0, self.x_star)
@@ -119,9 +121,9 @@ class InverseDriftDiffusion(ForwardIVP):
         loss_dict = {"ics": ics_loss, "bcs": bcs_loss, "res": res_loss, "obs" : obs_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
-        ics_ntk = vmap(ntk_fn, (None, None, None, 0))(
+        ics_ntk = self.diag_ntk(
             self.u_net, params, self.t0, self.x_star
         )
 
@@ -129,8 +131,9 @@ class InverseDriftDiffusion(ForwardIVP):
         if self.config.weighting.use_causal:
             # sort the time step for causal loss
             batch = jnp.array([batch[:, 0].sort(), batch[:, 1]]).T
-            res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
-                self.r_net, params, batch[:, 0], batch[:, 1]
+            res_ntk = diag_ntk_fn(
+                self.r_net, params, batch[:, 0], batch[:, 1],
+                chunk_size=self.config.weighting.ntk_chunk_size,
             )
 
             res_ntk = res_ntk.reshape(self.num_chunks, -1)  # shape: (num_chunks, -1)
@@ -140,7 +143,7 @@ class InverseDriftDiffusion(ForwardIVP):
             _, casual_weights = self.res_and_w(params, batch)
             res_ntk = res_ntk * casual_weights  # multiply by causal weights
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0], batch[:, 1]
             )
 
@@ -148,7 +151,7 @@ class InverseDriftDiffusion(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.t_star, self.x_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -170,8 +173,8 @@ class InverseDriftDiffusionEvalutor(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -180,6 +183,9 @@ class InverseDriftDiffusionEvalutor(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -12,7 +12,7 @@ import wandb
 
 from jaxpi.samplers import UniformSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.utils import CheckpointManager
 from eval import evaluate
 import models
 from utils import get_dataset
@@ -20,8 +20,21 @@ from utils import get_dataset
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     logger = Logger()
+    ckpt_manager = CheckpointManager(
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        keep=config.saving.get("num_keep_ckpts", 5),
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = ckpt_manager.restore_context() if config.saving.resume else None
+
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
 
     # Problem setup
     n_t = 200  # number of time steps 
@@ -44,21 +57,36 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     # Initialize model
     model = models.InverseDriftDiffusion(config, t_star, x_star, u_exact_fn)
     # Initialize residual sampler
-    res_sampler = iter(UniformSampler(dom, config.training.batch_size_per_device))
+    sampler = UniformSampler(dom, config.training.batch_size_per_device)
+    res_sampler = iter(sampler)
+
+    start_step = 0
+    if context is not None:
+        model.state = ckpt_manager.restore(model.state, step=context["step"])
+        sampler.load_state_dict(context["sampler"])
+        res_sampler = iter(sampler)
+        start_step = context["step"]
 
     evaluator = models.InverseDriftDiffusionEvalutor(config, model)
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         start_time = time.time()
 
         batch = next(res_sampler)
 
-        model.state = model.step(model.state, batch)
-
-        # Update weights
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
+
+            # Update weights
+            if update_weights:
                 model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
@@ -81,9 +109,17 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(workdir, "ckpt", config.wandb.name)
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "step": step + 1,
+                    "sampler": sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                ckpt_manager.save(model.state, step=step + 1, context=context)
                 if config.saving.plot == True:
+                    ckpt_manager.wait()
                     evaluate(config, workdir, step + 1)
 
+    # Block until the last checkpoints are written
+    ckpt_manager.wait()
+
     return model
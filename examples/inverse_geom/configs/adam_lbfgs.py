@@ -0,0 +1,98 @@
+import ml_collections
+
+import jax.numpy as jnp
+
+
+def get_config():
+    """Get the default hyperparameter configuration."""
+    config = ml_collections.ConfigDict()
+
+    config.mode = "train" 
+
+    # Setting 
+    config.setting = setting = ml_collections.ConfigDict()
+
+    setting.n_obs = 100
+    setting.r_0 = 0.0    # inner radius
+    setting.r_1 = 0.5      # outer radius
+    setting.n_r = 12_800    # number of spatial points 
+
+    setting.true_offset = 1e-3 # True offset  
+    setting.guassian_noise_perc = 0.0 # Gaussian Noise std
+
+    # Weights & Biases
+    config.wandb = wandb = ml_collections.ConfigDict()
+    wandb.project = "PINN-Inverse-Geometry-Ablation-1e2-obs"
+    wandb.name = "adam_lbfgs"
+    wandb.tag = None
+
+    # Arch
+    config.arch = arch = ml_collections.ConfigDict()
+    arch.arch_name = "InverseMlpOffset"
+    arch.num_layers = 4
+    arch.layer_size = 64
+    arch.out_dim = 1
+    arch.activation = "gelu"
+    arch.periodicity = None
+
+    arch.fourier_emb = ml_collections.ConfigDict({"embed_scale": 10.0, "embed_dim": 256})
+    arch.reparam = ml_collections.ConfigDict({"type": "weight_fact", "mean": 1.0, "stddev": 0.1})
+
+    # Optim
+    config.optim = optim = ml_collections.ConfigDict()
+    optim.optimizer = "AdamLBFGS"
+    optim.beta1 = 0.9
+    optim.beta2 = 0.999
+    optim.eps = 1e-8
+    optim.learning_rate = 1e-3
+    optim.decay_rate = 0.9
+    optim.decay_steps = 2000
+    optim.grad_accum_steps = 0
+    # L-BFGS on a fixed collocation set after lbfgs_start_step Adam steps
+    optim.lbfgs_start_step = 90_000
+    optim.history_size = 50
+    optim.max_linesearch_steps = 20
+
+    # Training
+    config.training = training = ml_collections.ConfigDict()
+    training.max_steps = 100_000
+    training.batch_size_per_device = 8192
+
+    # Weighting
+    config.weighting = weighting = ml_collections.ConfigDict()
+    weighting.scheme = "grad_norm"
+    weighting.init_weights = ml_collections.ConfigDict({"res": 1.0, "observ": 1.0})
+    weighting.momentum = 0.9
+    weighting.update_every_steps = 1000
+
+    weighting.use_causal = False 
+    weighting.causal_tol = 1.0
+    weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
+
+    # Logging
+    config.logging = logging = ml_collections.ConfigDict()
+    logging.log_every_steps = 1000
+    logging.log_errors = True
+    logging.log_losses = True
+    logging.log_weights = True
+    logging.log_grads = False
+    logging.log_ntk = False
+    logging.log_preds = False
+
+    # Saving
+    config.saving = saving = ml_collections.ConfigDict()
+    saving.save_every_steps = None #20_000
+    saving.resume = False
+    saving.num_keep_ckpts = 1
+    saving.plot = False
+
+    # # Input shape for initializing Flax models
+    config.input_dim = 1
+
+    # Integer for PRNG random seed.
+    config.seed = 40
+
+    return config
@@ -12,7 +12,7 @@ import wandb
 
 from jaxpi.samplers import BaseSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset
@@ -31,7 +31,7 @@ class OneDimensionalUniformSampler(BaseSampler):
         self.dom = dom
         self.dim = 1
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
         "Generates data containing batch_size samples"
         batch = random.uniform(
@@ -46,8 +46,21 @@ class OneDimensionalUniformSampler(BaseSampler):
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     logger = Logger()
+    ckpt_manager = CheckpointManager(
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        keep=config.saving.get("num_keep_ckpts", 5),
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = ckpt_manager.restore_context() if config.saving.resume else None
+
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
 
     # Problem setup
     r_0 = config.setting.r_0  # inner radius
@@ -71,22 +84,50 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     model = models.InversePoisson(config, u0, u1, r_star, true_offset)
 
     # Initialize residual sampler
-    res_sampler = iter(OneDimensionalUniformSampler(dom, config.training.batch_size_per_device))
+    sampler = OneDimensionalUniformSampler(dom, config.training.batch_size_per_device)
+    res_sampler = iter(sampler)
+
+    start_step = 0
+    if context is not None:
+        model.state = ckpt_manager.restore(model.state, step=context["step"])
+        sampler.load_state_dict(context["sampler"])
+        res_sampler = iter(sampler)
+        start_step = context["step"]
+
+    # The L-BFGS phase of AdamLBFGS trains on one fixed collocation set
+    lbfgs_start_step = (
+        config.optim.lbfgs_start_step if config.optim.optimizer == "AdamLBFGS" else None
+    )
+    lbfgs_batch = context.get("lbfgs_batch") if context is not None else None
 
     evaluator = models.InversePoissonEvaluator(config, model)
 
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         start_time = time.time()
+        lbfgs_phase = lbfgs_start_step is not None and step >= lbfgs_start_step
 
         batch = next(res_sampler)
-
-        model.state = model.step(model.state, batch)
-
-        # Update weights
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
+        if lbfgs_phase:
+            # The line search needs a fixed objective, so keep the points drawn at the switch
+            if lbfgs_batch is None:
+                lbfgs_batch = batch
+            batch = lbfgs_batch
+
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and not lbfgs_phase
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
+
+            # Update weights
+            if update_weights:
                 model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
@@ -110,9 +151,19 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(workdir, "ckpt", config.wandb.name)
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "step": step + 1,
+                    "sampler": sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                if lbfgs_batch is not None:
+                    context["lbfgs_batch"] = jax.device_get(lbfgs_batch)
+                ckpt_manager.save(model.state, step=step + 1, context=context)
                 if config.saving.plot == True:
+                    ckpt_manager.wait()
                     evaluate(config, workdir, step+1)
 
+    # Block until the last checkpoints are written
+    ckpt_manager.wait()
+
     return model
\ No newline at end of file
@@ -27,6 +27,8 @@ def get_config():
     sampler.plot_rad = False
     sampler.c = 1
     sampler.k = 0.5
+    sampler.refresh_fraction = 0.1 # Fraction of candidates refreshed per update with rad-persistent
+    sampler.refresh_every_steps = 100 # Steps between the updates of rad-persistent
     sampler.gamma = 0
     sampler.cosine_lr = 0.9
     sampler.cosine_T = 10
@@ -45,9 +47,7 @@ def get_config():
     arch.layer_size = 64
     arch.out_dim = 1
     arch.activation = "gelu"
-    arch.periodicity = ml_collections.ConfigDict(
-        {"period": (1.0,), "axis": (1,), "trainable": (False,)} 
-    )
+    arch.periodicity = None
     arch.fourier_emb = ml_collections.ConfigDict({"embed_scale": 10.0, "embed_dim": 256})
     arch.reparam = ml_collections.ConfigDict({"type": "weight_fact", "mean": 1.0, "stddev": 0.1})
 
@@ -77,6 +77,9 @@ def get_config():
     weighting.use_causal = False
     weighting.causal_tol = 1.0
     weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
 
     # Logging
     config.logging = logging = ml_collections.ConfigDict()
@@ -93,6 +96,7 @@ def get_config():
     saving.save_every_steps = None
     saving.plot = False
     saving.num_keep_ckpts = None
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 1
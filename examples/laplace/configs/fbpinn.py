@@ -0,0 +1,110 @@
+import ml_collections
+
+import jax.numpy as jnp
+
+
+def get_config():
+    """Get the default hyperparameter configuration."""
+    config = ml_collections.ConfigDict()
+
+    config.mode = "train"
+
+    config.setting = setting = ml_collections.ConfigDict()
+    setting.r_0 = 0.0001 # Prev best with random sampling: 0.0001 (0.1mm)
+    setting.r_1 = 0.5
+    setting.u_0 = 1
+    setting.u_1 = 0
+    setting.n_r = 12_000
+
+    setting.regularization = False
+    setting.gpinn = False
+    setting.num_grad_points = 100
+    
+    config.sampler = sampler = ml_collections.ConfigDict()
+    sampler.sampler_name = "rad2"
+    sampler.resample_every_steps = 20_000 # Resample new RAD points every 10_000 steps
+    sampler.num_rad_points = 100_000
+    sampler.plot_rad = False
+    sampler.c = 1
+    sampler.k = 0.5
+    sampler.refresh_fraction = 0.1 # Fraction of candidates refreshed per update with rad-persistent
+    sampler.refresh_every_steps = 100 # Steps between the updates of rad-persistent
+    sampler.gamma = 0
+    sampler.cosine_lr = 0.9
+    sampler.cosine_T = 10
+    sampler.plot_batch = False 
+
+    # Weights & Biases
+    config.wandb = wandb = ml_collections.ConfigDict()
+    wandb.project = "PINN-Laplace-RAD2-c1_k05-1e-4"
+    wandb.name = "fbpinn"
+    wandb.tag = None
+
+    # Arch
+    config.arch = arch = ml_collections.ConfigDict()
+    # One small network per decade of r, blended by overlapping windows
+    arch.arch_name = "Fbpinn"
+    arch.subdomain_edges = ((setting.r_0, 1e-3, 1e-2, 1e-1, setting.r_1),)
+    arch.overlap = 0.25
+    arch.num_layers = 2
+    arch.layer_size = 32
+    arch.out_dim = 1
+    arch.activation = "gelu"
+    arch.periodicity = None
+    arch.fourier_emb = None
+    arch.reparam = ml_collections.ConfigDict({"type": "weight_fact", "mean": 1.0, "stddev": 0.1})
+
+    # Optim
+    config.optim = optim = ml_collections.ConfigDict()
+    optim.optimizer = "Adam"
+    optim.beta1 = 0.9
+    optim.beta2 = 0.999
+    optim.eps = 1e-8
+    optim.learning_rate = 1e-3
+    optim.decay_rate = 0.9
+    optim.decay_steps = 2000
+    optim.grad_accum_steps = 0
+
+    # Training
+    config.training = training = ml_collections.ConfigDict()
+    training.max_steps = 150_000
+    training.batch_size_per_device = 8192
+
+    # Weighting
+    config.weighting = weighting = ml_collections.ConfigDict()
+    weighting.scheme = None
+    weighting.init_weights = ml_collections.ConfigDict({"res": 1.0})
+    weighting.momentum = 0.9
+    weighting.update_every_steps = 1000
+
+    weighting.use_causal = False
+    weighting.causal_tol = 1.0
+    weighting.num_chunks = 32
+    weighting.ntk_estimator = "exact" # "exact" or "hutchinson", the latter only estimates the mean NTK
+    weighting.ntk_chunk_size = 256 # Points per chunk of the exact NTK diagonal
+    weighting.ntk_num_probes = 32 # Random projections of the Hutchinson estimate
+
+    # Logging
+    config.logging = logging = ml_collections.ConfigDict()
+    logging.log_every_steps = 1000
+    logging.log_errors = True
+    logging.log_losses = True
+    logging.log_weights = True
+    logging.log_grads = False
+    logging.log_ntk = False
+    logging.log_preds = False
+
+    # Saving
+    config.saving = saving = ml_collections.ConfigDict()
+    saving.save_every_steps = None
+    saving.plot = False
+    saving.num_keep_ckpts = None
+    saving.resume = False
+
+    # # Input shape for initializing Flax models
+    config.input_dim = 1
+
+    # Integer for PRNG random seed.
+    config.seed = 42
+
+    return config
@@ -3,6 +3,7 @@ from functools import partial
 import jax
 import jax.numpy as jnp
 from jax import lax, jit, grad, vmap
+from jax.tree_util import tree_map
 
 from jaxpi.models import ForwardIVP
 from jaxpi.evaluator import BaseEvaluator
@@ -26,15 +27,16 @@ class Laplace(ForwardIVP):
 
         self.grad_points = jnp.linspace(self.r0, self.r1, config.setting.num_grad_points)
 
-        #new  
-        self.u_pred_fn = vmap(self.u_net, (None, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0))
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0))(params, *args)
 
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0))(params, *args)
 
     def u_net(self, params, r):
         # params = weights for NN
-        r_reshape = jnp.reshape(r, (1, -1)) # make it a 2d array with just one column to emulate jnp.stack()
-        u = self.state.apply_fn(params, r_reshape) # gives r to the neural network's (self.state) forward pass (apply_fn)
+        z = jnp.stack([r])
+        u = self.state.apply_fn(params, z) # gives r to the neural network's (self.state) forward pass (apply_fn)
         return (self.r1-r)/(self.r1-self.r0) * self.u0 + (r-self.r0)*(self.r1 - r)*u[0] # hard boundary
 
     def r_net(self, params, r):
@@ -42,32 +44,37 @@ class Laplace(ForwardIVP):
         du_rr = grad(grad(self.u_net, argnums=1), argnums=1)(params, r)
         return r * du_rr + du_r  # Scaled by r, try w/o? 
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch): #TODO: think should never be called
         raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
 
-    @partial(jit, static_argnums=(0,))
-    def losses(self, params, batch):
+    @jit
+    def residuals(self, params, batch):
 
-        # Residual loss
+        # PDE residual
         if self.config.weighting.use_causal == True:
             raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
         else:
             r_pred = vmap(self.r_net, (None, 0))(params, batch[:,0]) 
-            res_loss = jnp.mean((r_pred) ** 2)
         
-        loss_dict = {"res": res_loss}
+        residual_dict = {"res": r_pred}
 
         if self.config.setting.gpinn == True:
             g_pred_fn = vmap(lambda params, r: grad(self.r_net, argnums=1)(params, r), (None, 0))
 
             g_pred = g_pred_fn(params, self.grad_points) # Testing with fewer grad points to speed up computation
-            g_loss = jnp.mean(g_pred ** 2)
-            loss_dict["g"] = g_loss
+            residual_dict["g"] = g_pred
+
+        return residual_dict
 
+    @jit
+    def losses(self, params, batch):
+        # Mean squared residual of each term
+        residuals = self.residuals(params, batch)
+        loss_dict = tree_map(lambda r: jnp.mean(r ** 2), residuals)
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         #ics_ntk = vmap(ntk_fn, (None, None, 0))(
         #    self.u_net, params, self.r_star
@@ -81,14 +88,14 @@ class Laplace(ForwardIVP):
             raise NotImplementedError(f"Casual weights not supported for time-independant 1D Laplace!")
 
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0]
             )
         ntk_dict = {"res": res_ntk}
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.r_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -110,8 +117,8 @@ class LaplaceEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -120,6 +127,9 @@ class LaplaceEvaluator(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
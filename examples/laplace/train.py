@@ -13,7 +13,7 @@ import wandb
 
 from jaxpi.samplers import BaseSampler, init_sampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset
@@ -31,8 +31,21 @@ import matplotlib.pyplot as plt
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     logger = Logger()
+    ckpt_manager = CheckpointManager(
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        keep=config.saving.get("num_keep_ckpts", 5),
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = ckpt_manager.restore_context() if config.saving.resume else None
+
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
 
     # Problem setup
     r_0 = config.setting.r_0      # inner radius
@@ -56,15 +69,38 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     sampler = init_sampler(model, config)
     res_sampler = iter(sampler)
 
+    start_step = 0
+    if context is not None:
+        model.state = ckpt_manager.restore(model.state, step=context["step"])
+        sampler.load_state_dict(context["sampler"])
+        res_sampler = iter(sampler)
+        start_step = context["step"]
+
+    # The L-BFGS phase of AdamLBFGS trains on one fixed collocation set
+    lbfgs_start_step = (
+        config.optim.lbfgs_start_step if config.optim.optimizer == "AdamLBFGS" else None
+    )
+    lbfgs_batch = context.get("lbfgs_batch") if context is not None else None
+
     evaluator = models.LaplaceEvaluator(config, model)
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         
         start_time = time.time()
+        lbfgs_phase = lbfgs_start_step is not None and step >= lbfgs_start_step
     
         # Update RAD points
-        if config.sampler.sampler_name != "random":
+        if config.sampler.sampler_name == "rad-persistent" and not lbfgs_phase:
+            # Refreshes the next window of cached residuals, far more often than a
+            # full resampling, so the whole pool is refreshed every few thousand steps
+            if step % config.sampler.refresh_every_steps == 0 and step != 0:
+                sampler.update(model, model.state)
+
+                if config.sampler.plot_rad == True and step % config.sampler.resample_every_steps == 0:
+                    sampler.plot(workdir, step, config.wandb.name)
+
+        elif config.sampler.sampler_name != "random" and not lbfgs_phase:
             if step % config.sampler.resample_every_steps == 0 and step != 0:
                 
                 if config.sampler.sampler_name == "rad-cosine": #and step!= config.sampler.resample_every_steps: 
@@ -80,6 +116,11 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
                 
 
         batch = next(res_sampler)
+        if lbfgs_phase:
+            # The line search needs a fixed objective, so keep the points drawn at the switch
+            if lbfgs_batch is None:
+                lbfgs_batch = batch
+            batch = lbfgs_batch
         
         if config.sampler.plot_batch == True:
             # plot histogram of new batch
@@ -99,11 +140,19 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             fig.savefig(fig_path, bbox_inches="tight", dpi=800)
             plt.close(fig)
 
-        model.state = model.step(model.state, batch)
-
-        # Update weights
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and not lbfgs_phase
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
+
+            # Update weights
+            if update_weights:
                 model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
@@ -123,10 +172,19 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(workdir, "ckpt", config.wandb.name)
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "step": step + 1,
+                    "sampler": sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                if lbfgs_batch is not None:
+                    context["lbfgs_batch"] = jax.device_get(lbfgs_batch)
+                ckpt_manager.save(model.state, step=step + 1, context=context)
                 if config.saving.plot == True:
+                    ckpt_manager.wait()
                     evaluate(config, workdir, step +1)
 
+    # Block until the last checkpoints are written
+    ckpt_manager.wait()
 
     return model
\ No newline at end of file
@@ -146,7 +146,7 @@ def evaluate(config: ml_collections.ConfigDict, workdir: str, step=""):
         #plt.plot(x_ref_star, n_values, label='True', color='red')
         #plt.grid()
         #plt.xlabel("Distance [m]")
-        #plt.ylabel(r'Charge density [$\# / \mathrm{m}^3}$]')
+        #plt.ylabel(r'Charge density [$\# / \mathrm{m}^3$]')
         #plt.title("Charge density predictions using PINN and COMSOL")
         #plt.legend()
         #plt.tight_layout()
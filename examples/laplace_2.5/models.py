@@ -30,10 +30,6 @@ class Laplace(ForwardIVP):
         self.q = 1.602e-19
         self.epsilon = 8.85e-12
 
-        # mappings  
-        self.u_pred_fn = vmap(self.u_net, (None, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0))
-
     # Check so that the paths are passed in the config file, if None, not used. 
         if config.eval.potential_file_path is not None and config.eval.field_file_path is not None:
             self.x_ref, self.E_ref, self.u_ref = get_reference_dataset(config, config.eval.field_file_path, config.eval.potential_file_path)
@@ -42,9 +38,15 @@ class Laplace(ForwardIVP):
                 print('Missing reference data: Setting log_errors to False')
                 config.logging.log_errors = False
 
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0))(params, *args)
+
     def u_net(self, params, x):
-        x_reshape = jnp.reshape(x, (1, -1)) # make it a 2d array with just one column to emulate jnp.stack()
-        u = self.state.apply_fn(params, x_reshape) # gives r to the neural network's (self.state) forward pass (apply_fn)
+        z = jnp.stack([x])
+        u = self.state.apply_fn(params, z) # gives r to the neural network's (self.state) forward pass (apply_fn)
         #return u[0] # soft boundary
         return self.u0*(self.x1-x)/(self.x1-self.x0) + (x-self.x0)*(self.x1 - x)*u[0] # hard boundary
 
@@ -60,11 +62,11 @@ class Laplace(ForwardIVP):
         n = self.n_inj * self.heaviside(x=x) # Heaviside step function
         return du_xx * self.u_scale + self.q * n / self.epsilon
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch): #TODO: think should never be called
         raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         
         # Residual loss
@@ -77,7 +79,7 @@ class Laplace(ForwardIVP):
         loss_dict = {"res": res_loss} # #Hard boundary {"inner_bcs": inner_bcs_loss, "outer_bcs": outer_bcs_loss, "res": res_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
 
         # Consider the effect of causal weights
@@ -85,7 +87,7 @@ class Laplace(ForwardIVP):
             raise NotImplementedError(f"Casual weights not supported yet for 1D Laplace!")
 
         else:
-            res_ntk = vmap(ntk_fn, (None, None, 0))(
+            res_ntk = self.diag_ntk(
                 self.r_net, params, batch[:, 0]
             )
         #ntk_dict = {"ics": ics_ntk, "res": res_ntk}
@@ -93,7 +95,7 @@ class Laplace(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, _):
         u_ref = self.u_ref
         u_pred = self.u_pred_fn(params, self.x_ref)
@@ -117,8 +119,8 @@ class LaplaceEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -127,6 +129,9 @@ class LaplaceEvaluator(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -25,7 +25,7 @@ def get_reference_dataset(config, e_path, u_path):
     virtual_file = io.StringIO(''.join(lines))
 
     # Read data into pandas DataFrame
-    df_E = pd.read_csv(virtual_file, delim_whitespace=True, names=['x', 'E'])
+    df_E = pd.read_csv(virtual_file, sep=r"\s+", names=['x', 'E'])
 
     x_ref = df_E['x'].values
     E_ref = df_E['E'].values
@@ -39,7 +39,7 @@ def get_reference_dataset(config, e_path, u_path):
     virtual_file = io.StringIO(''.join(lines))
 
     # Read data into pandas DataFrame
-    df_U = pd.read_csv(virtual_file, delim_whitespace=True, names=['x', 'U'])
+    df_U = pd.read_csv(virtual_file, sep=r"\s+", names=['x', 'U'])
 
     x_ref = df_U['x'].values
     u_ref = df_U['U'].values
@@ -22,9 +22,11 @@ class Advection(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))
+    def u_pred_fn(self, params, *args):
+        return vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))(params, *args)
 
     def u_net(self, params, t, x):
         z = jnp.stack([t, x])
@@ -37,7 +39,7 @@ class Advection(ForwardIVP):
         u_x = grad(self.u_net, argnums=2)(params, t, x)
         return u_t + self.c * u_x
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing  temporal weights
         t_sorted = batch[:, 0].sort()
@@ -50,7 +52,7 @@ class Advection(ForwardIVP):
         w = lax.stop_gradient(jnp.exp(-self.tol * (self.M @ l)))
         return l, w
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial condition loss
         u_pred = vmap(self.u_net, (None, None, 0))(params, self.t0, self.x_star)
@@ -67,7 +69,7 @@ class Advection(ForwardIVP):
         loss_dict = {"ics": ics_loss, "res": res_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         ics_ntk = vmap(ntk_fn, (None, None, None, 0))(
             self.u_net, params, self.t0, self.x_star
@@ -96,7 +98,7 @@ class Advection(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.t_star, self.x_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -118,8 +120,8 @@ class AdvectionEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -128,6 +130,9 @@ class AdvectionEvaluator(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -6,6 +6,7 @@ from jax.tree_util import tree_map
 from jax.flatten_util import ravel_pytree
 
 from jaxpi.models import ForwardBVP
+from jaxpi.derivatives import fields
 from jaxpi.evaluator import BaseEvaluator
 from jaxpi.utils import ntk_fn
 
@@ -34,11 +35,17 @@ class NavierStokes2D(ForwardBVP):
         # Non-dimensionalized domain length and width
         self.L, self.W = self.noslip_coords.max(axis=0) - self.noslip_coords.min(axis=0)
 
-        # Predict functions over batch
-        self.u_pred_fn = vmap(self.u_net, (None, 0, 0))
-        self.v_pred_fn = vmap(self.v_net, (None, 0, 0))
-        self.p_pred_fn = vmap(self.p_net, (None, 0, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0))
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0, 0))(params, *args)
+
+    def v_pred_fn(self, params, *args):
+        return vmap(self.v_net, (None, 0, 0))(params, *args)
+
+    def p_pred_fn(self, params, *args):
+        return vmap(self.p_net, (None, 0, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0))(params, *args)
 
     def neural_net(self, params, x, y):
         x = (
@@ -65,26 +72,15 @@ class NavierStokes2D(ForwardBVP):
         return p
 
     def r_net(self, params, x, y):
-        u, v, p = self.neural_net(params, x, y)
-
-        u_x = grad(self.u_net, argnums=1)(params, x, y)
-        v_x = grad(self.v_net, argnums=1)(params, x, y)
-        p_x = grad(self.p_net, argnums=1)(params, x, y)
-
-        u_y = grad(self.u_net, argnums=2)(params, x, y)
-        v_y = grad(self.v_net, argnums=2)(params, x, y)
-        p_y = grad(self.p_net, argnums=2)(params, x, y)
-
-        u_xx = grad(grad(self.u_net, argnums=1), argnums=1)(params, x, y)
-        v_xx = grad(grad(self.v_net, argnums=1), argnums=1)(params, x, y)
-
-        u_yy = grad(grad(self.u_net, argnums=2), argnums=2)(params, x, y)
-        v_yy = grad(grad(self.v_net, argnums=2), argnums=2)(params, x, y)
+        # All outputs and their derivatives share one forward pass
+        (u, v, p), (du, dv, dp) = fields(
+            self.neural_net, params, x, y, orders={"x": 2, "y": 2}
+        )
 
         # PDE residual
-        ru = u * u_x + v * u_y + p_x - (u_xx + u_yy) / self.Re
-        rv = u * v_x + v * v_y + p_y - (v_xx + v_yy) / self.Re
-        rc = u_x + v_y
+        ru = u * du["x"] + v * du["y"] + dp["x"] - (du["xx"] + du["yy"]) / self.Re
+        rv = u * dv["x"] + v * dv["y"] + dp["y"] - (dv["xx"] + dv["yy"]) / self.Re
+        rc = du["x"] + dv["y"]
 
         # outflow boundary residual (TODO: check if this is correct)
         # just setting the pressure over here
@@ -113,7 +109,7 @@ class NavierStokes2D(ForwardBVP):
         _, _, _, _, v_out = self.r_net(params, x, y)
         return v_out
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Inflow boundary conditions
         u_in_pred = self.u_pred_fn(
@@ -168,7 +164,7 @@ class NavierStokes2D(ForwardBVP):
 
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         u_in_ntk = vmap(ntk_fn, (None, None, 0, 0))(
             self.u_net, params, self.inflow_coords[:, 0], self.inflow_coords[:, 1]
@@ -215,7 +211,7 @@ class NavierStokes2D(ForwardBVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, coords, u_test, v_test):
         u_pred = self.u_pred_fn(params, coords[:, 0], coords[:, 1])
         v_pred = self.v_pred_fn(params, coords[:, 0], coords[:, 1])
@@ -254,12 +250,15 @@ class NavierStokesEvaluator(BaseEvaluator):
     #     log_dict['U_pred'] = fig
     #     fig.close()
 
-    def __call__(self, state, batch, coords, u_ref, v_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, coords, u_ref, v_ref):
+        super().log_step(state, batch)
 
         if self.config.logging.log_errors:
             self.log_errors(state.params, coords, u_ref, v_ref)
 
+    def __call__(self, state, batch, coords, u_ref, v_ref):
+        self.log_dict = super().__call__(state, batch, coords, u_ref, v_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params, coords)
 
@@ -21,9 +21,11 @@ class Burgers(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))
+    def u_pred_fn(self, params, *args):
+        return vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(vmap(self.r_net, (None, None, 0)), (None, 0, None))(params, *args)
 
     def u_net(self, params, t, x):
         z = jnp.stack([t, x])
@@ -43,7 +45,7 @@ class Burgers(ForwardIVP):
         u_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x)
         return u_t + u * u_x - 0.01 / jnp.pi * u_xx
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         "Compute residuals and weights for causal training"
         # Sort time coordinates
@@ -55,7 +57,7 @@ class Burgers(ForwardIVP):
         w = lax.stop_gradient(jnp.exp(-self.tol * (self.M @ l)))
         return l, w
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial condition loss
         u_pred = vmap(self.u_net, (None, None, 0))(params, self.t0, self.x_star)
@@ -72,7 +74,7 @@ class Burgers(ForwardIVP):
         loss_dict = {"ics": ics_loss, "res": res_loss}
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         ics_ntk = vmap(ntk_fn, (None, None, None, 0))(
             self.u_net, params, self.t0, self.x_star
@@ -100,7 +102,7 @@ class Burgers(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, u_test):
         u_pred = self.u_pred_fn(params, self.t_star, self.x_star)
         error = jnp.linalg.norm(u_pred - u_test) / jnp.linalg.norm(u_test)
@@ -123,8 +125,8 @@ class BurgersEvaluator(BaseEvaluator):
         self.log_dict["u_pred"] = fig
         plt.close()
 
-    def __call__(self, state, batch, u_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -133,6 +135,9 @@ class BurgersEvaluator(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref)
 
+    def __call__(self, state, batch, u_ref):
+        self.log_dict = super().__call__(state, batch, u_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
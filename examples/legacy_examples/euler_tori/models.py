@@ -15,6 +15,7 @@ import optax
 
 from jaxpi import archs
 from jaxpi.models import ForwardIVP
+from jaxpi.derivatives import fields
 from jaxpi.utils import jacobian_fn, ntk_fn
 from jaxpi.evaluator import BaseEvaluator
 
@@ -31,8 +32,8 @@ class Euler(ForwardIVP):
         self.v0 = v0
         self.rho0 = rho0
 
-        # Predictions over a grid
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0, 0))
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0, 0))(params, *args)
 
     def neural_net(self, params, t, x, y):
         t = t / self.t[-1]  # scale time to [0, 1]
@@ -62,28 +63,16 @@ class Euler(ForwardIVP):
         return rho
 
     def r_net(self, params, t, x, y):
-        u, v, p, rho = self.neural_net(params, t, x, y)
-
-        u_t = grad(self.u_net, argnums=1)(params, t, x, y)
-        u_x = grad(self.u_net, argnums=2)(params, t, x, y)
-        u_y = grad(self.u_net, argnums=3)(params, t, x, y)
-
-        v_t = grad(self.v_net, argnums=1)(params, t, x, y)
-        v_x = grad(self.v_net, argnums=2)(params, t, x, y)
-        v_y = grad(self.v_net, argnums=3)(params, t, x, y)
-
-        p_x = grad(self.p_net, argnums=2)(params, t, x, y)
-        p_y = grad(self.p_net, argnums=3)(params, t, x, y)
-
-        rho_t = grad(self.rho_net, argnums=1)(params, t, x, y)
-        rho_x = grad(self.rho_net, argnums=2)(params, t, x, y)
-        rho_y = grad(self.rho_net, argnums=3)(params, t, x, y)
+        # All outputs and their derivatives share one forward pass
+        (u, v, p, rho), (du, dv, dp, drho) = fields(
+            self.neural_net, params, t, x, y, orders={"t": 1, "x": 1, "y": 1}
+        )
 
-        ru = rho * (u_t + u * u_x + v * u_y + p_x)
-        rv = rho * (v_t + u * v_x + v * v_y + p_y)
+        ru = rho * (du["t"] + u * du["x"] + v * du["y"] + dp["x"])
+        rv = rho * (dv["t"] + u * dv["x"] + v * dv["y"] + dp["y"])
         # cont = rho_t + rho * u_x + u * rho_x + rho * v_y + v * rho_y  # Can be reduced to the following line, since u_x + v_y = 0
-        rc = rho_t + u * rho_x + v * rho_y
-        rd = u_x + v_y
+        rc = drho["t"] + u * drho["x"] + v * drho["y"]
+        rd = du["x"] + dv["y"]
 
         return ru, rv, rc, rd
 
@@ -103,7 +92,7 @@ class Euler(ForwardIVP):
         _, _, _, rd = self.r_net(params, t, x, y)
         return rd
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         t_sorted = batch[:, 0].sort()
         ru_pred, rv_pred, rc_pred, rd_pred = self.r_pred_fn(
@@ -130,7 +119,7 @@ class Euler(ForwardIVP):
 
         return l_ru, l_rv, l_rc, l_rd, gamma
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         u_ic_ntk = vmap(ntk_fn, (None, None, 0, 0, 0))(self.u_net, params, 0.0, self.xy[:, 0], self.xy[:, 1])
         v_ic_ntk = vmap(ntk_fn, (None, None, 0, 0, 0))(self.v_net, params, 0.0, self.xy[:, 0], self.xy[:, 1])
@@ -195,7 +184,7 @@ class Euler(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial condition losses
         u0_pred = vmap(self.u_net, (None, None, 0, 0))(
@@ -241,7 +230,7 @@ class Euler(ForwardIVP):
         }
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, t, coords, u_ref, v_ref, rho_ref):
         u_pred = vmap(vmap(self.u_net, (None, None, 0, 0)), (None, 0, None, None))(
             params, t, coords[:, 0], coords[:, 1]
@@ -275,8 +264,8 @@ class EulerEvaluator(BaseEvaluator):
     def log_preds(self):
         pass
 
-    def __call__(self, state, batch, t, coords, u_ref, v_ref, rho_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, t, coords, u_ref, v_ref, rho_ref):
+        super().log_step(state, batch)
 
         if self.config.logging.log_errors:
             self.log_errors(state.params, t, coords, u_ref, v_ref, rho_ref)
@@ -285,6 +274,9 @@ class EulerEvaluator(BaseEvaluator):
             _, _, _, _, causal_weight = self.model.res_and_w(state.params, batch)
             self.log_dict["cas_weight"] = causal_weight.min()
 
+    def __call__(self, state, batch, t, coords, u_ref, v_ref, rho_ref):
+        self.log_dict = super().__call__(state, batch, t, coords, u_ref, v_ref, rho_ref)
+
         if self.config.logging.log_preds:
             self.log_preds()
 
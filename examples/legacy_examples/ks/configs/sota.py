@@ -45,6 +45,7 @@ def get_config():
     training.max_steps = 200000
     training.batch_size = 4096
     training.num_time_windows = 10
+    training.warm_start = True  # start each window from the previous one
 
     # Weighting
     config.weighting = weighting = ml_collections.ConfigDict()
@@ -71,6 +72,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = None
     saving.num_keep_ckpts = 10
+    saving.resume = False
 
     # # Input shape for initializing Flax models
     config.input_dim = 2
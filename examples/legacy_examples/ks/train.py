@@ -3,7 +3,6 @@ import time
 
 import jax
 import jax.numpy as jnp
-from jax import vmap
 from jax.tree_util import tree_map
 
 import ml_collections
@@ -12,24 +11,24 @@ import wandb
 
 from jaxpi.samplers import UniformSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.models import TimeMarching
 
 import models
 from utils import get_dataset
 
 
-def train_one_window(config, workdir, model, res_sampler, u_ref, idx):
+def train_one_window(config, marching, evaluator, res_sampler, u_ref, idx, start_step=0):
     logger = Logger()
-
-    evaluator = models.KSEvaluator(config, model)
+    model = marching.model
+    batches = iter(res_sampler)
 
     step_offset = idx * config.training.max_steps
 
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         start_time = time.time()
 
-        batch = next(res_sampler)
+        batch = next(batches)
         model.state = model.step(model.state, batch)
 
         # Update weights if necessary
@@ -55,18 +54,17 @@ def train_one_window(config, workdir, model, res_sampler, u_ref, idx):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(
-                    workdir, "ckpt", config.wandb.name, "time_window_{}".format(idx + 1)
-                )
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                context = {
+                    "u0": jax.device_get(model.u0),
+                    "sampler": res_sampler.state_dict(),
+                    "wandb_id": wandb.run.id,
+                }
+                marching.save(idx, step + 1, context=context)
 
     return model
 
 
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
-    wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
-
     # Get the reference solution
     u_ref, t_star, x_star = get_dataset()
 
@@ -84,25 +82,52 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     dom = jnp.array([[t0, t1], [x0, x1]])
 
     # Initialize the residual sampler
-    res_sampler = iter(UniformSampler(dom, config.training.batch_size))
+    res_sampler = UniformSampler(dom, config.training.batch_size)
 
-    for idx in range(config.training.num_time_windows):
+    # All windows train the same model, only its initial condition changes
+    model = models.KS(config, u0, t, x_star)
+    evaluator = models.KSEvaluator(config, model)
+    marching = TimeMarching(
+        model,
+        model.u_net,
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        config.training.num_time_windows,
+        keep=config.saving.num_keep_ckpts,
+        warm_start=config.training.warm_start,
+    )
+
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = marching.restore() if config.saving.resume else None
+
+    wandb_config = config.wandb
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
+
+    start_window, start_step = 0, 0
+    if context is not None:
+        start_window, start_step = context["window"], context["step"]
+        model.u0 = jnp.asarray(context["u0"])
+        res_sampler.load_state_dict(context["sampler"])
+
+    for idx in range(start_window, config.training.num_time_windows):
         print("Training time window {}".format(idx + 1))
         # Get the reference solution for the current time window
         u = u_ref[num_time_steps * idx : num_time_steps * (idx + 1), :]
 
-        # Initialize the model
-        model = models.KS(config, u0, t, x_star)
-
         # Training the current time window
-        model = train_one_window(config, workdir, model, res_sampler, u, idx)
+        marching.begin_window(idx)
+        model = train_one_window(
+            config, marching, evaluator, res_sampler, u, idx, start_step
+        )
+        start_step = 0
 
         # Update the initial condition for the next time window
-        if config.training.num_time_windows > 1:
-            state = jax.device_get(jax.tree_util.tree_map(lambda x: x[0], model.state))
-            params = state.params
-            u0 = vmap(model.u_net, (None, None, 0))(
-                params, t_star[num_time_steps], x_star
-            )
-
-            del model, state, params
+        if idx + 1 < config.training.num_time_windows:
+            model.u0 = marching.initial_condition(t_star[num_time_steps], x_star)
+
+    # Block until the last checkpoints are written
+    marching.wait()
@@ -48,6 +48,7 @@ def get_config():
     training.max_steps = 100000
     training.batch_size = 1024
     training.num_time_windows = 1
+    training.parallel_in_time = False  # train all windows at once
 
     # Weighting
     config.weighting = weighting = ml_collections.ConfigDict()
@@ -74,6 +75,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = None
     saving.num_keep_ckpts = 10
+    saving.resume = False  # continue the parallel-in-time training from its checkpoints
 
     # # Input shape for initializing Flax models
     config.input_dim = 2
@@ -47,6 +47,7 @@ def get_config():
     training.max_steps = 100000
     training.batch_size = 1024
     training.num_time_windows = 1
+    training.parallel_in_time = False  # train all windows at once
 
     # Weighting
     config.weighting = weighting = ml_collections.ConfigDict()
@@ -48,6 +48,7 @@ def get_config():
     training.max_steps = 200000
     training.batch_size = 4096
     training.num_time_windows = 10
+    training.parallel_in_time = False  # train all windows at once
 
     # Weighting
     config.weighting = weighting = ml_collections.ConfigDict()
@@ -12,7 +12,8 @@ import wandb
 
 from jaxpi.samplers import UniformSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.models import ParallelTimeWindows
+from jaxpi.utils import save_checkpoint, stack_members, CheckpointManager
 
 import models
 from utils import get_dataset
@@ -63,6 +64,103 @@ def train_one_window(config, workdir, model, res_sampler, u_ref, idx):
     return model
 
 
+def train_parallel_windows(config, workdir, model, sampler, u_ref, t_end):
+    """Trains all time windows at once, coupled by continuity at their interfaces."""
+    logger = Logger()
+
+    num_windows = config.training.num_time_windows
+    windows = ParallelTimeWindows(model, num_windows, t_end)
+    evaluator = models.KSEvaluator(config, model)
+
+    # Reference solution of every window along the leading axis
+    num_time_steps = u_ref.shape[0] // num_windows
+    u_ref = u_ref[: num_windows * num_time_steps].reshape(
+        num_windows, num_time_steps, -1
+    )
+
+    # Every window checkpoints into its own directory, as the sequential training does
+    ckpt_managers = [
+        CheckpointManager(
+            os.path.join(
+                workdir, "ckpt", config.wandb.name, "time_window_{}".format(idx + 1)
+            ),
+            keep=config.saving.num_keep_ckpts,
+        )
+        for idx in range(num_windows)
+    ]
+
+    # Continue from the last step that all windows saved
+    start_step = 0
+    if config.saving.get("resume", False):
+        contexts = [ckpt_manager.restore_context() for ckpt_manager in ckpt_managers]
+        if all(context is not None for context in contexts):
+            start_step = min(context["step"] for context in contexts)
+            window_states = [
+                ckpt_manager.restore(window_state, step=start_step)
+                for ckpt_manager, window_state in zip(
+                    ckpt_managers, windows.member_states()
+                )
+            ]
+            windows.state = stack_members(window_states, axis=1)
+            sampler.load_state_dict(
+                ckpt_managers[0].restore_context(step=start_step)["sampler"]
+            )
+    res_sampler = iter(sampler)
+
+    print("Waiting for JIT...")
+    for step in range(start_step, config.training.max_steps):
+        start_time = time.time()
+
+        batch = next(res_sampler)
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            windows.state, _ = windows.step_with_weights(windows.state, batch)
+        else:
+            windows.state = windows.step(windows.state, batch)
+
+            # Update weights
+            if update_weights:
+                windows.state = windows.update_weights(windows.state, batch)
+
+        # Log the metrics of every window, only use host 0 to record results
+        if jax.process_index() == 0:
+            if step % config.logging.log_every_steps == 0:
+                state = jax.device_get(tree_map(lambda x: x[0], windows.state))
+                batch = jax.device_get(tree_map(lambda x: x[0], batch))
+                window_log_dict = windows.evaluate(evaluator, state, batch, u_ref)
+
+                log_dict = {}
+                for idx in range(num_windows):
+                    for key, values in window_log_dict.items():
+                        log_dict[f"time_window_{idx + 1}/{key}"] = values[idx]
+                wandb.log(log_dict, step)
+
+                end_time = time.time()
+
+                logger.log_iter(step, start_time, end_time, log_dict)
+
+        # Save model checkpoints
+        if config.saving.save_every_steps is not None:
+            if (step + 1) % config.saving.save_every_steps == 0 or (
+                step + 1
+            ) == config.training.max_steps:
+                context = {"step": step + 1, "sampler": sampler.state_dict()}
+                for ckpt_manager, window_state in zip(
+                    ckpt_managers, windows.member_states()
+                ):
+                    ckpt_manager.save(window_state, step=step + 1, context=context)
+
+    # Block until the last checkpoints are written
+    for ckpt_manager in ckpt_managers:
+        ckpt_manager.wait()
+
+    return windows
+
+
 def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     wandb_config = config.wandb
     wandb.init(project=wandb_config.project, name=wandb_config.name)
@@ -87,7 +185,15 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     dom = jnp.array([[t0, t1], [x0, x1]])
 
     # Initialize the residual sampler
-    res_sampler = iter(UniformSampler(dom, config.training.batch_size))
+    sampler = UniformSampler(dom, config.training.batch_size)
+    res_sampler = iter(sampler)
+
+    if config.training.parallel_in_time:
+        model = models.KS(config, u0, t, x_star)
+        # The next window starts at t_star[num_time_steps], in local time t[-1] + dt
+        return train_parallel_windows(
+            config, workdir, model, sampler, u_ref, t[-1] + dt
+        )
 
     for idx in range(config.training.num_time_windows):
         print("Training time window {}".format(idx + 1))
@@ -47,6 +47,13 @@ def get_config():
     training.max_steps = [20000, 40000, 140000]
     training.batch_size = 1024
 
+    # Curriculum over Re, one stage with viscosity nu = 1 / Re per entry of training.Re
+    config.continuation = continuation = ml_collections.ConfigDict()
+    continuation.parameters = {"nu": tuple(1.0 / Re for Re in training.Re)}
+    continuation.stage_steps = tuple(training.max_steps)
+    continuation.ramp = "step"
+    continuation.ramp_steps = 0
+
     # Weighting
     config.weighting = weighting = ml_collections.ConfigDict()
     weighting.scheme = "grad_norm"
@@ -6,6 +6,7 @@ from jax import lax, jit, grad, vmap, pmap, jacrev
 from jax.flatten_util import ravel_pytree
 
 from jaxpi.models import ForwardBVP
+from jaxpi.derivatives import fields
 from jaxpi.evaluator import BaseEvaluator
 from jaxpi.utils import ntk_fn
 
@@ -29,11 +30,17 @@ class NavierStokes2D(ForwardBVP):
         self.v_bc = jnp.zeros((num_pts * 4,))
         self.u_bc = self.v_bc.at[:num_pts].set(1.0)
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(self.u_net, (None, 0, 0))
-        self.v_pred_fn = vmap(self.v_net, (None, 0, 0))
-        self.p_pred_fn = vmap(self.p_net, (None, 0, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, None, 0, 0))
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0, 0))(params, *args)
+
+    def v_pred_fn(self, params, *args):
+        return vmap(self.v_net, (None, 0, 0))(params, *args)
+
+    def p_pred_fn(self, params, *args):
+        return vmap(self.p_net, (None, 0, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0))(params, *args)
 
     def neural_net(self, params, x, y):
         z = jnp.stack([x, y])
@@ -55,44 +62,34 @@ class NavierStokes2D(ForwardBVP):
         _, _, p = self.neural_net(params, x, y)
         return p
 
-    def r_net(self, params, nu, x, y):
-        u, v, p = self.neural_net(params, x, y)
-
-        u_x = grad(self.u_net, argnums=1)(params, x, y)
-        u_y = grad(self.u_net, argnums=2)(params, x, y)
-
-        v_x = grad(self.v_net, argnums=1)(params, x, y)
-        v_y = grad(self.v_net, argnums=2)(params, x, y)
-
-        p_x = grad(self.p_net, argnums=1)(params, x, y)
-        p_y = grad(self.p_net, argnums=2)(params, x, y)
-
-        u_xx = grad(grad(self.u_net, argnums=1), argnums=1)(params, x, y)
-        u_yy = grad(grad(self.u_net, argnums=2), argnums=2)(params, x, y)
-
-        v_xx = grad(grad(self.v_net, argnums=1), argnums=1)(params, x, y)
-        v_yy = grad(grad(self.v_net, argnums=2), argnums=2)(params, x, y)
+    def r_net(self, params, x, y):
+        # Viscosity of the current curriculum stage, i.e. 1 / Re
+        nu = self.physics["nu"]
+        # All outputs and their derivatives share one forward pass
+        (u, v, p), (du, dv, dp) = fields(
+            self.neural_net, params, x, y, orders={"x": 2, "y": 2}
+        )
 
-        ru = u * u_x + v * u_y + p_x - nu * (u_xx + u_yy)
-        rv = u * v_x + v * v_y + p_y - nu * (v_xx + v_yy)
-        rc = u_x + v_y
+        ru = u * du["x"] + v * du["y"] + dp["x"] - nu * (du["xx"] + du["yy"])
+        rv = u * dv["x"] + v * dv["y"] + dp["y"] - nu * (dv["xx"] + dv["yy"])
+        rc = du["x"] + dv["y"]
 
         return ru, rv, rc
 
-    def ru_net(self, params, nu, x, y):
-        ru, _, _ = self.r_net(params, nu, x, y)
+    def ru_net(self, params, x, y):
+        ru, _, _ = self.r_net(params, x, y)
         return ru
 
-    def rv_net(self, params, nu, x, y):
-        _, rv, _ = self.r_net(params, nu, x, y)
+    def rv_net(self, params, x, y):
+        _, rv, _ = self.r_net(params, x, y)
         return rv
 
-    def rc_net(self, params, nu, x, y):
-        _, _, rc = self.r_net(params, nu, x, y)
+    def rc_net(self, params, x, y):
+        _, _, rc = self.r_net(params, x, y)
         return rc
 
-    @partial(jit, static_argnums=(0,))
-    def losses(self, params, batch, nu):
+    @jit
+    def losses(self, params, batch):
         # boundary condition losses
         # Compute forward pass of u and v
         u_pred = self.u_pred_fn(params, self.x_bc1[:, 0], self.x_bc1[:, 1])
@@ -103,7 +100,7 @@ class NavierStokes2D(ForwardBVP):
         v_bc_loss = jnp.mean(v_pred**2)
 
         # Compute forward pass of residual
-        ru_pred, rv_pred, rc_pred = self.r_pred_fn(params, nu, batch[:, 0], batch[:, 1])
+        ru_pred, rv_pred, rc_pred = self.r_pred_fn(params, batch[:, 0], batch[:, 1])
         # Compute losses
         ru_loss = jnp.mean(ru_pred**2)
         rv_loss = jnp.mean(rv_pred**2)
@@ -119,8 +116,8 @@ class NavierStokes2D(ForwardBVP):
 
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
-    def compute_diag_ntk(self, params, batch, nu):
+    @jit
+    def compute_diag_ntk(self, params, batch):
         u_bc_ntk = vmap(ntk_fn, (None, None, 0, 0))(
             self.u_net, params, self.x_bc1[:, 0], self.x_bc1[:, 1]
         )
@@ -128,14 +125,14 @@ class NavierStokes2D(ForwardBVP):
             self.v_net, params, self.x_bc2[:, 0], self.x_bc2[:, 1]
         )
 
-        ru_ntk = vmap(ntk_fn, (None, None, None, 0, 0))(
-            self.ru_net, params, nu, batch[:, 0], batch[:, 1]
+        ru_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            self.ru_net, params, batch[:, 0], batch[:, 1]
         )
-        rv_ntk = vmap(ntk_fn, (None, None, None, 0, 0))(
-            self.rv_net, params, nu, batch[:, 0], batch[:, 1]
+        rv_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            self.rv_net, params, batch[:, 0], batch[:, 1]
         )
-        rc_ntk = vmap(ntk_fn, (None, None, None, 0, 0))(
-            self.rc_net, params, nu, batch[:, 0], batch[:, 1]
+        rc_ntk = vmap(ntk_fn, (None, None, 0, 0))(
+            self.rc_net, params, batch[:, 0], batch[:, 1]
         )
 
         ntk_dict = {
@@ -148,21 +145,7 @@ class NavierStokes2D(ForwardBVP):
 
         return ntk_dict
 
-    @partial(pmap, axis_name="batch", static_broadcasted_argnums=(0, 3))
-    def update_weights(self, state, batch, nu):
-        weights = self.compute_weights(state.params, batch, nu)
-        weights = lax.pmean(weights, "batch")
-        state = state.apply_weights(weights=weights)
-        return state
-
-    @partial(pmap, axis_name="batch", static_broadcasted_argnums=(0, 3))
-    def step(self, state, batch, nu):
-        grads = grad(self.loss)(state.params, state.weights, batch, nu)
-        grads = lax.pmean(grads, "batch")
-        state = state.apply_gradients(grads=grads)
-        return state
-
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, x_star, y_star, U_test):
         u_pred = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))(
             params, x_star, y_star
@@ -199,12 +182,15 @@ class NavierStokesEvaluator(BaseEvaluator):
         self.log_dict["U_pred"] = fig
         fig.close()
 
-    def __call__(self, state, batch, x_star, y_star, U_ref, nu):
-        self.log_dict = super().__call__(state, batch, nu)
+    def log_step(self, state, batch, x_star, y_star, U_ref):
+        super().log_step(state, batch)
 
         if self.config.logging.log_errors:
             self.log_errors(state.params, x_star, y_star, U_ref)
 
+    def __call__(self, state, batch, x_star, y_star, U_ref):
+        self.log_dict = super().__call__(state, batch, x_star, y_star, U_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params, x_star, y_star)
 
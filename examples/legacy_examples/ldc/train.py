@@ -17,25 +17,31 @@ import wandb
 
 from jaxpi.samplers import UniformSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset
 
 
-def train_curriculum(config, workdir, model, step_offset, max_steps, Re):
-    # Get dataset
-    u_ref, v_ref, x_star, y_star, nu = get_dataset(Re)
-    U_ref = jnp.sqrt(u_ref**2 + v_ref**2)
+def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
+    # Initialize W&B
+    wandb_config = config.wandb
+    wandb.init(project=wandb_config.project, name=wandb_config.name)
 
-    x0 = x_star[0]
-    x1 = x_star[-1]
+    # Initialize model, its viscosity follows the Re curriculum of config.continuation
+    model = models.NavierStokes2D(config)
+    schedule = model.continuation
 
-    y0 = y_star[0]
-    y1 = y_star[-1]
+    # Get the reference solution of each stage
+    datasets = []
+    for Re in config.training.Re:
+        u_ref, v_ref, x_star, y_star, nu = get_dataset(Re)
+        U_ref = jnp.sqrt(u_ref**2 + v_ref**2)
+        datasets.append((x_star, y_star, U_ref))
 
     # Define domain
-    dom = jnp.array([[x0, x1], [y0, y1]])
+    x_star, y_star, _ = datasets[0]
+    dom = jnp.array([[x_star[0], x_star[-1]], [y_star[0], y_star[-1]]])
 
     # Initialize  residual sampler
     res_sampler = iter(UniformSampler(dom, config.training.batch_size))
@@ -46,21 +52,39 @@ def train_curriculum(config, workdir, model, step_offset, max_steps, Re):
     # Initialize logger
     logger = Logger()
 
-    # Update  viscosity
-    nu = 1 / Re
+    # Checkpoints of each stage are kept in their own directory
+    ckpt_managers = [
+        CheckpointManager(
+            os.path.join(workdir, "ckpt", config.wandb.name, "Re{}".format(Re)),
+            keep=config.saving.num_keep_ckpts,
+        )
+        for Re in config.training.Re
+    ]
 
+    # All stages run in one loop, the step changes nu inside the compiled step
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(max_steps):
+    for step in range(schedule.boundaries[-1]):
         start_time = time.time()
 
+        stage = schedule.stage(step)
+        if step == 0 or step == schedule.boundaries[stage - 1]:
+            print("Training for Re = {}".format(config.training.Re[stage]))
+
         batch = next(res_sampler)
-        model.state = model.step(model.state, batch, nu)
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            model.state, _ = model.step_with_weights(model.state, batch)
+        else:
+            model.state = model.step(model.state, batch)
 
-        # Update weights if necessary
-        if config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % config.weighting.update_every_steps == 0:
-                model.state = model.update_weights(model.state, batch, nu)
+            # Update weights
+            if update_weights:
+                model.state = model.update_weights(model.state, batch)
 
         # Log training metrics, only use host 0 to record results
         if jax.process_index() == 0:
@@ -68,50 +92,22 @@ def train_curriculum(config, workdir, model, step_offset, max_steps, Re):
                 # Get the first replica of the state and batch
                 state = jax.device_get(tree_map(lambda x: x[0], model.state))
                 batch = jax.device_get(tree_map(lambda x: x[0], batch))
-                log_dict = evaluator(state, batch, x_star, y_star, U_ref, nu)
-                wandb.log(log_dict, step + step_offset)
+                log_dict = evaluator(state, batch, *datasets[stage])
+                wandb.log(log_dict, step)
 
                 end_time = time.time()
                 # Report training metrics
                 logger.log_iter(step, start_time, end_time, log_dict)
 
-        # Save checkpoint
+        # Save checkpoint, at least at the end of every stage
         if config.saving.save_every_steps is not None:
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
-            ) == config.training.max_steps:
-                path = os.path.join(
-                    workdir, "ckpt", config.wandb.name, "Re{}".format(Re)
-                )
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
-
-    # Get step offset
-    step_offset = step + step_offset
-
-    return model, step_offset
-
+            ) == schedule.boundaries[stage]:
+                ckpt_managers[stage].save(model.state, step=step + 1)
 
-def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
-    # Initialize W&B
-    wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
-
-    # Initialize model
-    model = models.NavierStokes2D(config)
-
-    # Curriculum training
-    step_offset = 0
-
-    assert len(config.training.max_steps) == len(config.training.Re)
-    num_Re = len(config.training.Re)
-
-    for idx in range(num_Re):
-        # Set Re and maximum number of training steps
-        Re = config.training.Re[idx]
-        max_steps = config.training.max_steps[idx]
-        print("Training for Re = {}".format(Re))
-        model, step_offset = train_curriculum(
-            config, workdir, model, step_offset, max_steps, Re
-        )
+    # Block until the last checkpoints are written
+    for ckpt_manager in ckpt_managers:
+        ckpt_manager.wait()
 
     return model
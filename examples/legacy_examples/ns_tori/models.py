@@ -27,30 +27,41 @@ class NavierStokes(ForwardIVP):
 
         self.nu = nu
 
-        # Predictions over a grid
-        self.u0_pred_fn = vmap(
+    def u0_pred_fn(self, params, *args):
+        return vmap(
             vmap(self.u_net, (None, None, None, 0)), (None, None, 0, None)
-        )
-        self.v0_pred_fn = vmap(
+        )(params, *args)
+
+    def v0_pred_fn(self, params, *args):
+        return vmap(
             vmap(self.v_net, (None, None, None, 0)), (None, None, 0, None)
-        )
-        self.w0_pred_fn = vmap(
+        )(params, *args)
+
+    def w0_pred_fn(self, params, *args):
+        return vmap(
             vmap(self.w_net, (None, None, None, 0)), (None, None, 0, None)
-        )
+        )(params, *args)
 
-        self.u_pred_fn = vmap(
+    def u_pred_fn(self, params, *args):
+        return vmap(
             vmap(vmap(self.u_net, (None, None, None, 0)), (None, None, 0, None)),
             (None, 0, None, None),
-        )
-        self.v_pred_fn = vmap(
+        )(params, *args)
+
+    def v_pred_fn(self, params, *args):
+        return vmap(
             vmap(vmap(self.v_net, (None, None, None, 0)), (None, None, 0, None)),
             (None, 0, None, None),
-        )
-        self.w_pred_fn = vmap(
+        )(params, *args)
+
+    def w_pred_fn(self, params, *args):
+        return vmap(
             vmap(vmap(self.w_net, (None, None, None, 0)), (None, None, 0, None)),
             (None, 0, None, None),
-        )
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0, 0))
+        )(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0, 0))(params, *args)
 
     def neural_net(self, params, t, x, y):
         t = t / self.t_star[-1]
@@ -100,7 +111,7 @@ class NavierStokes(ForwardIVP):
         _, cont = self.r_net(params, t, x, y)
         return cont
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates
         t_sorted = batch[:, 0].sort()
@@ -121,7 +132,7 @@ class NavierStokes(ForwardIVP):
 
         return rm_l, rc_l, gamma
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Initial conditions loss
         u0_pred = self.u0_pred_fn(params, 0.0, self.x_star, self.y_star)
@@ -155,7 +166,7 @@ class NavierStokes(ForwardIVP):
         }
         return loss_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         u_ic_ntk = vmap(
             vmap(ntk_fn, (None, None, None, None, 0)), (None, None, None, 0, None)
@@ -203,7 +214,7 @@ class NavierStokes(ForwardIVP):
         }
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, t, x, y, u_ref, v_ref, w_ref):
         u_pred = self.u_pred_fn(params, t, x, y)
         v_pred = self.v_pred_fn(params, t, x, y)
@@ -234,8 +245,8 @@ class NavierStokesEvaluator(BaseEvaluator):
         self.log_dict["v_error"] = v_error
         self.log_dict["w_error"] = w_error
 
-    def __call__(self, state, batch, u_ref, v_ref, w_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref, v_ref, w_ref):
+        super().log_step(state, batch)
 
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref, v_ref, w_ref)
@@ -243,5 +254,3 @@ class NavierStokesEvaluator(BaseEvaluator):
         if self.config.weighting.use_causal:
             _, _, causal_weight = self.model.res_and_w(state.params, batch)
             self.log_dict["cas_weight"] = causal_weight.min()
-
-        return self.log_dict
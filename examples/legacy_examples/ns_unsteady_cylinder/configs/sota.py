@@ -46,6 +46,8 @@ def get_config():
     config.training = training = ml_collections.ConfigDict()
     training.max_steps = 200000
     training.num_time_windows = 10
+    training.warm_start = True  # start each window from the previous one
+    training.parallel_in_time = False  # train all windows at once
 
     training.inflow_batch_size = 2048
     training.outflow_batch_size = 2048
@@ -92,6 +94,7 @@ def get_config():
     config.saving = saving = ml_collections.ConfigDict()
     saving.save_every_steps = 10000
     saving.num_keep_ckpts = 10
+    saving.resume = False
 
     # Input shape for initializing Flax models
     config.input_dim = 3
@@ -9,6 +9,7 @@ import optax
 
 from jaxpi import archs
 from jaxpi.models import ForwardBVP, ForwardIVP
+from jaxpi.derivatives import fields
 from jaxpi.utils import ntk_fn
 from jaxpi.evaluator import BaseEvaluator
 
@@ -32,16 +33,29 @@ class NavierStokes2D(ForwardIVP):
             self.U_star = 1.0
             self.L_star = 1.0
 
-        # Predict functions over batch
-        self.u0_pred_fn = vmap(self.u_net, (None, None, 0, 0))
-        self.v0_pred_fn = vmap(self.v_net, (None, None, 0, 0))
-        self.p0_pred_fn = vmap(self.p_net, (None, None, 0, 0))
+    def u0_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, None, 0, 0))(params, *args)
 
-        self.u_pred_fn = vmap(self.u_net, (None, 0, 0, 0))
-        self.v_pred_fn = vmap(self.v_net, (None, 0, 0, 0))
-        self.p_pred_fn = vmap(self.p_net, (None, 0, 0, 0))
-        self.w_pred_fn = vmap(self.w_net, (None, 0, 0, 0))
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0, 0))
+    def v0_pred_fn(self, params, *args):
+        return vmap(self.v_net, (None, None, 0, 0))(params, *args)
+
+    def p0_pred_fn(self, params, *args):
+        return vmap(self.p_net, (None, None, 0, 0))(params, *args)
+
+    def u_pred_fn(self, params, *args):
+        return vmap(self.u_net, (None, 0, 0, 0))(params, *args)
+
+    def v_pred_fn(self, params, *args):
+        return vmap(self.v_net, (None, 0, 0, 0))(params, *args)
+
+    def p_pred_fn(self, params, *args):
+        return vmap(self.p_net, (None, 0, 0, 0))(params, *args)
+
+    def w_pred_fn(self, params, *args):
+        return vmap(self.w_net, (None, 0, 0, 0))(params, *args)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0, 0))(params, *args)
 
     def neural_net(self, params, t, x, y):
         t = t / self.temporal_dom[1]  # rescale t into [0, 1]
@@ -77,33 +91,19 @@ class NavierStokes2D(ForwardIVP):
         return w
 
     def r_net(self, params, t, x, y):
-        u, v, p = self.neural_net(params, t, x, y)
-
-        u_t = grad(self.u_net, argnums=1)(params, t, x, y)
-        v_t = grad(self.v_net, argnums=1)(params, t, x, y)
-
-        u_x = grad(self.u_net, argnums=2)(params, t, x, y)
-        v_x = grad(self.v_net, argnums=2)(params, t, x, y)
-        p_x = grad(self.p_net, argnums=2)(params, t, x, y)
-
-        u_y = grad(self.u_net, argnums=3)(params, t, x, y)
-        v_y = grad(self.v_net, argnums=3)(params, t, x, y)
-        p_y = grad(self.p_net, argnums=3)(params, t, x, y)
-
-        u_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x, y)
-        v_xx = grad(grad(self.v_net, argnums=2), argnums=2)(params, t, x, y)
-
-        u_yy = grad(grad(self.u_net, argnums=3), argnums=3)(params, t, x, y)
-        v_yy = grad(grad(self.v_net, argnums=3), argnums=3)(params, t, x, y)
+        # All outputs and their derivatives share one forward pass
+        (u, v, p), (du, dv, dp) = fields(
+            self.neural_net, params, t, x, y, orders={"t": 1, "x": 2, "y": 2}
+        )
 
         # PDE residual
-        ru = u_t + u * u_x + v * u_y + p_x - (u_xx + u_yy) / self.Re
-        rv = v_t + u * v_x + v * v_y + p_y - (v_xx + v_yy) / self.Re
-        rc = u_x + v_y
+        ru = du["t"] + u * du["x"] + v * du["y"] + dp["x"] - (du["xx"] + du["yy"]) / self.Re
+        rv = dv["t"] + u * dv["x"] + v * dv["y"] + dp["y"] - (dv["xx"] + dv["yy"]) / self.Re
+        rc = du["x"] + dv["y"]
 
         # outflow boundary residual
-        u_out = u_x / self.Re - p
-        v_out = v_x
+        u_out = du["x"] / self.Re - p
+        v_out = dv["x"]
 
         return ru, rv, rc, u_out, v_out
 
@@ -127,7 +127,15 @@ class NavierStokes2D(ForwardIVP):
         _, _, _, _, v_out = self.r_net(params, t, x, y)
         return v_out
 
-    @partial(jit, static_argnums=(0,))
+    def with_initial_condition(self, params, t, batch):
+        # The initial condition is sampled with the batch, so only its values change
+        coords_batch, _, _, _ = batch["ic"]
+        u, v, p = vmap(self.neural_net, (None, None, 0, 0))(
+            params, t, coords_batch[:, 0], coords_batch[:, 1]
+        )
+        return self, dict(batch, ic=(coords_batch, u, v, p))
+
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates
         t_sorted = batch[:, 0].sort()
@@ -153,7 +161,7 @@ class NavierStokes2D(ForwardIVP):
 
         return ru_l, rv_l, rc_l, gamma
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_diag_ntk(self, params, batch):
         # Unpack batch
         ic_batch = batch["ic"]
@@ -276,7 +284,7 @@ class NavierStokes2D(ForwardIVP):
 
         return ntk_dict
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         # Unpack batch
         ic_batch = batch["ic"]
@@ -369,7 +377,7 @@ class NavierStokes2D(ForwardIVP):
 
         return u_x, v_x, u_y, v_y
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_drag_lift(self, params, t, U_star, L_star):
         nu = 0.001  # Dimensional viscosity
         radius = 0.05  # radius of cylinder
@@ -463,8 +471,8 @@ class NavierStokesEvaluator(BaseEvaluator):
     #     log_dict['U_pred'] = fig
     #     fig.close()
 
-    def __call__(self, state, batch):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, _, _, causal_weight = self.model.res_and_w(state.params, batch["res"])
@@ -475,5 +483,3 @@ class NavierStokesEvaluator(BaseEvaluator):
         #
         # if self.config.logging.log_preds:
         #     self.log_preds(state.params, coords)
-
-        return self.log_dict
@@ -23,7 +23,8 @@ import models
 
 from jaxpi.samplers import BaseSampler, SpaceSampler, TimeSpaceSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_checkpoint
+from jaxpi.models import TimeMarching, ParallelTimeWindows
+from jaxpi.utils import CheckpointManager, stack_members
 
 from utils import get_dataset, get_fine_mesh, parabolic_inflow
 
@@ -36,7 +37,7 @@ class ICSampler(SpaceSampler):
         self.v = v
         self.p = p
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
         "Generates data containing batch_size samples"
         idx = random.choice(key, self.coords.shape[0], shape=(self.batch_size,))
@@ -68,7 +69,7 @@ class ResSampler(BaseSampler):
         self.coarse_coords = coarse_coords
         self.fine_coords = fine_coords
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
         "Generates data containing batch_size samples"
         subkeys = random.split(key, 4)
@@ -105,9 +106,61 @@ class ResSampler(BaseSampler):
         return batch
 
 
-def train_one_window(config, workdir, model, samplers, idx):
-    # Initialize evaluator
-    evaluator = models.NavierStokesEvaluator(config, model)
+def create_samplers(
+    config,
+    temporal_dom,
+    u0,
+    v0,
+    p0,
+    coords,
+    inflow_coords,
+    outflow_coords,
+    noslip_coords,
+    fine_coords,
+):
+    keys = random.split(random.PRNGKey(0), 5)
+    ic_sampler = ICSampler(
+        u0, v0, p0, coords, config.training.ic_batch_size, rng_key=keys[0]
+    )
+    inflow_sampler = TimeSpaceSampler(
+        temporal_dom,
+        inflow_coords,
+        config.training.inflow_batch_size,
+        rng_key=keys[1],
+    )
+    outflow_sampler = TimeSpaceSampler(
+        temporal_dom,
+        outflow_coords,
+        config.training.outflow_batch_size,
+        rng_key=keys[2],
+    )
+    noslip_sampler = TimeSpaceSampler(
+        temporal_dom,
+        noslip_coords,
+        config.training.noslip_batch_size,
+        rng_key=keys[3],
+    )
+    res_sampler = ResSampler(
+        temporal_dom,
+        fine_coords,
+        fine_coords,
+        config.training.res_batch_size,
+        rng_key=keys[4],
+    )
+
+    samplers = {
+        "ic": ic_sampler,
+        "inflow": inflow_sampler,
+        "outflow": outflow_sampler,
+        "noslip": noslip_sampler,
+        "res": res_sampler,
+    }
+    return samplers
+
+
+def train_one_window(config, marching, evaluator, samplers, idx, start_step=0):
+    model = marching.model
+    batches = {key: iter(sampler) for key, sampler in samplers.items()}
 
     # Initialize logger
     logger = Logger()
@@ -116,12 +169,12 @@ def train_one_window(config, workdir, model, samplers, idx):
 
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    for step in range(start_step, config.training.max_steps):
         start_time = time.time()
 
         # Sample mini-batch
         batch = {}
-        for key, sampler in samplers.items():
+        for key, sampler in batches.items():
             batch[key] = next(sampler)
 
         model.state = model.step(model.state, batch)
@@ -149,19 +202,133 @@ def train_one_window(config, workdir, model, samplers, idx):
             if (step + 1) % config.saving.save_every_steps == 0 or (
                 step + 1
             ) == config.training.max_steps:
-                path = os.path.join(
-                    workdir, "ckpt", config.wandb.name, "time_window_{}".format(idx + 1)
-                )
-                save_checkpoint(model.state, path, keep=config.saving.num_keep_ckpts)
+                ic_sampler = samplers["ic"]
+                context = {
+                    "ic": jax.device_get(
+                        {"u": ic_sampler.u, "v": ic_sampler.v, "p": ic_sampler.p}
+                    ),
+                    "samplers": {
+                        key: sampler.state_dict() for key, sampler in samplers.items()
+                    },
+                    "wandb_id": wandb.run.id,
+                }
+                marching.save(idx, step + 1, context=context)
 
     return model
 
 
-def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
+def train_parallel_windows(config, workdir, model, evaluator, samplers, t_end):
+    """Trains all time windows at once, coupled by continuity at their interfaces."""
+    num_windows = config.training.num_time_windows
+    windows = ParallelTimeWindows(model, num_windows, t_end)
+
+    # Every window checkpoints into its own directory, as the sequential training does
+    ckpt_managers = [
+        CheckpointManager(
+            os.path.join(
+                workdir, "ckpt", config.wandb.name, "time_window_{}".format(idx + 1)
+            ),
+            keep=config.saving.num_keep_ckpts,
+        )
+        for idx in range(num_windows)
+    ]
+
+    # Continue from the last step that all windows saved
+    start_step, context = 0, None
+    if config.saving.get("resume", False):
+        contexts = [ckpt_manager.restore_context() for ckpt_manager in ckpt_managers]
+        if all(context is not None for context in contexts):
+            start_step = min(context["step"] for context in contexts)
+            window_states = [
+                ckpt_manager.restore(window_state, step=start_step)
+                for ckpt_manager, window_state in zip(
+                    ckpt_managers, windows.member_states()
+                )
+            ]
+            windows.state = stack_members(window_states, axis=1)
+            context = ckpt_managers[0].restore_context(step=start_step)
+            for key, sampler in samplers.items():
+                sampler.load_state_dict(context["samplers"][key])
+
     # Initialize W&B
     wandb_config = config.wandb
-    wandb.init(project=wandb_config.project, name=wandb_config.name)
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
+
+    logger = Logger()
+
+    batches = {key: iter(sampler) for key, sampler in samplers.items()}
+
+    # jit warm up
+    print("Waiting for JIT...")
+    for step in range(start_step, config.training.max_steps):
+        start_time = time.time()
+
+        # Sample mini-batch, shared by all windows
+        batch = {}
+        for key, sampler in batches.items():
+            batch[key] = next(sampler)
+
+        update_weights = (
+            config.weighting.scheme in ["grad_norm", "ntk"]
+            and step % config.weighting.update_every_steps == 0
+        )
+        if update_weights and config.weighting.scheme == "grad_norm":
+            # Grad norm weights are updated within the step, from its per-loss gradients
+            windows.state, _ = windows.step_with_weights(windows.state, batch)
+        else:
+            windows.state = windows.step(windows.state, batch)
+
+            # Update weights
+            if update_weights:
+                windows.state = windows.update_weights(windows.state, batch)
+
+        # Log the metrics of every window, only use host 0 to record results
+        if jax.process_index() == 0:
+            if step % config.logging.log_every_steps == 0:
+                state = jax.device_get(tree_map(lambda x: x[0], windows.state))
+                batch = jax.device_get(tree_map(lambda x: x[0], batch))
+                window_log_dict = windows.evaluate(evaluator, state, batch)
+
+                log_dict = {}
+                for idx in range(num_windows):
+                    for key, values in window_log_dict.items():
+                        log_dict[f"time_window_{idx + 1}/{key}"] = values[idx]
+                wandb.log(log_dict, step)
+
+                end_time = time.time()
+                # Report training metrics
+                logger.log_iter(step, start_time, end_time, log_dict)
+
+        # Save checkpoint
+        if config.saving.save_every_steps is not None:
+            if (step + 1) % config.saving.save_every_steps == 0 or (
+                step + 1
+            ) == config.training.max_steps:
+                context = {
+                    "step": step + 1,
+                    "samplers": {
+                        key: sampler.state_dict() for key, sampler in samplers.items()
+                    },
+                    "wandb_id": wandb.run.id,
+                }
+                for ckpt_manager, window_state in zip(
+                    ckpt_managers, windows.member_states()
+                ):
+                    ckpt_manager.save(window_state, step=step + 1, context=context)
+
+    # Block until the last checkpoints are written
+    for ckpt_manager in ckpt_managers:
+        ckpt_manager.wait()
+
+    return windows
 
+
+def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     # Get dataset
     (
         u_ref,
@@ -229,77 +396,83 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     v0 = v_ref[-1, :]
     p0 = p_ref[-1, :]
 
-    for idx in range(config.training.num_time_windows):
-        logging.info("Training time window {}".format(idx + 1))
+    # Initialize model, all windows train it and only the initial condition changes
+    model = models.NavierStokes2D(config, inflow_fn, temporal_dom, coords, Re)
+    evaluator = models.NavierStokesEvaluator(config, model)
 
+    if config.training.parallel_in_time:
         # Initialize Sampler
-        keys = random.split(random.PRNGKey(0), 5)
-        ic_sampler = iter(
-            ICSampler(
-                u0, v0, p0, coords, config.training.ic_batch_size, rng_key=keys[0]
-            )
-        )
-        inflow_sampler = iter(
-            TimeSpaceSampler(
-                temporal_dom,
-                inflow_coords,
-                config.training.inflow_batch_size,
-                rng_key=keys[1],
-            )
-        )
-        outflow_sampler = iter(
-            TimeSpaceSampler(
-                temporal_dom,
-                outflow_coords,
-                config.training.outflow_batch_size,
-                rng_key=keys[2],
-            )
-        )
-        noslip_sampler = iter(
-            TimeSpaceSampler(
-                temporal_dom,
-                noslip_coords,
-                config.training.noslip_batch_size,
-                rng_key=keys[3],
-            )
+        samplers = create_samplers(
+            config,
+            temporal_dom,
+            u0,
+            v0,
+            p0,
+            coords,
+            inflow_coords,
+            outflow_coords,
+            noslip_coords,
+            fine_coords,
         )
+        return train_parallel_windows(config, workdir, model, evaluator, samplers, t1)
 
-        res_sampler = iter(
-            ResSampler(
-                temporal_dom,
-                fine_coords,
-                fine_coords,
-                config.training.res_batch_size,
-                rng_key=keys[4],
-            )
-        )
+    # The next initial condition takes one pass of the network for (u, v, p)
+    marching = TimeMarching(
+        model,
+        model.neural_net,
+        os.path.join(workdir, "ckpt", config.wandb.name),
+        config.training.num_time_windows,
+        keep=config.saving.num_keep_ckpts,
+        warm_start=config.training.warm_start,
+    )
 
-        samplers = {
-            "ic": ic_sampler,
-            "inflow": inflow_sampler,
-            "outflow": outflow_sampler,
-            "noslip": noslip_sampler,
-            "res": res_sampler,
-        }
+    # Context of the latest checkpoint, when a preempted run is continued
+    context = marching.restore() if config.saving.resume else None
 
-        # Initialize model
-        model = models.NavierStokes2D(config, inflow_fn, temporal_dom, coords, Re)
+    # Initialize W&B
+    wandb_config = config.wandb
+    wandb.init(
+        project=wandb_config.project,
+        name=wandb_config.name,
+        id=context["wandb_id"] if context is not None else None,
+        resume="allow",
+    )
+
+    start_window, start_step = 0, 0
+    if context is not None:
+        start_window, start_step = context["window"], context["step"]
+        ic = context["ic"]
+        u0, v0, p0 = jnp.asarray(ic["u"]), jnp.asarray(ic["v"]), jnp.asarray(ic["p"])
+
+    for idx in range(start_window, config.training.num_time_windows):
+        logging.info("Training time window {}".format(idx + 1))
+
+        # Initialize Sampler
+        samplers = create_samplers(
+            config,
+            temporal_dom,
+            u0,
+            v0,
+            p0,
+            coords,
+            inflow_coords,
+            outflow_coords,
+            noslip_coords,
+            fine_coords,
+        )
+
+        if idx == start_window and context is not None:
+            for key, sampler in samplers.items():
+                sampler.load_state_dict(context["samplers"][key])
 
         # Train model for the current time window
-        model = train_one_window(config, workdir, model, samplers, idx)
+        marching.begin_window(idx)
+        model = train_one_window(config, marching, evaluator, samplers, idx, start_step)
+        start_step = 0
 
         # Update the initial condition for the next time window
-        if config.training.num_time_windows > 1:
-            state = jax.device_get(jax.tree_util.tree_map(lambda x: x[0], model.state))
-            params = state.params
-            u0 = vmap(model.u_net, (None, None, 0, 0))(
-                params, t1, coords[:, 0], coords[:, 1]
-            )
-            v0 = vmap(model.v_net, (None, None, 0, 0))(
-                params, t1, coords[:, 0], coords[:, 1]
-            )
-            p0 = vmap(model.p_net, (None, None, 0, 0))(
-                params, t1, coords[:, 0], coords[:, 1]
-            )
-
-            del model, state, params
+        if idx + 1 < config.training.num_time_windows:
+            u0, v0, p0 = marching.initial_condition(t1, coords[:, 0], coords[:, 1])
+
+    # Block until the last checkpoints are written
+    marching.wait()
@@ -55,7 +55,7 @@ def evaluate(u_config: ml_collections.ConfigDict, n_config: ml_collections.Confi
     plt.plot(x_star, n_pred[6,:], label='t=0.006')
     plt.grid()
     plt.xlabel("Distance [m]", fontsize=14)
-    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3}$]', fontsize=14)
+    plt.ylabel(r'Charge density [$\# / \mathrm{m}^3$]', fontsize=14)
     plt.title("Predicted charge density", fontsize=14)
     plt.legend(fontsize=11)
     plt.tight_layout()
@@ -150,7 +150,7 @@ def evaluate(u_config: ml_collections.ConfigDict, n_config: ml_collections.Confi
             plt.plot(x_ref_star, n_ref[i,:], label='COMSOL' if i == 0 else '', color='red')
         plt.grid()
         plt.xlabel("Distance [m]", fontsize=14)
-        plt.ylabel(r'Charge density [$\# / \mathrm{m}^3}$]', fontsize=14)
+        plt.ylabel(r'Charge density [$\# / \mathrm{m}^3$]', fontsize=14)
         plt.title("Charge density predictions using PINN and COMSOL", fontsize=14)
         plt.legend(fontsize=11)
         plt.tight_layout()
@@ -2,7 +2,7 @@ from functools import partial
 
 import jax
 import jax.numpy as jnp
-from jax import lax, jit, grad, vmap
+from jax import lax, jit, grad, vmap, random
 from jax.tree_util import tree_map
 from utils import get_reference_dataset, get_analytical_n_ref
 from jaxpi.models import ForwardIVP
@@ -38,12 +38,13 @@ class UModel(ForwardIVP):
         # Reference to n model
         self.n_model = n_model
 
-        # Predictions over a grid
-        self.u_pred_fn = vmap(vmap(self.u_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0))
-        self.n_params = None
+        # Parameters of n_model, bound by CoupledModels
+        self.partner_params = None
         self.tag = "u_model"
 
+        # Parameter inputs at the values in config.setting, used where none are given
+        self.p_ref = self.encode_parameters()
+
         # Evaluation
         has_reference_injection = config.setting.n_inj in [5e9, 5e13, 1e14, 5e15]
         if config.eval.potential_file_path is not None and has_reference_injection:
@@ -52,33 +53,40 @@ class UModel(ForwardIVP):
             if config.logging.log_errors == True:
                 print('Missing reference data: Setting log_errors to False')
                 config.logging.log_errors = False
-                self.n_model.config.logging.log_errors = False
+                # n_model is bound after construction, and turns it off in turn
+                if self.n_model is not None:
+                    self.n_model.config.logging.log_errors = False
+
+    def u_pred_fn(self, params, t, x, p=None):
+        p = self.p_ref if p is None else p
+        return vmap(vmap(self.u_net, (None, None, 0, None)), (None, 0, None, None))(params, t, x, p)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0, 0))(params, *args)
 
-    def u_net(self, params, t, x):
-        z = jnp.stack([t, x])
+    def u_net(self, params, t, x, p=None):
+        # p holds the parameter inputs of a parametric model, it is empty otherwise
+        p = self.p_ref if p is None else p
+        z = jnp.concatenate([jnp.stack([t, x]), p])
         outputs = self.state.apply_fn(params, z)
         u = outputs[0]
-        u = (self.x1-x)/(self.x1-self.x0) * self.u_0 + (x-self.x0)*(self.x1 - x) * u # hard boundary
+        u_0 = self.parameter("u_0", p, self.u_0)
+        u = (self.x1-x)/(self.x1-self.x0) * u_0 + (x-self.x0)*(self.x1 - x) * u # hard boundary
         return u
     
-    def update_params(self):
-        """ Updates other model parameters """
-        n_state = jax.device_get(tree_map(lambda x: x[0], self.n_model.state))
-        self.n_params = n_state.params
-
-    def r_net(self, params, t, x):
-        du_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x)
-        source = self.q / self.epsilon * self.n_model.scaled_n_net(self.n_params, t, x)
+    def r_net(self, params, t, x, p):
+        du_xx = grad(grad(self.u_net, argnums=2), argnums=2)(params, t, x, p)
+        source = self.q / self.epsilon * self.n_model.scaled_n_net(self.partner_params["n_model"], t, x, p)
         
         ru = du_xx + source
         return ru
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing temporal weights
         t_sorted = batch[:, 0].sort()
         # Compute residuals over the full domain
-        ru_pred = self.r_pred_fn(params, t_sorted, batch[:, 1])
+        ru_pred = self.r_pred_fn(params, t_sorted, batch[:, 1], batch[:, 2:])
         # Split residuals into chunks
         ru_pred = ru_pred.reshape(self.num_chunks, -1)
         ru_pred *= self.loss_scale
@@ -88,7 +96,7 @@ class UModel(ForwardIVP):
     
         return ru_l, w
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
         
         # Boundary loss: U(x=0)=U_0
@@ -106,7 +114,7 @@ class UModel(ForwardIVP):
             ru_loss = jnp.mean(ru_l * w)
 
         else:
-            ru_pred = self.r_pred_fn(params, batch[:, 0], batch[:, 1])
+            ru_pred = self.r_pred_fn(params, batch[:, 0], batch[:, 1], batch[:, 2:])
             # Compute loss
             ru_pred *= self.loss_scale # scale down loss before squaring to avoid NaN
             ru_loss = jnp.mean(ru_pred**2)
@@ -118,7 +126,7 @@ class UModel(ForwardIVP):
         }
         return loss_dict
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, _):
         u_ref = self.u_ref
         u_pred = self.u_pred_fn(params, self.t_ref_star, self.x_ref_star)
@@ -156,12 +164,13 @@ class NModel(ForwardIVP):
         self.t0 = t_star[0]
         self.t1 = t_star[-1]
 
-        self.n_pred_fn = vmap(vmap(self.scaled_n_net, (None, None, 0)), (None, 0, None))
-        self.r_pred_fn = vmap(self.r_net, (None, 0, 0))
-
         self.u_model = u_model
-        self.u_params = None
+        # Parameters of u_model, bound by CoupledModels
+        self.partner_params = None
         self.tag = "n_model"
+
+        # Parameter inputs at the values in config.setting, used where none are given
+        self.p_ref = self.encode_parameters()
         
         # COMSOL evaluation
         has_reference_injection = config.setting.n_inj in [5e9, 5e13, 1e14, 5e15]
@@ -172,39 +181,46 @@ class NModel(ForwardIVP):
                 print('Missing reference data: Setting log_errors to False')
                 config.logging.log_errors = False
                 self.u_model.config.logging.log_errors = False
-    
-    def n_net(self, params, t, x):
-        z = jnp.stack([t, x])
+
+    def n_pred_fn(self, params, t, x, p=None):
+        p = self.p_ref if p is None else p
+        return vmap(vmap(self.scaled_n_net, (None, None, 0, None)), (None, 0, None, None))(params, t, x, p)
+
+    def r_pred_fn(self, params, *args):
+        return vmap(self.r_net, (None, 0, 0, 0))(params, *args)
+
+    def n_net(self, params, t, x, p=None):
+        # n scaled by n_inj, p holds the parameter inputs of a parametric model
+        p = self.p_ref if p is None else p
+        z = jnp.concatenate([jnp.stack([t, x]), p])
         outputs = self.state.apply_fn(params, z)
         n = outputs[0]
         return n
     
-    def scaled_n_net(self, params, t, x):
-        return self.n_scale * self.n_net(params, t, x)
+    def scaled_n_net(self, params, t, x, p=None):
+        p = self.p_ref if p is None else p
+        return self.parameter("n_inj", p, self.n_scale) * self.n_net(params, t, x, p)
     
-    def update_params(self):
-        """ Updates other model parameters """
-        u_state = jax.device_get(tree_map(lambda x: x[0], self.u_model.state))
-        self.u_params = u_state.params
-
-    def r_net(self, params, t, x):
-        dn_t = grad(self.n_net, argnums=1)(params, t, x)
-        dn_x = grad(self.n_net, argnums=2)(params, t, x)
-        dn_xx = grad(grad(self.n_net, argnums=2), argnums=2)(params, t, x)
-
-        E = -grad(self.u_model.u_net, argnums=2)(self.u_params, t, x)
-        W = self.mu_n * E
+    def r_net(self, params, t, x, p):
+        dn_t = grad(self.n_net, argnums=1)(params, t, x, p)
+        dn_x = grad(self.n_net, argnums=2)(params, t, x, p)
+        dn_xx = grad(grad(self.n_net, argnums=2), argnums=2)(params, t, x, p)
+
+        E = -grad(self.u_model.u_net, argnums=2)(self.partner_params["u_model"], t, x, p)
+        mu_n = self.parameter("mu_n", p, self.mu_n)
+        W = mu_n * E
+        Diff = mu_n * self.kb * self.Temp/self.q
         
-        rn = 1/W*dn_t + dn_x - self.Diff/W*dn_xx
+        rn = 1/W*dn_t + dn_x - Diff/W*dn_xx
         
         return rn
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def res_and_w(self, params, batch):
         # Sort temporal coordinates for computing temporal weights
         t_sorted = batch[:, 0].sort()
         # Compute residuals over the full domain
-        rn_pred = self.r_pred_fn(params, t_sorted, batch[:, 1])
+        rn_pred = self.r_pred_fn(params, t_sorted, batch[:, 1], batch[:, 2:])
         # Split residuals into chunks
         rn_pred = rn_pred.reshape(self.num_chunks, -1)
 
@@ -215,15 +231,28 @@ class NModel(ForwardIVP):
         # Take minimum of the causal weights
         return rn_l, w
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def losses(self, params, batch):
+        # A parametric model draws the parameter inputs of the initial and boundary
+        # points separately, anew for every batch
+        if self.parameter_space is None:
+            p_ics = p_bcs = self.p_ref
+            p_axis = None
+        else:
+            key_ics, key_bcs = random.split(self.batch_key(batch))
+            p_ics = self.parameter_space.sample(key_ics, self.x_star.shape[0])
+            p_bcs = self.parameter_space.sample(key_bcs, self.t_star.shape[0])
+            p_axis = 0
+
         # Initial loss 
-        n_pred = vmap(self.n_net, (None, None, 0))(params, self.t0, self.x_star)
-        ics_loss = jnp.mean((self.n_0s[1:] - n_pred[1:]) ** 2) # slicing to exclude x = 0
+        n_pred = vmap(self.n_net, (None, None, 0, p_axis))(params, self.t0, self.x_star, p_ics)
+        n_0s = self.config.setting.n_0 / self.parameter("n_inj", p_ics, self.n_scale)
+        n_0s = jnp.broadcast_to(n_0s, self.n_0s.shape)
+        ics_loss = jnp.mean((n_0s[1:] - n_pred[1:]) ** 2) # slicing to exclude x = 0
 
         # Boundary loss: n(x=0)=n_inj
         x_0 = 0
-        n_pred = vmap(self.n_net, (None, 0, None))(params, self.t_star, x_0)
+        n_pred = vmap(self.n_net, (None, 0, None, p_axis))(params, self.t_star, x_0, p_bcs)
         bcs_n = jnp.mean((self.n_injs - n_pred) ** 2)
 
         # Residual loss
@@ -231,7 +260,7 @@ class NModel(ForwardIVP):
             rn_l, w = self.res_and_w(params, batch)
             rn_loss = jnp.mean(rn_l * w)
         else:
-            rn_pred = self.r_pred_fn(params, batch[:, 0], batch[:, 1])
+            rn_pred = self.r_pred_fn(params, batch[:, 0], batch[:, 1], batch[:, 2:])
             # Compute loss
             rn_loss = jnp.mean(rn_pred**2)
 
@@ -242,7 +271,7 @@ class NModel(ForwardIVP):
         }
         return loss_dict
     
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_l2_error(self, params, _):
         n_ref = self.n_ref
         n_pred = self.n_pred_fn(params, self.t_ref_star, self.x_ref_star)
@@ -267,8 +296,8 @@ class UModelEvalutor(BaseEvaluator):
     def log_preds(self, params):
         pass
 
-    def __call__(self, state, batch, u_ref, n_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref, n_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -277,6 +306,9 @@ class UModelEvalutor(BaseEvaluator):
         if self.config.logging.log_errors:
             self.log_errors(state.params, u_ref, n_ref)
 
+    def __call__(self, state, batch, u_ref, n_ref):
+        self.log_dict = super().__call__(state, batch, u_ref, n_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
@@ -298,8 +330,8 @@ class NModelEvalutor(BaseEvaluator):
     def log_preds(self, params):
         pass
 
-    def __call__(self, state, batch, u_ref, n_ref):
-        self.log_dict = super().__call__(state, batch)
+    def log_step(self, state, batch, u_ref, n_ref):
+        super().log_step(state, batch)
 
         if self.config.weighting.use_causal:
             _, causal_weight = self.model.res_and_w(state.params, batch)
@@ -309,6 +341,9 @@ class NModelEvalutor(BaseEvaluator):
             self.log_errors(state.params, u_ref, n_ref)
             self.log_analytical_error(state.params, self.config) # TODO: Enable logging of analytical error w/o COMSOL data
 
+    def __call__(self, state, batch, u_ref, n_ref):
+        self.log_dict = super().__call__(state, batch, u_ref, n_ref)
+
         if self.config.logging.log_preds:
             self.log_preds(state.params)
 
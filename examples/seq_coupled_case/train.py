@@ -4,6 +4,7 @@ import copy
 
 import jax
 import jax.numpy as jnp
+from jax import random
 from jax.tree_util import tree_map
 
 import ml_collections
@@ -13,7 +14,8 @@ import wandb
 
 from jaxpi.samplers import UniformSampler
 from jaxpi.logging import Logger
-from jaxpi.utils import save_sequential_checkpoints
+from jaxpi.models import CoupledModels
+from jaxpi.utils import CheckpointManager
 
 import models
 from utils import get_dataset
@@ -72,67 +74,80 @@ def train_and_evaluate(config: ml_collections.ConfigDict, workdir: str):
     n_evaluator = models.NModelEvalutor(n_config, n_model)
 
     u_model.n_model = n_model
-    
-    # Initialize residual sampler
-    res_sampler = iter(UniformSampler(dom, config.training.batch_size_per_device))
-
-    # Start training u_model 
-    current_model = u_model
-    current_evaluator = u_evaluator
-    other_model = n_model
-    other_evaluator = n_evaluator
 
-    # Initalize other model parameters
-    current_model.update_params()
-    other_model.update_params()
+    # Each model is checkpointed in its own directory under the combined step
+    ckpt_managers = [
+        CheckpointManager(
+            os.path.join(workdir, "ckpt", config.wandb.name, model.tag),
+            keep=config.saving.get("num_keep_ckpts", 5),
+        )
+        for model in (u_model, n_model)
+    ]
+    
+    # Initialize residual sampler. In parametric mode the parameter inputs are sampled
+    # along with the coordinates, as the trailing columns of the batch
+    if u_model.parameter_space is not None:
+        dom = jnp.concatenate([dom, u_model.parameter_space.dom])
+    sampler = UniformSampler(dom, config.training.batch_size_per_device)
+    res_sampler = iter(sampler)
+
+    # n_model is trained first, then the models take turns every switch_every_step
+    # steps. Both are updated inside one compiled scan, each against the current
+    # parameters of the other.
+    coupled = CoupledModels((n_model, u_model), config.setting.switch_every_step)
+    evaluators = (n_evaluator, u_evaluator)
+
+    log_every_steps = config.logging.log_every_steps
+    save_every_steps = config.saving.save_every_steps
+    max_steps = config.training.max_steps
+    key = random.PRNGKey(config.seed)
 
     # jit warm up
     print("Waiting for JIT...")
-    for step in range(config.training.max_steps):
+    step = 0
+    while step < max_steps:
         start_time = time.time()
-        batch = next(res_sampler)
-
-        # alternate current_model between u_model and n_model
-        if step % current_model.config.setting.switch_every_step == 0:
-            current_model, other_model = other_model, current_model
-            current_evaluator, other_evaluator = other_evaluator, current_evaluator
-            current_model.update_params() # get new weights from old model before training new
 
-        current_model.state = current_model.step(current_model.state, batch)
+        # Train up to the next step that is logged or saved
+        num_steps = min(log_every_steps - step % log_every_steps, max_steps - step)
+        if save_every_steps is not None:
+            num_steps = min(num_steps, save_every_steps - step % save_every_steps)
 
-        # Update weights
-        if current_model.config.weighting.scheme in ["grad_norm", "ntk"]:
-            if step % current_model.config.weighting.update_every_steps == 0:
-                current_model.state = current_model.update_weights(current_model.state, batch)
+        key, subkey = random.split(key)
+        coupled.train_steps(
+            random.split(subkey, jax.local_device_count()), num_steps, sampler
+        )
+        step += num_steps
 
         # Log training metrics, only use host 0 to record results
-        if jax.process_index() == 0:
-            if step % current_model.config.logging.log_every_steps == 0:
-                # Get log for current model 
-                state = jax.device_get(tree_map(lambda x: x[0], current_model.state))
-                batch = jax.device_get(tree_map(lambda x: x[0], batch))
-                log_current = current_evaluator(state, batch, u_ref, n_ref)
-
-                # Get log for other model
-                state = jax.device_get(tree_map(lambda x: x[0], other_model.state))
-                log_other = other_evaluator(state, batch, u_ref, n_ref)
-
-                # Create joint log
-                log_dict = log_current | log_other
-                
-                # Log to wandb and log
-                wandb.log(log_dict, step)
-                
-                end_time = time.time()
-                logger.log_iter(step, start_time, end_time, log_dict)
+        if jax.process_index() == 0 and step % log_every_steps == 0:
+            batch = jax.device_get(tree_map(lambda x: x[0], next(res_sampler)))
+
+            # Create joint log of both models
+            log_dict = {}
+            for model, evaluator in zip(coupled.models, evaluators):
+                state = jax.device_get(tree_map(lambda x: x[0], model.state))
+                log_dict |= evaluator(state, batch, u_ref, n_ref)
+
+            # Log to wandb and log
+            wandb.log(log_dict, step)
+
+            end_time = time.time()
+            logger.log_iter(step, start_time, end_time, log_dict)
 
         # Saving
-        if current_model.config.saving.save_every_steps is not None:
-            if (step + 1) % current_model.config.saving.save_every_steps == 0 or (
-                step + 1
-            ) == current_model.config.training.max_steps:
-                save_sequential_checkpoints(current_model.config, workdir, current_model, other_model)
-                if current_model.config.saving.plot == True:
-                    evaluate(u_config, n_config, workdir, step + 1)
-
-    return current_model, current_evaluator
+        if save_every_steps is not None:
+            if step % save_every_steps == 0 or step == max_steps:
+                # Every step updates one of the models, so step is their combined step
+                for ckpt_manager, model in zip(ckpt_managers, (u_model, n_model)):
+                    ckpt_manager.save(model.state, step=step)
+                if config.saving.plot == True:
+                    for ckpt_manager in ckpt_managers:
+                        ckpt_manager.wait()
+                    evaluate(u_config, n_config, workdir, step)
+
+    # Block until the last checkpoints are written
+    for ckpt_manager in ckpt_managers:
+        ckpt_manager.wait()
+
+    return u_model, u_evaluator
@@ -18,7 +18,7 @@ def get_dataset(n_t=200, n_x=128):
 
 def get_reference_dataset(config, file_path):
     # Load data
-    data = pd.read_csv(file_path, skiprows=8, delim_whitespace=True, header=None)
+    data = pd.read_csv(file_path, skiprows=8, sep=r"\s+", header=None)
 
     # Assign hard coded header
     part_header = ['t=2e-6'] + [f't={i}e-3' for i in range(1,8)]
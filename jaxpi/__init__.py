@@ -2,6 +2,8 @@ from jaxpi import samplers
 from jaxpi import archs
 from jaxpi import models
 from jaxpi import utils
+from jaxpi import derivatives
+from jaxpi import optimizers
 
 __version__ = "0.0.1"
 __author__ = "Sifan Wang"
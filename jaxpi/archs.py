@@ -4,8 +4,9 @@ from typing import Any, Callable, Sequence, Tuple, Optional, Union, Dict
 from flax import linen as nn
 from flax.core.frozen_dict import freeze
 
-from jax import random, jit, vmap
+from jax import lax, random, jit, vmap
 import jax.numpy as jnp
+import numpy as np
 from jax.nn.initializers import glorot_normal, normal, zeros, constant
 import jax
 import time
@@ -28,6 +29,14 @@ def _get_activation(str):
         raise NotImplementedError(f"Activation {str} not supported yet!")
 
 
+def _symmetric_uniform(scale):
+    # U(-scale, scale), unlike jax.nn.initializers.uniform, which draws from [0, scale)
+    def init(key, shape, dtype=jnp.float32):
+        return random.uniform(key, shape, dtype, minval=-scale, maxval=scale)
+
+    return init
+
+
 def _weight_fact(init_fn, mean, stddev):
     def init(key, shape):
         key1, key2 = random.split(key)
@@ -60,24 +69,33 @@ class PeriodEmbs(nn.Module):
 
         self.period_params = freeze(period_params)
 
-    @nn.compact
     def __call__(self, x):
-
         """
-        Apply the period embeddings to the specified axes.
+        Apply the period embeddings to the specified axes of the last dimension of `x`.
+
+        The non-periodic components are kept in order, followed by the cosines
+        and then the sines of the periodic ones. Leading dimensions of `x` are kept,
+        e.g. an input of shape (1, d) is not flattened.
         """
-        y = []
-
-        for i, xi in enumerate(x):
-            if i in self.axis:
-                raise NotImplementedError('Should not be here!!!!')
-                idx = self.axis.index(i)
-                period = self.period_params[f"period_{idx}"]
-                y.extend([jnp.cos(period * xi), jnp.sin(period * xi)])
-            else:
-                y.append(xi)
+        dim = x.shape[-1]
+        if any(axis >= dim for axis in self.axis):
+            raise ValueError(
+                f"Periodic axes {self.axis} are out of range for {dim} input features!"
+            )
+        idx = sorted(range(len(self.axis)), key=lambda i: self.axis[i])
+        if not idx:
+            return x
+
+        # Static index arrays, so slicing lowers to a gather with fixed indices
+        mask = np.isin(np.arange(dim), [self.axis[i] for i in idx])
+        period = jnp.stack(
+            [jnp.asarray(self.period_params[f"period_{i}"]) for i in idx]
+        )
 
-        return jnp.hstack(y)
+        phase = period * x[..., np.flatnonzero(mask)]
+        return jnp.concatenate(
+            [x[..., np.flatnonzero(~mask)], jnp.cos(phase), jnp.sin(phase)], axis=-1
+        )
 
 
 class FourierEmbs(nn.Module):
@@ -95,6 +113,110 @@ class FourierEmbs(nn.Module):
         return y
 
 
+# Primes of the spatial hash of Teschner et al., one per input dimension
+_hash_primes = (1, 2654435761, 805459861, 3674653429, 2097192037, 1434869437, 2165219737)
+
+
+def _interpolation_weights(f, interpolation):
+    if interpolation == "linear":
+        return f
+    elif interpolation == "smooth":
+        # Quintic smoothstep, whose first and second derivatives are continuous
+        return f**3 * (f * (6 * f - 15) + 10)
+    else:
+        raise NotImplementedError(f"Interpolation {interpolation} not supported yet!")
+
+
+class GridEmbs(nn.Module):
+    """Trainable multi-resolution feature grid encoding, as in Instant-NGP.
+
+    Each level interpolates `features_per_level` features between the vertices of a
+    regular grid, whose resolution grows by `growth_factor` from `base_resolution`.
+    Levels with more vertices than `table_size` look them up in a hash table, coarser
+    ones in a dense table. Inputs are scaled to the unit cube by `bounds`, a (min, max)
+    pair per input, or taken to lie in it, and extrapolated from the boundary cells
+    outside. "smooth" interpolation keeps the second derivatives of the features,
+    which vanish within a cell for "linear".
+    """
+
+    num_levels: int = 8
+    features_per_level: int = 2
+    base_resolution: int = 16
+    growth_factor: float = 1.5
+    table_size: int = 2**14
+    interpolation: str = "smooth"
+    bounds: Union[None, Tuple] = None
+
+    @nn.compact
+    def __call__(self, x):
+        dim = x.shape[-1]
+        if dim > len(_hash_primes):
+            raise NotImplementedError(f"Grid embeddings of {dim} inputs not supported yet!")
+
+        if self.bounds is not None:
+            lower, upper = jnp.asarray(self.bounds, dtype=x.dtype).T
+            x = (x - lower) / (upper - lower)
+
+        # Offsets of the 2 ** dim vertices of a cell
+        offsets = jnp.array(
+            [[(k >> i) & 1 for i in range(dim)] for k in range(2**dim)], dtype=jnp.uint32
+        )
+
+        features = []
+        for level in range(self.num_levels):
+            resolution = int(self.base_resolution * self.growth_factor**level)
+            num_vertices = (resolution + 1) ** dim
+            size = min(self.table_size, num_vertices)
+            table = self.param(
+                f"table_{level}",
+                _symmetric_uniform(1e-4),
+                (size, self.features_per_level),
+            )
+
+            # Only the position within the cell depends on x, the cell and thus the
+            # vertex indices are constant, which also keeps them out of Taylor mode
+            position = x * resolution
+            cell = jnp.clip(jnp.floor(lax.stop_gradient(position)), 0, resolution - 1)
+            f = _interpolation_weights(position - cell, self.interpolation)
+
+            vertices = cell.astype(jnp.uint32)[..., None, :] + offsets
+            if num_vertices <= self.table_size:
+                strides = jnp.array(
+                    [(resolution + 1) ** i for i in range(dim)], dtype=jnp.uint32
+                )
+                index = jnp.sum(vertices * strides, axis=-1)
+            else:
+                primes = jnp.array(_hash_primes[:dim], dtype=jnp.uint32)
+                hashed = vertices * primes
+                index = hashed[..., 0]
+                for i in range(1, dim):
+                    index = index ^ hashed[..., i]
+                index = index % jnp.uint32(size)
+
+            # Multilinear weights of the vertices, from the interpolated fractions
+            weights = 1.0
+            for i in range(dim):
+                f_i = f[..., None, i]
+                weights = weights * jnp.where(offsets[:, i] == 1, f_i, 1 - f_i)
+            features.append(
+                jnp.sum(weights[..., None] * jnp.take(table, index, axis=0), axis=-2)
+            )
+
+        return jnp.concatenate(features, axis=-1)
+
+
+def _embed_inputs(x, fourier_emb, grid_emb):
+    # Learned grid and Fourier features of the inputs, concatenated when both are set
+    embeddings = []
+    if grid_emb:
+        embeddings.append(GridEmbs(**grid_emb)(x))
+    if fourier_emb:
+        embeddings.append(FourierEmbs(**fourier_emb)(x))
+    if not embeddings:
+        return x
+    return jnp.concatenate(embeddings, axis=-1)
+
+
 class Dense(nn.Module):
     features: int
     kernel_init: Callable = glorot_normal()
@@ -138,6 +260,7 @@ class Mlp(nn.Module):
     activation: str = "tanh"
     periodicity: Union[None, Dict] = None
     fourier_emb: Union[None, Dict] = None
+    grid_emb: Union[None, Dict] = None
     reparam: Union[None, Dict] = None
 
     def setup(self):
@@ -147,8 +270,7 @@ class Mlp(nn.Module):
     def __call__(self, x):
         if self.periodicity:
             x = PeriodEmbs(**self.periodicity)(x)
-        if self.fourier_emb:
-            x = FourierEmbs(**self.fourier_emb)(x)
+        x = _embed_inputs(x, self.fourier_emb, self.grid_emb)
 
         for _ in range(self.num_layers):
             x = Dense(features=self.layer_size, reparam=self.reparam)(x)
@@ -166,8 +288,7 @@ class MlpDriftDiffusion(Mlp):
     def __call__(self, x):
         if self.periodicity:
             x = PeriodEmbs(**self.periodicity)(x)
-        if self.fourier_emb:
-            x = FourierEmbs(**self.fourier_emb)(x)
+        x = _embed_inputs(x, self.fourier_emb, self.grid_emb)
 
         for _ in range(self.num_layers):
             x = Dense(features=self.layer_size, reparam=self.reparam)(x)
@@ -187,8 +308,7 @@ class InverseMlpCaseChargeProfile(Mlp):
     def __call__(self, x):
         if self.periodicity:
             x = PeriodEmbs(**self.periodicity)(x)
-        if self.fourier_emb:
-            x = FourierEmbs(**self.fourier_emb)(x)
+        x = _embed_inputs(x, self.fourier_emb, self.grid_emb)
 
         for _ in range(self.num_layers):
             x = Dense(features=self.layer_size, reparam=self.reparam)(x)
@@ -235,6 +355,7 @@ class ModifiedMlp(nn.Module):
     activation: str = "tanh"
     periodicity: Union[None, Dict] = None
     fourier_emb: Union[None, Dict] = None
+    grid_emb: Union[None, Dict] = None
     reparam: Union[None, Dict] = None
 
     def setup(self):
@@ -245,8 +366,7 @@ class ModifiedMlp(nn.Module):
         if self.periodicity:
             x = PeriodEmbs(**self.periodicity)(x)
 
-        if self.fourier_emb:
-            x = FourierEmbs(**self.fourier_emb)(x)
+        x = _embed_inputs(x, self.fourier_emb, self.grid_emb)
 
         u = Dense(features=self.layer_size, reparam=self.reparam)(x)
         v = Dense(features=self.layer_size, reparam=self.reparam)(x)
@@ -288,6 +408,14 @@ class MlpBlock(nn.Module):
 
 
 class DeepONet(nn.Module):
+    """DeepONet, mapping an input function `u`, sampled at fixed sensor points, and a
+    query point `x` to the operator output at `x`.
+
+    `branch` embeds the input function and `trunk` combines that embedding with the
+    query points, so the branch network runs once per input function however many
+    points it is queried at.
+    """
+
     arch_name: Optional[str] = "DeepONet"
     num_branch_layers: int = 4
     num_trunk_layers: int = 4
@@ -296,33 +424,173 @@ class DeepONet(nn.Module):
     activation: str = "tanh"
     periodicity: Union[None, Dict] = None
     fourier_emb: Union[None, Dict] = None
+    grid_emb: Union[None, Dict] = None
     reparam: Union[None, Dict] = None
 
     def setup(self):
         self.activation_fn = _get_activation(self.activation)
-
-    @nn.compact
-    def __call__(self, u, x):
-        u = MlpBlock(
-            num_layers=num_branch_layers,
+        self.branch_net = MlpBlock(
+            num_layers=self.num_branch_layers,
             layer_size=self.layer_size,
             out_dim=self.layer_size,
             activation=self.activation,
             final_activation=False,
             reparam=self.reparam,
-        )(u)
-
-        x = Mlp(
-            num_layers=num_trunk_layers,
+        )
+        self.trunk_net = Mlp(
+            num_layers=self.num_trunk_layers,
             layer_size=self.layer_size,
             out_dim=self.layer_size,
             activation=self.activation,
             periodicity=self.periodicity,
             fourier_emb=self.fourier_emb,
+            grid_emb=self.grid_emb,
             reparam=self.reparam,
-        )(x)
+        )
+        self.head = Dense(features=self.out_dim, reparam=self.reparam)
 
-        y = u * x
+    def __call__(self, u, x):
+        return self.trunk(self.branch(u), x)
+
+    def branch(self, u):
+        """Branch embedding of the input functions `u`, shape (..., layer_size)."""
+        return self.branch_net(u)
+
+    def trunk(self, b, x):
+        """Outputs at the query points `x` for the branch embedding `b`, which
+        broadcasts against the trunk features, e.g. one embedding for many points."""
+        y = b * self.trunk_net(x)
         y = self.activation_fn(y)
-        y = Dense(features=self.out_dim, reparam=self.reparam)(y)
-        return y
+        return self.head(y)
+
+
+class Spinn(nn.Module):
+    """Separable PINN, with one small network per input axis whose `rank` features per
+    output are combined by an outer product over the axes.
+
+    `grid` evaluates the tensor-product grid of per-axis points, e.g. t_star x x_star,
+    with N_t + N_x network passes instead of N_t * N_x. Called with a single point it
+    behaves like the point-wise archs, as the grid of that point.
+    """
+
+    arch_name: Optional[str] = "Spinn"
+    num_layers: int = 3
+    layer_size: int = 64
+    out_dim: int = 1
+    rank: int = 32
+    activation: str = "tanh"
+    periodicity: Union[None, Dict] = None
+    fourier_emb: Union[None, Dict] = None
+    grid_emb: Union[None, Dict] = None
+    reparam: Union[None, Dict] = None
+
+    def __call__(self, x):
+        y = self.grid(*x[:, None])
+        return y.reshape(self.out_dim)
+
+    @nn.compact
+    def grid(self, *axes):
+        """Outputs on the grid of the 1D point arrays `axes`, shape (N_0, ..., out_dim)."""
+        if self.periodicity:
+            raise NotImplementedError("Period embeddings of Spinn not supported yet!")
+
+        features = []
+        for x in axes:
+            x = x[:, None]
+            x = _embed_inputs(x, self.fourier_emb, self.grid_emb)
+
+            x = MlpBlock(
+                num_layers=self.num_layers,
+                layer_size=self.layer_size,
+                out_dim=self.rank * self.out_dim,
+                activation=self.activation,
+                reparam=self.reparam,
+                final_activation=False,
+            )(x)
+            features.append(x.reshape(-1, self.rank, self.out_dim))
+
+        # Sum over the rank of the outer product over the axes, e.g. "aro,bro->abo"
+        letters = "abcdefghijklmn"[: len(axes)]
+        subscripts = ",".join(f"{c}ro" for c in letters) + f"->{letters}o"
+        return jnp.einsum(subscripts, *features)
+
+
+class Fbpinn(nn.Module):
+    """Finite basis PINN, with one small network per overlapping subdomain.
+
+    The subdomains are the cells of the tensor-product grid of `subdomain_edges`, one
+    tuple of edges per input, e.g. log-spaced edges to resolve a thin boundary layer.
+    Each is widened by `overlap` times its width and has a smooth window, the product
+    of sigmoids over the inputs, and the windows are normalized into a partition of
+    unity. A network sees the inputs scaled to its own subdomain, so the local scale
+    of the solution does not depend on the size of the domain.
+
+    The networks are vmapped over stacked parameters with the subdomain as their
+    leading axis, so all subdomains are evaluated in one batched pass, and
+    `jaxpi.utils.shard_subdomains` places them across devices.
+    """
+
+    arch_name: Optional[str] = "Fbpinn"
+    subdomain_edges: Tuple = ((0.0, 0.5, 1.0),)
+    overlap: float = 0.25
+    num_layers: int = 2
+    layer_size: int = 32
+    out_dim: int = 1
+    activation: str = "tanh"
+    periodicity: Union[None, Dict] = None
+    fourier_emb: Union[None, Dict] = None
+    grid_emb: Union[None, Dict] = None
+    reparam: Union[None, Dict] = None
+
+    def subdomains(self):
+        """Lower and upper corners of the subdomains before widening, shape (N, dim)."""
+        edges = [np.asarray(e, dtype=np.float32) for e in self.subdomain_edges]
+        cells = np.meshgrid(*[np.arange(len(e) - 1) for e in edges], indexing="ij")
+        cells = [c.ravel() for c in cells]
+        lower = np.stack([e[c] for e, c in zip(edges, cells)], axis=-1)
+        upper = np.stack([e[c + 1] for e, c in zip(edges, cells)], axis=-1)
+        return lower, upper
+
+    @nn.compact
+    def __call__(self, x):
+        if self.periodicity:
+            raise NotImplementedError("Period embeddings of Fbpinn not supported yet!")
+        if self.overlap <= 0:
+            raise ValueError(f"Overlap of the subdomains must be positive, got {self.overlap}!")
+
+        lower, upper = self.subdomains()
+        num_subdomains = lower.shape[0]
+        width = upper - lower
+
+        # Log of the windows, whose transitions span the overlap, normalized by softmax
+        z = x[..., None, :]
+        tau = self.overlap * width / 4
+        log_windows = jnp.sum(
+            nn.log_sigmoid((z - lower) / tau) + nn.log_sigmoid((upper - z) / tau), axis=-1
+        )
+        windows = nn.softmax(log_windows, axis=-1)
+
+        # Inputs scaled to [-1, 1] on the widened subdomains
+        center = (lower + upper) / 2
+        half_width = (1 + self.overlap) * width / 2
+        local = (z - center) / half_width
+
+        SubdomainMlps = nn.vmap(
+            Mlp,
+            in_axes=-2,
+            out_axes=-2,
+            variable_axes={"params": 0},
+            split_rngs={"params": True},
+            axis_size=num_subdomains,
+        )
+        y = SubdomainMlps(
+            num_layers=self.num_layers,
+            layer_size=self.layer_size,
+            out_dim=self.out_dim,
+            activation=self.activation,
+            fourier_emb=self.fourier_emb,
+            grid_emb=self.grid_emb,
+            reparam=self.reparam,
+        )(local)
+
+        return jnp.sum(windows[..., None] * y, axis=-2)
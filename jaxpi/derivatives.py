@@ -0,0 +1,199 @@
+import inspect
+
+import jax.numpy as jnp
+from jax import jvp, vmap
+from jax.experimental.jet import jet
+
+
+def _arg_names(fn):
+    # Names of the coordinate arguments of `fn(params, *args)`
+    try:
+        names = list(inspect.signature(fn).parameters)
+    except (TypeError, ValueError):
+        return []
+    return names[1:]
+
+
+def _resolve_orders(fn, orders, num_args):
+    names = _arg_names(fn)
+
+    argnums, labels = [], []
+    for key, order in orders.items():
+        if isinstance(key, int):
+            argnum = key
+            label = names[key] if key < len(names) else str(key)
+        elif key in names:
+            argnum = names.index(key)
+            label = key
+        else:
+            raise ValueError(f"Argument {key} not found in the signature of {fn}!")
+
+        if argnum >= num_args:
+            raise ValueError(f"Argument {key} was not passed to derivs!")
+
+        if order < 1:
+            raise ValueError(f"Order of argument {key} must be positive, got {order}!")
+
+        argnums.append(argnum)
+        labels.append((label, order))
+
+    return argnums, labels
+
+
+def _taylor_jet(g, z, v, order):
+    series = (v,) + (jnp.zeros_like(v),) * (order - 1)
+    u, coeffs = jet(g, (z,), (series,))
+    return u, jnp.stack(coeffs)
+
+
+def _taylor_jvp(g, z, v, order):
+    # Nested jvp that carries all lower orders along, so the primal is evaluated once
+    def h(z):
+        return (g(z),)
+
+    for _ in range(order):
+
+        def h(z, h=h):
+            primals, tangents = jvp(h, (z,), (v,))
+            return primals + (tangents[-1],)
+
+    outputs = h(z)
+    return outputs[0], jnp.stack(outputs[1:])
+
+
+_taylor_fns = {"jet": _taylor_jet, "jvp": _taylor_jvp}
+
+
+def _taylor_coefficients(fn, params, args, orders, method):
+    # Outputs of `fn` and their pure derivatives, keyed by label, with the outputs of a
+    # multi-output `fn` stacked along the last axis
+    if method not in _taylor_fns:
+        raise NotImplementedError(f"Derivative method {method} not supported yet!")
+
+    argnums, labels = _resolve_orders(fn, orders, len(args))
+    max_order = max(order for _, order in labels)
+
+    dtype = jnp.result_type(float)
+    z = jnp.stack([jnp.asarray(args[i], dtype=dtype) for i in argnums])
+
+    def g(z):
+        z_args = list(args)
+        for idx, argnum in enumerate(argnums):
+            z_args[argnum] = z[idx]
+        outputs = fn(params, *z_args)
+        if isinstance(outputs, (tuple, list)):
+            outputs = jnp.stack(outputs, axis=-1)
+        return outputs
+
+    # Batching over the directions leaves the primal unbatched, so it is computed once
+    taylor_fn = _taylor_fns[method]
+    directions = jnp.eye(len(argnums), dtype=dtype)
+    u, coeffs = vmap(lambda v: taylor_fn(g, z, v, max_order))(directions)
+
+    derivatives = {}
+    for idx, (label, order) in enumerate(labels):
+        for k in range(order):
+            derivatives[label * (k + 1)] = coeffs[idx, k]
+
+    return u[0], derivatives
+
+
+def derivs(fn, params, *args, orders, method="jet"):
+    """Evaluates a scalar network and its derivatives from one shared forward pass.
+
+    Example:
+      u, d = derivs(self.u_net, params, t, x, orders={"t": 1, "x": 2})
+      res = d["t"] + u * d["x"] - nu * d["xx"]
+
+    Args:
+      fn: Function with signature `fn(params, *args)` returning a scalar, e.g. `u_net`.
+      params: Network parameters, passed through unchanged.
+      *args: Scalar coordinates at which `fn` is evaluated.
+      orders: Maps an argument (by name in the signature of `fn`, or by position in
+        `args`) to the highest derivative order required for it.
+      method: "jet" for Taylor mode (`jax.experimental.jet`) or "jvp" for nested
+        forward mode. Both evaluate the primal once for all requested arguments.
+
+    Returns:
+      The value of `fn` and a dict with the pure derivatives, keyed by the argument
+      name repeated by the order, e.g. "x" for u_x and "xx" for u_xx.
+    """
+    return _taylor_coefficients(fn, params, args, orders, method)
+
+
+def fields(fn, params, *args, orders, method="jet"):
+    """Evaluates a multi-output network and the derivatives of all its outputs from
+    one shared forward pass, instead of one pass per output and derivative.
+
+    Example:
+      (u, v, p), (du, dv, dp) = fields(self.neural_net, params, x, y, orders={"x": 2, "y": 2})
+      ru = u * du["x"] + v * du["y"] + dp["x"] - nu * (du["xx"] + du["yy"])
+
+    Args:
+      fn: Function with signature `fn(params, *args)` returning a tuple of scalar
+        fields, e.g. `neural_net` returning (u, v, p).
+      params: Network parameters, passed through unchanged.
+      *args: Scalar coordinates at which `fn` is evaluated.
+      orders: As in `derivs`, shared by all outputs.
+      method: As in `derivs`.
+
+    Returns:
+      A tuple with the value of every output, and a tuple with one dict of its
+      derivatives per output, keyed as in `derivs`.
+    """
+    u, derivatives = _taylor_coefficients(fn, params, args, orders, method)
+    num_outputs = u.shape[-1]
+    values = tuple(u[..., i] for i in range(num_outputs))
+    output_derivatives = tuple(
+        {label: d[..., i] for label, d in derivatives.items()} for i in range(num_outputs)
+    )
+    return values, output_derivatives
+
+
+def grid_derivs(fn, params, *axes, orders, method="jvp"):
+    """Evaluates a separable network on the tensor-product grid of `axes` and its pure
+    derivatives along them, e.g. for the residuals of a `Spinn`.
+
+    Every grid point depends on axis i only through its own coordinate on that axis, so
+    a forward-mode pass with a tangent of ones along axis i gives the derivative at all
+    grid points at once, at the cost of the per-axis networks rather than the grid.
+
+    Example:
+      u, d = grid_derivs(self.u_grid, params, t, x, orders={"t": 1, "x": 2})
+      res = d["t"] + u * d["x"] - nu * d["xx"]  # shape (len(t), len(x))
+
+    Args:
+      fn: Function with signature `fn(params, *axes)` returning the values on the grid,
+        or a tuple of them for several fields, which are stacked along the last axis.
+      params: Network parameters, passed through unchanged.
+      *axes: One 1D array of points per axis.
+      orders: As in `derivs`.
+      method: As in `derivs`.
+
+    Returns:
+      The values of `fn` on the grid and a dict with its derivatives there, keyed as in
+      `derivs`.
+    """
+    if method not in _taylor_fns:
+        raise NotImplementedError(f"Derivative method {method} not supported yet!")
+
+    argnums, labels = _resolve_orders(fn, orders, len(axes))
+    taylor_fn = _taylor_fns[method]
+
+    u, derivatives = None, {}
+    for argnum, (label, order) in zip(argnums, labels):
+
+        def g(z, argnum=argnum):
+            z_axes = list(axes)
+            z_axes[argnum] = z
+            outputs = fn(params, *z_axes)
+            if isinstance(outputs, (tuple, list)):
+                outputs = jnp.stack(outputs, axis=-1)
+            return outputs
+
+        z = axes[argnum]
+        u, coeffs = taylor_fn(g, z, jnp.ones_like(z), order)
+        for k in range(order):
+            derivatives[label * (k + 1)] = coeffs[k]
+
+    return u, derivatives
@@ -1,12 +1,24 @@
+import jax
 import jax.numpy as jnp
 
-from jax import jacrev
+from jax import jit, jacrev
 from jax.tree_util import tree_map
 
-from jaxpi.utils import flatten_pytree
+from jaxpi.utils import flatten_pytree, TracedModule
 
 
-class BaseEvaluator:
+class BaseEvaluator(TracedModule):
+    """Computes the logged metrics of a training step.
+
+    Everything added to `log_dict` by `log_step` is traced into one compiled function
+    per configuration, so residuals shared between the losses, gradients, causal
+    weights and errors are computed once, and the results are fetched from the device
+    together. Host-side logging such as figures belongs in `__call__`.
+    """
+
+    # The model is passed to the compiled function explicitly
+    _untraced_attrs = ("model", "log_dict")
+
     def __init__(self, config, model):
         self.config = config
         self.model = model
@@ -25,6 +37,20 @@ class BaseEvaluator:
 
     def log_grads(self, params, batch, *args):
         grads = jacrev(self.model.losses)(params, batch, *args)
+        self._log_grad_norms(grads)
+
+    def log_losses_and_grads(self, params, batch, *args):
+        # The losses are the primal outputs of their jacobian, so both share one forward pass
+        def losses_fn(params):
+            losses = self.model.losses(params, batch, *args)
+            return losses, losses
+
+        grads, losses = jacrev(losses_fn, has_aux=True)(params)
+        for key, values in losses.items():
+            self.log_dict[key + "_loss"] = values
+        self._log_grad_norms(grads)
+
+    def _log_grad_norms(self, grads):
         for key, value in grads.items():
             flattened_grad = flatten_pytree(value)
             grad_norm = jnp.linalg.norm(flattened_grad)
@@ -37,21 +63,37 @@ class BaseEvaluator:
         for key, values in mean_ntk_dict.items():
             self.log_dict[key + "_ntk"] = values
 
-    def __call__(self, state, batch, *args):
-        # Initialize the log dict
-        self.log_dict = {}
+    def log_step(self, state, batch, *args):
+        # Traced metrics, subclasses extend this with e.g. causal weights and errors
         params = state.params
 
-        if self.config.logging.log_losses:
+        if self.config.logging.log_losses and self.config.logging.log_grads:
+            self.log_losses_and_grads(params, batch, *args)
+
+        elif self.config.logging.log_losses:
             self.log_losses(params, batch, *args)
 
+        elif self.config.logging.log_grads:
+            self.log_grads(params, batch, *args)
+
         if self.config.logging.log_weights:
             self.log_weights(state)
 
-        if self.config.logging.log_grads:
-            self.log_grads(params, batch, *args)
-
         if self.config.logging.log_ntk:
             self.log_ntk(params, batch, *args)
 
+    def compute_log_dict(self, model, state, batch, *args):
+        # Called on traced copies of the evaluator, so binding the traced model does not leak out
+        self.model = model.at_step(state.step)
+        self.log_dict = {}
+        self.log_step(state, batch, *args)
+        return self.log_dict
+
+    @jit
+    def _compiled_log_step(self, model, state, batch, *args):
+        return self.compute_log_dict(model, state, batch, *args)
+
+    def __call__(self, state, batch, *args):
+        log_dict = self._compiled_log_step(self.model, state, batch, *args)
+        self.log_dict = jax.device_get(log_dict)
         return self.log_dict
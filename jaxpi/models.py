@@ -1,3 +1,7 @@
+import os
+import copy
+import bisect
+import dataclasses
 from functools import partial
 from typing import Any, Callable, Sequence, Tuple, Optional, Dict
 
@@ -9,13 +13,26 @@ import re
 
 import jax
 import jax.numpy as jnp
-from jax import lax, jit, grad, pmap, random, tree_map, jacfwd, jacrev
-from jax.tree_util import tree_map, tree_reduce, tree_leaves, tree_flatten
+from jax import lax, jit, grad, value_and_grad, pmap, vmap, random, tree_map, jacfwd, jacrev
+from jax.tree_util import tree_map, tree_reduce, tree_leaves, tree_flatten, tree_structure
+
+import numpy as np
+
+import ml_collections
 
 import optax
 
-from jaxpi import archs
-from jaxpi.utils import flatten_pytree
+from jaxpi import archs, optimizers
+from jaxpi.utils import (
+    flatten_pytree,
+    stack_members,
+    unstack_members,
+    diag_ntk_fn,
+    hutchinson_ntk_fn,
+    chunked_map,
+    CheckpointManager,
+    TracedModule,
+)
 
 
 class TrainState(train_state.TrainState):
@@ -44,6 +61,38 @@ class TrainState(train_state.TrainState):
             **kwargs,
         )
 
+    def apply_gradients(
+        self, *, grads, value=None, value_fn=None, residual_fn=None, phase=None, **kwargs
+    ):
+        """Like `train_state.TrainState.apply_gradients`, but additionally passes the
+        loss `value`, the loss function `value_fn` and the weighted residual function
+        `residual_fn` to the optimizer.
+
+        Optimizers with a line search such as L-BFGS and Gauss-Newton type optimizers
+        need them, all other optax transformations ignore them. `phase` selects the
+        phase of a `two_phase` optimizer, see `optimizers.two_phase`.
+        """
+        extra_args = {}
+        if value_fn is not None:
+            extra_args.update(value=value, value_fn=value_fn)
+        if residual_fn is not None:
+            extra_args["residual_fn"] = residual_fn
+        if phase is not None:
+            extra_args["phase"] = phase
+
+        tx = optax.with_extra_args_support(self.tx)
+        updates, new_opt_state = tx.update(
+            grads, self.opt_state, self.params, **extra_args
+        )
+        new_params = optax.apply_updates(self.params, updates)
+
+        return self.replace(
+            step=self.step + 1,
+            params=new_params,
+            opt_state=new_opt_state,
+            **kwargs,
+        )
+
 
 def _create_arch(config):
     if config.arch_name == "Mlp":
@@ -70,6 +119,12 @@ def _create_arch(config):
     elif config.arch_name == "MlpDriftDiffusion":
         arch = archs.MlpDriftDiffusion(**config)
 
+    elif config.arch_name == "Spinn":
+        arch = archs.Spinn(**config)
+
+    elif config.arch_name == "Fbpinn":
+        arch = archs.Fbpinn(**config)
+
     else:
         raise NotImplementedError(f"Arch {config.arch_name} not supported yet!")
 
@@ -108,6 +163,36 @@ def _create_optimizer(config, params):
             learning_rate=lr, b1=config.beta1, b2=config.beta2, eps=config.eps, weight_decay=config.weight_decay,mask=weight_mask
         )
 
+    elif config.optimizer == "LBFGS":
+        tx = optimizers.lbfgs(
+            history_size=config.history_size,
+            max_linesearch_steps=config.max_linesearch_steps,
+        )
+
+    elif config.optimizer == "AdamLBFGS":
+        # Adam for the first lbfgs_start_step steps, then L-BFGS in the same optimizer state
+        lr = optax.exponential_decay(
+            init_value=config.learning_rate,
+            transition_steps=config.decay_steps,
+            decay_rate=config.decay_rate,
+        )
+        adam = optax.adam(
+            learning_rate=lr, b1=config.beta1, b2=config.beta2, eps=config.eps
+        )
+        lbfgs = optimizers.lbfgs(
+            history_size=config.history_size,
+            max_linesearch_steps=config.max_linesearch_steps,
+        )
+        tx = optimizers.two_phase(adam, lbfgs, switch_step=config.lbfgs_start_step)
+
+    elif config.optimizer == "LevenbergMarquardt":
+        # PINN.step is pmapped over the "batch" axis, each device holding part of the residuals
+        tx = optimizers.levenberg_marquardt(
+            init_damping=config.damping,
+            cg_max_steps=config.cg_max_steps,
+            axis_name="batch",
+        )
+
     else:
         raise NotImplementedError(f"Optimizer {config.optimizer} not supported yet!")
 
@@ -118,17 +203,213 @@ def _create_optimizer(config, params):
     return tx
 
 
+@dataclasses.dataclass(frozen=True)
+class ParameterSpace:
+    """Physical parameters that are additional network inputs of a parametric PINN.
+
+    Each parameter enters the network as a coordinate in [0, 1], which is mapped
+    linearly, or logarithmically with `log_scale`, onto its range. Built from
+    `config.parametric`, e.g.
+
+      config.parametric = ml_collections.ConfigDict(
+          {"n_inj": {"range": (5e9, 5e15), "log_scale": True}}
+      )
+    """
+
+    names: Tuple[str, ...]
+    lows: Tuple[float, ...]
+    highs: Tuple[float, ...]
+    log_scale: Tuple[bool, ...]
+
+    @classmethod
+    def from_config(cls, config):
+        names = tuple(sorted(config.keys()))
+        return cls(
+            names=names,
+            lows=tuple(float(config[name].range[0]) for name in names),
+            highs=tuple(float(config[name].range[1]) for name in names),
+            log_scale=tuple(bool(config[name].log_scale) for name in names),
+        )
+
+    @property
+    def dim(self):
+        return len(self.names)
+
+    @property
+    def dom(self):
+        # Sampling domain of the parameter inputs, appended to the domain of a sampler
+        return jnp.array([[0.0, 1.0]] * self.dim)
+
+    def decode(self, p):
+        # Physical values of the parameter inputs `p`, shape (..., dim)
+        values = {}
+        for i, name in enumerate(self.names):
+            low, high = self.lows[i], self.highs[i]
+            if self.log_scale[i]:
+                values[name] = low * (high / low) ** p[..., i]
+            else:
+                values[name] = low + (high - low) * p[..., i]
+        return values
+
+    def sample(self, key, num_points):
+        # Parameter inputs drawn uniformly from the sampling domain, shape (num_points, dim)
+        return random.uniform(key, (num_points, self.dim))
+
+    def encode(self, values):
+        # Parameter inputs of the physical `values`, a dict of scalars or arrays
+        p = []
+        for i, name in enumerate(self.names):
+            low, high = self.lows[i], self.highs[i]
+            value = jnp.asarray(values[name], dtype=jnp.result_type(float))
+            if self.log_scale[i]:
+                p.append(jnp.log(value / low) / jnp.log(high / low))
+            else:
+                p.append((value - low) / (high - low))
+        return jnp.stack(p, axis=-1)
+
+
+def _create_parameter_space(config):
+    if config.get("parametric"):
+        return ParameterSpace.from_config(config.parametric)
+    return None
+
+
+@dataclasses.dataclass(frozen=True)
+class ContinuationSchedule:
+    """Physical parameters changed in stages over the training steps, e.g. a Reynolds
+    number or an injection level raised towards its target. Built from
+    `config.continuation`, e.g.
+
+      config.continuation = ml_collections.ConfigDict(
+          {
+              "parameters": {"nu": (1e-2, 2.5e-3, 1e-3)},
+              "stage_steps": (20_000, 40_000, 140_000),
+              "ramp": "log",
+              "ramp_steps": 5_000,
+          }
+      )
+
+    Stage i lasts `stage_steps[i]` steps and ends at the values `parameters[name][i]`.
+    With `ramp` "linear" or "log" (geometric, for values spanning orders of magnitude)
+    the values move from those of the previous stage over its first `ramp_steps`
+    steps, with "step" they change at once. The schedule is evaluated at the traced
+    step of the train state, so the ramp runs inside the compiled step.
+    """
+
+    names: Tuple[str, ...]
+    values: Tuple[Tuple[float, ...], ...]
+    stage_steps: Tuple[int, ...]
+    ramp: str = "step"
+    ramp_steps: int = 0
+
+    @classmethod
+    def from_config(cls, config):
+        ramp = config.get("ramp", "step")
+        if ramp not in ("step", "linear", "log"):
+            raise NotImplementedError(f"Ramp {ramp} not supported yet!")
+
+        names = tuple(sorted(config.parameters.keys()))
+        stage_steps = tuple(int(s) for s in config.stage_steps)
+        values = tuple(
+            tuple(float(v) for v in config.parameters[name]) for name in names
+        )
+        for name, v in zip(names, values):
+            if len(v) != len(stage_steps):
+                raise ValueError(
+                    f"Continuation parameter {name} needs one value per stage!"
+                )
+
+        return cls(
+            names=names,
+            values=values,
+            stage_steps=stage_steps,
+            ramp=ramp,
+            ramp_steps=int(config.get("ramp_steps", 0)),
+        )
+
+    @property
+    def num_stages(self):
+        return len(self.stage_steps)
+
+    @property
+    def boundaries(self):
+        # Step at which each stage ends
+        return tuple(int(s) for s in np.cumsum(self.stage_steps))
+
+    def stage(self, step):
+        """Index of the stage containing the host-side `step`, the last one after the end."""
+        return min(bisect.bisect_right(self.boundaries, int(step)), self.num_stages - 1)
+
+    def __call__(self, step):
+        """Values of all parameters at `step`, which may be traced."""
+        boundaries = jnp.asarray(self.boundaries)
+        stage = jnp.minimum(
+            jnp.searchsorted(boundaries, step, side="right"), self.num_stages - 1
+        )
+        prev_stage = jnp.maximum(stage - 1, 0)
+
+        # Fraction of the ramp from the previous values that is done
+        if self.ramp == "step" or self.ramp_steps == 0:
+            frac = None
+        else:
+            start = jnp.where(stage > 0, boundaries[prev_stage], 0)
+            frac = jnp.clip((step - start) / self.ramp_steps, 0.0, 1.0)
+
+        physics = {}
+        for name, values in zip(self.names, self.values):
+            values = jnp.asarray(values, dtype=jnp.result_type(float))
+            prev, target = values[prev_stage], values[stage]
+            if frac is None:
+                physics[name] = target
+            elif self.ramp == "log":
+                physics[name] = prev * (target / prev) ** frac
+            else:
+                physics[name] = prev + (target - prev) * frac
+        return physics
+
+
+def _create_continuation_schedule(config):
+    if config.get("continuation"):
+        return ContinuationSchedule.from_config(config.continuation)
+    return None
+
+
+# Archs and optimizers are shared between models with equal configs. Their train
+# states then have equal tree structures and reuse the same compiled executables.
+_arch_cache = {}
+_optimizer_cache = {}
+
+
 def _create_train_state(config):
     # Initialize network
-    arch = _create_arch(config.arch)
-    x = jnp.ones(config.input_dim)
-    params = arch.init(random.PRNGKey(config.seed), x)
+    arch_key = ml_collections.FrozenConfigDict(config.arch)
+    if arch_key not in _arch_cache:
+        _arch_cache[arch_key] = _create_arch(config.arch)
+    arch = _arch_cache[arch_key]
+
+    # Parameter inputs of a parametric PINN follow the coordinates
+    parameter_space = _create_parameter_space(config)
+    input_dim = config.input_dim + (parameter_space.dim if parameter_space else 0)
+
+    x = jnp.ones(input_dim)
+    if config.arch.arch_name == "DeepONet":
+        # Operator archs also take the input function, sampled at branch_input_dim sensors
+        u = jnp.ones(config.branch_input_dim)
+        params = arch.init(random.PRNGKey(config.seed), u, x)
+    else:
+        params = arch.init(random.PRNGKey(config.seed), x)
 
     # Initialize optax optimizer
-    tx = _create_optimizer(config.optim, params)
+    optimizer_key = (ml_collections.FrozenConfigDict(config.optim), tree_structure(params))
+    if optimizer_key not in _optimizer_cache:
+        _optimizer_cache[optimizer_key] = _create_optimizer(config.optim, params)
+    tx = _optimizer_cache[optimizer_key]
 
-    # Convert config dict to dict
-    init_weights = dict(config.weighting.init_weights)
+    # Convert config dict to dict of arrays, which keeps the weights' types fixed across updates
+    init_weights = tree_map(
+        lambda w: jnp.asarray(w, dtype=jnp.result_type(float)),
+        dict(config.weighting.init_weights),
+    )
 
     state = TrainState.create(
         apply_fn=arch.apply,
@@ -141,10 +422,23 @@ def _create_train_state(config):
     return jax_utils.replicate(state)
 
 
-class PINN:
+class PINN(TracedModule):
+    # The train state is passed explicitly, only its apply_fn is read through self
+    _untraced_attrs = ("state",)
+
     def __init__(self, config):
         self.config = config
         self.state = _create_train_state(config)
+        # Physical parameters sampled as network inputs, None unless config.parametric is set
+        self.parameter_space = _create_parameter_space(config)
+        # Physical parameters ramped over the training steps, None unless
+        # config.continuation is set. Their current values are traced.
+        self.continuation = _create_continuation_schedule(config)
+        self.physics = {} if self.continuation is None else self.continuation(0)
+        # Separable archs also evaluate tensor-product grids, see grid_net
+        self.separable = config.arch.arch_name == "Spinn"
+        # Operator archs take an input function besides the coordinates, see branch_net
+        self.operator = config.arch.arch_name == "DeepONet"
 
     def u_net(self, params, *args):
         raise NotImplementedError("Subclasses should implement this!")
@@ -152,17 +446,140 @@ class PINN:
     def r_net(self, params, *args):
         raise NotImplementedError("Subclasses should implement this!")
 
+    def r_grid(self, params, *axes):
+        # Residuals on the tensor-product grid of `axes`, for separable archs
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def grid_net(self, params, *axes):
+        """Outputs of a separable arch on the tensor-product grid of the 1D point arrays
+        `axes`, shape (N_0, ..., out_dim), from one pass of each per-axis network.
+
+        Residuals on such grids take their derivatives from
+        `jaxpi.derivatives.grid_derivs`. The columns of a collocation batch can serve
+        as the axes, which turns a batch of N points into a grid of N ** dim points.
+        """
+        if not self.separable:
+            raise NotImplementedError(
+                f"Grid evaluation of arch {self.config.arch.arch_name} not supported yet!"
+            )
+        return self.state.apply_fn(params, *axes, method="grid")
+
+    def branch_net(self, params, u):
+        """Branch embedding of an operator arch for the input functions `u`, sampled at
+        the `config.branch_input_dim` sensor points, shape (..., layer_size).
+
+        Compute it once per input function and pass it to `trunk_net` for all of its
+        query points, e.g. as an argument of `u_net` that is not vmapped over, so a new
+        input function costs one branch pass.
+        """
+        if not self.operator:
+            raise NotImplementedError(
+                f"Operator evaluation of arch {self.config.arch.arch_name} not supported yet!"
+            )
+        return self.state.apply_fn(params, u, method="branch")
+
+    def trunk_net(self, params, b, x):
+        """Outputs of an operator arch at the query points `x` for the branch
+        embedding `b` from `branch_net`."""
+        if not self.operator:
+            raise NotImplementedError(
+                f"Operator evaluation of arch {self.config.arch.arch_name} not supported yet!"
+            )
+        return self.state.apply_fn(params, b, x, method="trunk")
+
     def losses(self, params, batch, *args):
         raise NotImplementedError("Subclasses should implement this!")
 
     def compute_diag_ntk(self, params, batch, *args):
         raise NotImplementedError("Subclasses should implement this!")
 
+    def diag_ntk(self, fn, params, *args):
+        """NTK diagonal of the scalar function `fn` at a batch of points, used by
+        `compute_diag_ntk`.
+
+        With `weighting.ntk_estimator = "exact"` it is computed in chunks of
+        `weighting.ntk_chunk_size` points. With "hutchinson" only its mean is estimated
+        from `weighting.ntk_num_probes` random projections, which is all the NTK
+        weighting and logging use.
+        """
+        weighting = self.config.weighting
+        if weighting.ntk_estimator == "exact":
+            return diag_ntk_fn(fn, params, *args, chunk_size=weighting.ntk_chunk_size)
+
+        elif weighting.ntk_estimator == "hutchinson":
+            return hutchinson_ntk_fn(
+                fn,
+                params,
+                *args,
+                key=self.batch_key(*args),
+                num_probes=weighting.ntk_num_probes,
+            )
+
+        else:
+            raise NotImplementedError(
+                f"NTK estimator {weighting.ntk_estimator} not supported yet!"
+            )
+
+    def batch_key(self, *args):
+        """PRNG key seeded by the points in `args`, so random draws inside a compiled
+        loss, e.g. Hutchinson probes, change with every new batch."""
+        points_sum = sum(jnp.sum(x) for x in args).astype(jnp.float32)
+        return random.fold_in(
+            random.PRNGKey(self.config.seed),
+            lax.bitcast_convert_type(points_sum, jnp.uint32),
+        )
+
+    def parameter(self, name, p, default):
+        """Value of the physical parameter `name` at the parameter inputs `p`.
+
+        Falls back to its current continuation value, or else to `default`, e.g. the
+        value in `config.setting`, unless `name` is a network input of a parametric PINN.
+        """
+        if self.parameter_space is not None and name in self.parameter_space.names:
+            return self.parameter_space.decode(p)[name]
+        return self.physics.get(name, default)
+
+    def at_step(self, step):
+        """The model with the continuation parameters of training step `step`."""
+        if self.continuation is None:
+            return self
+        model = copy.copy(self)
+        model.physics = self.continuation(step)
+        return model
+
+    def encode_parameters(self, **values):
+        """Parameter inputs for the given physical values, e.g. to query a parametric PINN
+        at a new operating point. Parameters that are not given take their value in
+        `config.setting`. Without parametric inputs the result is empty.
+        """
+        if self.parameter_space is None:
+            return jnp.zeros(0)
+
+        values = {
+            name: values[name] if name in values else self.config.setting[name]
+            for name in self.parameter_space.names
+        }
+        return self.parameter_space.encode(values)
+
+    def residuals(self, params, batch, *args):
+        # Residuals of each loss term, whose mean square is that term of `losses`
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def weighted_residuals(self, params, weights, batch, *args):
+        # Stacked residual vector whose squared norm is `loss`
+        residuals = self.residuals(params, batch, *args)
+        return jnp.concatenate(
+            [
+                jnp.sqrt(weights[key] / r.size) * jnp.ravel(r)
+                for key, r in residuals.items()
+            ]
+        )
+
     @staticmethod
     def l2_loss(x, alpha):
         return 10_000 * (x ** 2).mean()
 
-    @partial(jit, static_argnums=(0,))
+    @jit
     def loss(self, params, weights, batch, *args):
         # Compute losses
         losses = self.losses(params, batch, *args)
@@ -181,22 +598,12 @@ class PINN:
         return loss
 
  
-    @partial(jit, static_argnums=(0,))
+    @jit
     def compute_weights(self, params, batch, *args):
         if self.config.weighting.scheme == "grad_norm":
             # Compute the gradient of each loss w.r.t. the parameters
             grads = jacrev(self.losses)(params, batch, *args)
-
-            # Compute the grad norm of each loss
-            grad_norm_dict = {}
-            for key, value in grads.items():
-                flattened_grad = flatten_pytree(value)
-                grad_norm_dict[key] = jnp.linalg.norm(flattened_grad)
-
-            # Compute the mean of grad norms over all losses
-            mean_grad_norm = jnp.mean(jnp.stack(tree_leaves(grad_norm_dict)))
-            # Grad Norm Weighting
-            w = tree_map(lambda x: (mean_grad_norm / x), grad_norm_dict)
+            w = self.grad_norm_weights(grads)
 
         elif self.config.weighting.scheme == "ntk":
             # Compute the diagonal of the NTK of each loss
@@ -212,20 +619,129 @@ class PINN:
 
         return w
 
-    @partial(pmap, axis_name="batch", static_broadcasted_argnums=(0,))
-    def update_weights(self, state, batch, *args):
-        weights = self.compute_weights(state.params, batch, *args)
+    @staticmethod
+    def grad_norm_weights(grads):
+        # Compute the grad norm of each loss
+        grad_norm_dict = {}
+        for key, value in grads.items():
+            flattened_grad = flatten_pytree(value)
+            grad_norm_dict[key] = jnp.linalg.norm(flattened_grad)
+
+        # Compute the mean of grad norms over all losses
+        mean_grad_norm = jnp.mean(jnp.stack(tree_leaves(grad_norm_dict)))
+        # Grad Norm Weighting
+        w = tree_map(lambda x: (mean_grad_norm / x), grad_norm_dict)
+        return w
+
+    def _update_weights(self, state, batch):
+        model = self.at_step(state.step)
+        weights = model.compute_weights(state.params, batch)
         weights = lax.pmean(weights, "batch")
         state = state.apply_weights(weights=weights)
         return state
 
-    @partial(pmap, axis_name="batch", static_broadcasted_argnums=(0,))
-    def step(self, state, batch, *args):
-        grads = grad(self.loss)(state.params, state.weights, batch, *args)
+    def _step(self, state, batch, phase=None):
+        # Per-device update, shared by `step`, `train_steps` and the vmapped `Ensemble`
+        model = self.at_step(state.step)
+        loss, grads = value_and_grad(model.loss)(state.params, state.weights, batch)
+        grads = lax.pmean(grads, "batch")
+        loss = lax.pmean(loss, "batch")
+        state = model._apply_gradients(state, batch, loss, grads, phase)
+        return state, loss
+
+    def _step_with_weights(self, state, batch, phase=None):
+        # Per-device update of the grad norm weights fused with the step. Both use the
+        # gradients of the individual losses, so the backward passes are shared.
+        if self.config.weighting.scheme != "grad_norm":
+            raise NotImplementedError(
+                f"Fused weight updates for scheme {self.config.weighting.scheme} not supported yet!"
+            )
+        model = self.at_step(state.step)
+
+        def losses_fn(params):
+            losses = model.losses(params, batch)
+            return losses, losses
+
+        loss_grads, losses = jacrev(losses_fn, has_aux=True)(state.params)
+
+        weights = model.grad_norm_weights(loss_grads)
+        weights = lax.pmean(weights, "batch")
+        state = state.apply_weights(weights=weights)
+
+        # Weighted total loss and its gradient, with the updated weights
+        keys = list(losses)
+        loss = sum(state.weights[key] * losses[key] for key in keys)
+        grads = tree_map(
+            lambda *g: sum(state.weights[key] * g_k for key, g_k in zip(keys, g)),
+            *[loss_grads[key] for key in keys],
+        )
+
         grads = lax.pmean(grads, "batch")
-        state = state.apply_gradients(grads=grads)
+        loss = lax.pmean(loss, "batch")
+        losses = lax.pmean(losses, "batch")
+        state = model._apply_gradients(state, batch, loss, grads, phase)
+        return state, losses
+
+    def _apply_gradients(self, state, batch, loss, grads, phase=None):
+        # Only evaluated by optimizers that need them, e.g. L-BFGS and Levenberg-Marquardt
+        def value_fn(params):
+            return lax.pmean(self.loss(params, state.weights, batch), "batch")
+
+        def residual_fn(params):
+            return self.weighted_residuals(params, state.weights, batch)
+
+        return state.apply_gradients(
+            grads=grads,
+            value=loss,
+            value_fn=value_fn,
+            residual_fn=residual_fn,
+            phase=phase,
+        )
+
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def update_weights(self, state, batch):
+        return self._update_weights(state, batch)
+
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def step(self, state, batch):
+        state, _ = self._step(state, batch)
         return state
 
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def step_with_weights(self, state, batch):
+        """Updates the grad norm weights and takes a step with them in one compiled call.
+
+        The per-loss gradients are computed once and give both the weights and the
+        total gradient, so this costs about as much as `step`.
+
+        Returns:
+          The updated state and the unweighted losses, averaged over devices.
+        """
+        return self._step_with_weights(state, batch)
+
+    @partial(
+        pmap,
+        axis_name="batch",
+        in_axes=(None, 0, 0, None, None),
+        static_broadcasted_argnums=(3,),
+    )
+    def train_steps(self, state, key, num_steps, sampler):
+        """Runs `num_steps` optimizer updates inside a single compiled `lax.scan`.
+
+        Collocation batches are drawn on device with `sampler.sample`, so no host
+        round-trip is needed between the updates. `key` holds one PRNG key per device.
+
+        Returns:
+          The updated state and the weighted total loss of every step, shape (num_steps,).
+        """
+
+        def body_fn(state, key):
+            return self._step(state, sampler.sample(key))
+
+        keys = random.split(key, num_steps)
+        state, losses = lax.scan(body_fn, state, keys)
+        return state, losses
+
 
 class ForwardIVP(PINN):
     def __init__(self, config):
@@ -236,7 +752,510 @@ class ForwardIVP(PINN):
             self.num_chunks = config.weighting.num_chunks
             self.M = jnp.triu(jnp.ones((self.num_chunks, self.num_chunks)), k=1).T
 
+    def with_initial_condition(self, params, t, batch):
+        """Model and batch of the following time window, whose initial condition is
+        the prediction of `params` at time `t`, e.g. the end of this window.
+
+        Used by `ParallelTimeWindows`, so the initial condition losses of a window
+        become continuity losses at the interface with the previous one.
+        """
+        raise NotImplementedError("Subclasses should implement this!")
+
 
 class ForwardBVP(PINN):
     def __init__(self, config):
         super().__init__(config)
+
+
+def _vmap_members(fn, config, step, *args):
+    # vmaps `fn(*args, phase=...)` over the members. The two-phase optimizer picks its
+    # phase by a `lax.cond` on the step, which becomes a select running both optimizers
+    # once the step is batched, so the phase is chosen here for all members at once.
+    # Members are trained together and share the step.
+    if config.optim.optimizer != "AdamLBFGS":
+        return vmap(fn)(*args)
+
+    def phase_fn(phase):
+        return lambda args: vmap(partial(fn, phase=phase))(*args)
+
+    return lax.cond(
+        step[0] < config.optim.lbfgs_start_step, phase_fn(0), phase_fn(1), args
+    )
+
+
+class Ensemble:
+    """Trains the members of a sweep together, vmapped inside one compiled step.
+
+    Members are built separately, e.g. from configs that differ in the seed, the noise
+    level of the observations or the sampler's `k` and `c`, and must share the arch,
+    the optimizer and all array shapes. They are traced with the config of the first
+    member, so overrides only take effect while a member is built. All members are
+    at the same step, which picks the phase of the AdamLBFGS optimizer for all of them.
+
+    The stacked train state has the member axis right after the device axis.
+    """
+
+    def __init__(self, models, samplers=None):
+        self.num_members = len(models)
+        self.config = models[0].config
+
+        members = []
+        for model in models:
+            member = copy.copy(model)
+            member.config = self.config
+            members.append(member)
+
+        self.model = stack_members(members)
+        self.state = stack_members([model.state for model in models], axis=1)
+        self.samplers = None if samplers is None else stack_members(samplers)
+
+    def member_states(self):
+        """Replicated train states of all members, e.g. to save their checkpoints."""
+        return unstack_members(self.state, self.num_members, axis=1)
+
+    def update_weights(self, state, batch):
+        return self._update_weights(self.model, state, batch)
+
+    def step(self, state, batch):
+        state, _ = self._step(self.model, state, batch)
+        return state
+
+    def step_with_weights(self, state, batch):
+        return self._step_with_weights(self.model, state, batch)
+
+    def train_steps(self, state, key, num_steps):
+        """Runs `num_steps` updates of all members, each drawing from its own sampler.
+
+        Returns:
+          The updated state and the weighted total loss of every step and member,
+          shape (num_steps, num_members) per device.
+        """
+        if self.samplers is None:
+            raise ValueError("Ensemble.train_steps needs one sampler per member!")
+        return self._train_steps(self.model, self.samplers, state, key, num_steps)
+
+    def evaluate(self, evaluator, state, batch, *args):
+        """Per-member metrics of `evaluator`, each of shape (num_members,).
+
+        `state` is the unreplicated ensemble state, e.g. the first replica of `self.state`.
+        """
+        return jax.device_get(self._evaluate(evaluator, self.model, state, batch, *args))
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def _update_weights(model, state, batch):
+        return vmap(lambda model, state: model._update_weights(state, batch))(model, state)
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def _step(model, state, batch):
+        # All members are trained on the same batch
+        return _vmap_members(
+            lambda model, state, phase=None: model._step(state, batch, phase),
+            model.config,
+            state.step,
+            model,
+            state,
+        )
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0))
+    def _step_with_weights(model, state, batch):
+        return _vmap_members(
+            lambda model, state, phase=None: model._step_with_weights(
+                state, batch, phase
+            ),
+            model.config,
+            state.step,
+            model,
+            state,
+        )
+
+    @staticmethod
+    @partial(
+        pmap,
+        axis_name="batch",
+        in_axes=(None, None, 0, 0, None),
+        static_broadcasted_argnums=(4,),
+    )
+    def _train_steps(model, samplers, state, key, num_steps):
+        num_members = tree_leaves(state)[0].shape[0]
+
+        def member_step(model, sampler, state, key, phase=None):
+            return model._step(state, sampler.sample(key), phase)
+
+        def body_fn(state, key):
+            keys = random.split(key, num_members)
+            return _vmap_members(
+                member_step, model.config, state.step, model, samplers, state, keys
+            )
+
+        keys = random.split(key, num_steps)
+        state, losses = lax.scan(body_fn, state, keys)
+        return state, losses
+
+    @staticmethod
+    @jit
+    def _evaluate(evaluator, model, state, batch, *args):
+        def member_log_dict(model, state):
+            return evaluator.compute_log_dict(model, state, batch, *args)
+
+        return vmap(member_log_dict)(model, state)
+
+
+class TimeMarching:
+    """Trains consecutive time windows of an IVP with one model.
+
+    Each window continues from the parameters and optimizer state reached at the end
+    of the previous one, and only the traced initial condition changes between
+    windows, e.g. an array attribute of the model or the data of the IC sampler, so
+    all windows share the compiled step and evaluator.
+
+    Every window checkpoints into its own `time_window_<idx + 1>` directory, and its
+    contexts record the window index, so `restore` continues a preempted run in the
+    window where it stopped.
+
+    Args:
+      model: Model of the first window.
+      ic_fn: Point-wise function `ic_fn(params, t, *coords)` returning all fields of
+        the initial condition, e.g. `model.neural_net` for (u, v, p), so the next
+        initial condition takes one pass over the network.
+      workdir: Directory of the window checkpoints.
+      num_windows: Number of time windows.
+      keep: Number of checkpoints kept per window.
+      warm_start: Whether a window starts from the state of the previous one, else
+        from the initial state of the first window.
+    """
+
+    def __init__(self, model, ic_fn, workdir, num_windows, keep=5, warm_start=True):
+        self.model = model
+        self.ic_fn = ic_fn
+        self.num_windows = num_windows
+        self.warm_start = warm_start
+
+        self.init_state = model.state
+        # Window whose checkpoint `restore` loaded, which continues from it
+        self.resumed_window = None
+        self.ckpt_managers = [
+            CheckpointManager(os.path.join(workdir, f"time_window_{idx + 1}"), keep=keep)
+            for idx in range(num_windows)
+        ]
+
+    def begin_window(self, idx):
+        """Prepares the state of window `idx`, i.e. resets it to the initial state
+        without `warm_start`, unless the window continues from a restored checkpoint."""
+        if idx == self.resumed_window:
+            self.resumed_window = None
+        elif idx > 0 and not self.warm_start:
+            self.model.state = self.init_state
+
+    def initial_condition(self, t, *coords, chunk_size=None):
+        """Outputs of `ic_fn` at time `t` and the points `coords`, i.e. the initial
+        condition of the window after the one just trained."""
+        params = jax.device_get(tree_map(lambda x: x[0], self.model.state.params))
+        t = jnp.full(jnp.shape(coords[0])[0], t)
+        return chunked_map(self.ic_fn, params, t, *coords, chunk_size=chunk_size)
+
+    def save(self, idx, step, context=None):
+        """Checkpoints the state at `step` of window `idx` in the background."""
+        context = dict(context or {}, window=idx, step=step)
+        self.ckpt_managers[idx].save(self.model.state, step=step, context=context)
+
+    def restore(self):
+        """Restores the latest checkpoint of the last window that saved one.
+
+        Returns:
+          The context of that checkpoint, holding "window" and "step" besides what was
+          passed to `save`, or None if no window has a checkpoint.
+        """
+        for ckpt_manager in reversed(self.ckpt_managers):
+            context = ckpt_manager.restore_context()
+            if context is not None:
+                self.model.state = ckpt_manager.restore(
+                    self.model.state, step=context["step"]
+                )
+                self.resumed_window = context["window"]
+                return context
+        return None
+
+    def wait(self):
+        """Blocks until the checkpoints of all windows are written."""
+        for ckpt_manager in self.ckpt_managers:
+            ckpt_manager.wait()
+
+
+def _window_step(model, state, batch, phase=None):
+    return model._step(state, batch, phase)
+
+
+class ParallelTimeWindows(Ensemble):
+    """Trains all time windows of an IVP at once, as the members of an ensemble.
+
+    Every window but the first takes its initial condition from the prediction of the
+    previous window at the interface time `t`, via `ForwardIVP.with_initial_condition`,
+    so its initial condition losses are continuity losses at the interface. Within a
+    step the previous window's prediction is a fixed target, so information moves one
+    window forward per update, as in parareal, while all windows train concurrently.
+
+    The windows are vmapped inside the compiled step, which shares the work across
+    CPU cores, and each device trains all of them on its part of the batch. The
+    windows are not spread across devices: every device holds the parameters of all
+    windows, and more devices only split the batch. The stacked train state has the
+    window axis right after the device axis.
+
+    Args:
+      model: Model of the first window, holding the true initial condition. All
+        windows use its local time domain.
+      num_windows: Number of time windows.
+      t: Time of the interface in the local time of a window, i.e. its end.
+    """
+
+    def __init__(self, model, num_windows, t):
+        super().__init__([model] * num_windows)
+        self.t = t
+
+    def update_weights(self, state, batch):
+        return self._update_weights(self.model, state, batch, self.t)
+
+    def step(self, state, batch):
+        state, _ = self._step(self.model, state, batch, self.t)
+        return state
+
+    def step_with_weights(self, state, batch):
+        return self._step_with_weights(self.model, state, batch, self.t)
+
+    def train_steps(self, state, key, num_steps, sampler):
+        """Runs `num_steps` updates of all windows inside a single compiled `lax.scan`.
+
+        All windows share one local time domain, so every step draws a single batch
+        with `sampler.sample`, as `step` trains all windows on the same batch. `key`
+        holds one PRNG key per device.
+
+        Returns:
+          The updated state and the weighted total loss of every step and window,
+          shape (num_steps, num_windows) per device.
+        """
+        return self._train_steps(self.model, sampler, state, key, num_steps, self.t)
+
+    def evaluate(self, evaluator, state, batch, *args):
+        """Per-window metrics of `evaluator`, each of shape (num_windows,).
+
+        `state` is the unreplicated state, and `args` hold one entry per window along
+        their leading axis, e.g. the reference solution of every window.
+        """
+        return jax.device_get(
+            self._evaluate(evaluator, self.model, state, batch, self.t, *args)
+        )
+
+    @staticmethod
+    def _window_problems(model, params, batch, t):
+        # The first window keeps its initial condition, window k > 0 starts from the
+        # prediction of window k - 1. No gradients flow into the previous window.
+        prev_params = tree_map(lambda x: lax.stop_gradient(x[:-1]), params)
+        next_model = tree_map(lambda x: x[1:], model)
+        next_model, next_batch = vmap(
+            lambda model, params: model.with_initial_condition(params, t, batch)
+        )(next_model, prev_params)
+
+        def prepend(first, rest):
+            return jnp.concatenate([first[:1], rest])
+
+        models = tree_map(prepend, model, next_model)
+        batches = tree_map(
+            lambda x, rest: jnp.concatenate([x[None], rest]), batch, next_batch
+        )
+        return models, batches
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0, None))
+    def _update_weights(model, state, batch, t):
+        models, batches = ParallelTimeWindows._window_problems(
+            model, state.params, batch, t
+        )
+        return vmap(lambda model, state, batch: model._update_weights(state, batch))(
+            models, state, batches
+        )
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0, None))
+    def _step(model, state, batch, t):
+        models, batches = ParallelTimeWindows._window_problems(
+            model, state.params, batch, t
+        )
+        return _vmap_members(
+            _window_step, model.config, state.step, models, state, batches
+        )
+
+    @staticmethod
+    @partial(pmap, axis_name="batch", in_axes=(None, 0, 0, None))
+    def _step_with_weights(model, state, batch, t):
+        models, batches = ParallelTimeWindows._window_problems(
+            model, state.params, batch, t
+        )
+        return _vmap_members(
+            lambda model, state, batch, phase=None: model._step_with_weights(
+                state, batch, phase
+            ),
+            model.config,
+            state.step,
+            models,
+            state,
+            batches,
+        )
+
+    @staticmethod
+    @partial(
+        pmap,
+        axis_name="batch",
+        in_axes=(None, None, 0, 0, None, None),
+        static_broadcasted_argnums=(4,),
+    )
+    def _train_steps(model, sampler, state, key, num_steps, t):
+        def body_fn(state, key):
+            models, batches = ParallelTimeWindows._window_problems(
+                model, state.params, sampler.sample(key), t
+            )
+            return _vmap_members(
+                _window_step, model.config, state.step, models, state, batches
+            )
+
+        keys = random.split(key, num_steps)
+        state, losses = lax.scan(body_fn, state, keys)
+        return state, losses
+
+    @staticmethod
+    @jit
+    def _evaluate(evaluator, model, state, batch, t, *args):
+        models, batches = ParallelTimeWindows._window_problems(
+            model, state.params, batch, t
+        )
+
+        def window_log_dict(model, state, batch, *args):
+            return evaluator.compute_log_dict(model, state, batch, *args)
+
+        return vmap(window_log_dict)(models, state, batches, *args)
+
+
+class CoupledModels:
+    """Trains models whose losses depend on each other, by alternating between them.
+
+    Every `switch_every_steps` combined steps the next model in `models` takes over and
+    is trained against the current parameters of the others, its partners. A model
+    reads them from `self.partner_params`, a dict keyed by the `tag` of each partner,
+    e.g. `self.partner_params["n_model"]`. They are passed in as traced arguments, so
+    a switch neither transfers parameters to the host nor recompiles the step.
+
+    The train states of all models are held as one tuple in `state`, replicated over
+    devices like the state of a single model. The combined step is the sum of their
+    step counts, so training continues with the right model after they are restored.
+
+    Args:
+      models: Coupled models in the order they are trained, each with its own `tag`.
+      switch_every_steps: Number of combined steps before the next model takes over.
+    """
+
+    def __init__(self, models, switch_every_steps):
+        self.models = tuple(models)
+        self.switch_every_steps = switch_every_steps
+        self.state = tuple(model.state for model in self.models)
+        self.sync()
+
+    @property
+    def step(self):
+        """Combined step, i.e. the number of updates of all models together."""
+        return int(sum(jax.device_get(state.step[0]) for state in self.state))
+
+    def sync(self):
+        """Writes the states back to the models and binds the parameters of their
+        partners, taken from the first replica, e.g. before evaluating them."""
+        params = [tree_map(lambda x: x[0], state.params) for state in self.state]
+        for idx, model in enumerate(self.models):
+            model.state = self.state[idx]
+            model.partner_params = self._partner_params(self.models, params, idx)
+
+    def train_steps(self, key, num_steps, sampler):
+        """Runs `num_steps` combined steps inside a single compiled `lax.scan`.
+
+        Each step updates the model whose turn it is, including the weight updates of
+        its scheme every `update_every_steps` combined steps. Collocation batches are
+        drawn on device with `sampler.sample`, and `key` holds one PRNG key per device.
+
+        Returns:
+          The weighted total loss of the model updated at every step, shape (num_steps,).
+        """
+        self.state, losses = self._train_steps(
+            self.models, self.state, key, num_steps, sampler, self.switch_every_steps
+        )
+        self.sync()
+        return losses
+
+    @staticmethod
+    def _partner_params(models, params, idx):
+        return {
+            model.tag: model_params
+            for i, (model, model_params) in enumerate(zip(models, params))
+            if i != idx
+        }
+
+    @staticmethod
+    def _member_step(model, state, batch, update_weights):
+        scheme = model.config.weighting.scheme
+
+        if scheme == "grad_norm":
+
+            def step_with_weights(state):
+                state, losses = model._step_with_weights(state, batch)
+                loss = sum(state.weights[key] * losses[key] for key in losses)
+                return state, loss
+
+            return lax.cond(
+                update_weights,
+                step_with_weights,
+                lambda state: model._step(state, batch),
+                state,
+            )
+
+        state, loss = model._step(state, batch)
+        if scheme == "ntk":
+            state = lax.cond(
+                update_weights,
+                lambda state: model._update_weights(state, batch),
+                lambda state: state,
+                state,
+            )
+        return state, loss
+
+    @staticmethod
+    @partial(
+        pmap,
+        axis_name="batch",
+        in_axes=(None, 0, 0, None, None, None),
+        static_broadcasted_argnums=(3, 5),
+    )
+    def _train_steps(models, state, key, num_steps, sampler, switch_every_steps):
+        num_models = len(models)
+
+        def model_branch(idx):
+            def branch(state, batch, step):
+                model = copy.copy(models[idx])
+                model.partner_params = CoupledModels._partner_params(
+                    models, [member.params for member in state], idx
+                )
+                update_weights = step % model.config.weighting.update_every_steps == 0
+                member, loss = CoupledModels._member_step(
+                    model, state[idx], batch, update_weights
+                )
+                return state[:idx] + (member,) + state[idx + 1 :], loss
+
+            return branch
+
+        branches = [model_branch(idx) for idx in range(num_models)]
+
+        def body_fn(state, key):
+            step = sum(member.step for member in state)
+            idx = (step // switch_every_steps) % num_models
+            return lax.switch(idx, branches, state, sampler.sample(key), step)
+
+        keys = random.split(key, num_steps)
+        state, losses = lax.scan(body_fn, state, keys)
+        return state, losses
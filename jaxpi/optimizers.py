@@ -0,0 +1,295 @@
+from typing import NamedTuple
+
+import jax
+import jax.numpy as jnp
+from jax import lax
+from jax.flatten_util import ravel_pytree
+
+import optax
+
+
+class LbfgsState(NamedTuple):
+    count: jax.Array
+    s_memory: jax.Array
+    y_memory: jax.Array
+    rho_memory: jax.Array
+    prev_params: jax.Array
+    prev_grads: jax.Array
+
+
+def lbfgs(
+    learning_rate=1.0,
+    history_size=10,
+    max_linesearch_steps=20,
+    c1=1e-4,
+    decrease_factor=0.5,
+):
+    """L-BFGS with a backtracking (Armijo) line search.
+
+    The update needs the loss at `params` and a function evaluating the loss, passed
+    as the extra arguments `value` and `value_fn` of `update`. `TrainState.apply_gradients`
+    forwards them, and since the line search evaluates the loss repeatedly, it should
+    be run on a fixed collocation set.
+
+    Args:
+      learning_rate: Initial step length of the line search.
+      history_size: Number of curvature pairs kept for the inverse Hessian estimate.
+      max_linesearch_steps: Maximum number of step length reductions.
+      c1: Sufficient decrease constant of the Armijo condition.
+      decrease_factor: Factor by which the step length is reduced.
+    """
+
+    def init_fn(params):
+        flat_params, _ = ravel_pytree(params)
+        n = flat_params.shape[0]
+        return LbfgsState(
+            count=jnp.zeros([], jnp.int32),
+            s_memory=jnp.zeros((history_size, n), flat_params.dtype),
+            y_memory=jnp.zeros((history_size, n), flat_params.dtype),
+            rho_memory=jnp.zeros(history_size, flat_params.dtype),
+            prev_params=flat_params,
+            prev_grads=jnp.zeros_like(flat_params),
+        )
+
+    def update_fn(updates, state, params, *, value=None, value_fn=None, **extra_args):
+        if value_fn is None:
+            raise ValueError(
+                "L-BFGS needs the loss function as the extra argument value_fn!"
+            )
+
+        g, unravel = ravel_pytree(updates)
+        x, _ = ravel_pytree(params)
+        if value is None:
+            value = value_fn(params)
+
+        # Store the curvature pair of the previous step, newest last. Pairs violating
+        # the curvature condition are skipped, and empty slots have rho = 0.
+        s = x - state.prev_params
+        y = g - state.prev_grads
+        sy = jnp.dot(s, y)
+        valid = (state.count > 0) & (sy > 1e-10 * jnp.dot(y, y))
+
+        def push(memory, new):
+            return jnp.where(valid, jnp.concatenate([memory[1:], new[None]]), memory)
+
+        s_memory = push(state.s_memory, s)
+        y_memory = push(state.y_memory, y)
+        rho_memory = push(state.rho_memory, jnp.where(valid, 1.0 / sy, 0.0))
+
+        # Two-loop recursion for the direction -H g
+        def backward(q, pair):
+            s, y, rho = pair
+            alpha = rho * jnp.dot(s, q)
+            return q - alpha * y, alpha
+
+        q, alphas = lax.scan(
+            backward, g, (s_memory, y_memory, rho_memory), reverse=True
+        )
+
+        y_last = y_memory[-1]
+        gamma = jnp.where(
+            rho_memory[-1] > 0,
+            1.0 / (rho_memory[-1] * jnp.dot(y_last, y_last)),
+            1.0 / jnp.maximum(jnp.linalg.norm(g), 1e-12),
+        )
+
+        def forward(r, pair):
+            s, y, rho, alpha = pair
+            beta = rho * jnp.dot(y, r)
+            return r + s * (alpha - beta), None
+
+        r, _ = lax.scan(forward, gamma * q, (s_memory, y_memory, rho_memory, alphas))
+        direction = -r
+
+        # Fall back to steepest descent if the estimate does not give a descent direction
+        slope = jnp.dot(g, direction)
+        direction = jnp.where(
+            slope < 0, direction, -g / jnp.maximum(jnp.linalg.norm(g), 1e-12)
+        )
+        slope = jnp.dot(g, direction)
+
+        def trial_value(t):
+            return value_fn(unravel(x + t * direction))
+
+        # Negated comparison, so a NaN loss keeps reducing the step length
+        def cond_fn(carry):
+            t, value_t, i = carry
+            return ~(value_t <= value + c1 * t * slope) & (i < max_linesearch_steps)
+
+        def body_fn(carry):
+            t, _, i = carry
+            t = t * decrease_factor
+            return t, trial_value(t), i + 1
+
+        t0 = jnp.asarray(learning_rate, x.dtype)
+        t, _, _ = lax.while_loop(cond_fn, body_fn, (t0, trial_value(t0), 0))
+
+        state = LbfgsState(
+            count=optax.safe_int32_increment(state.count),
+            s_memory=s_memory,
+            y_memory=y_memory,
+            rho_memory=rho_memory,
+            prev_params=x,
+            prev_grads=g,
+        )
+        return unravel(t * direction), state
+
+    return optax.GradientTransformationExtraArgs(init_fn, update_fn)
+
+
+class TwoPhaseState(NamedTuple):
+    count: jax.Array
+    first_state: optax.OptState
+    second_state: optax.OptState
+
+
+def two_phase(first, second, switch_step):
+    """Applies `first` for `switch_step` updates and `second` afterwards.
+
+    Both optimizer states are kept from the start, so the train state and its
+    checkpoints have the same structure in both phases.
+
+    The phase is chosen by a `lax.cond` on the update count. Under `vmap` with a
+    batched count, e.g. over the members of an `Ensemble`, that becomes a select that
+    runs both optimizers every update. The caller can then choose the phase outside
+    the vmap and pass it as the extra argument `phase`, 0 for `first` and 1 for
+    `second`, so only that optimizer runs.
+    """
+    first = optax.with_extra_args_support(first)
+    second = optax.with_extra_args_support(second)
+
+    def init_fn(params):
+        return TwoPhaseState(
+            count=jnp.zeros([], jnp.int32),
+            first_state=first.init(params),
+            second_state=second.init(params),
+        )
+
+    def update_fn(updates, state, params=None, *, phase=None, **extra_args):
+        def first_fn(_):
+            new_updates, first_state = first.update(
+                updates, state.first_state, params, **extra_args
+            )
+            return new_updates, first_state, state.second_state
+
+        def second_fn(_):
+            new_updates, second_state = second.update(
+                updates, state.second_state, params, **extra_args
+            )
+            return new_updates, state.first_state, second_state
+
+        if phase is None:
+            new_updates, first_state, second_state = lax.cond(
+                state.count < switch_step, first_fn, second_fn, None
+            )
+        else:
+            new_updates, first_state, second_state = (first_fn, second_fn)[phase](None)
+        state = TwoPhaseState(
+            count=optax.safe_int32_increment(state.count),
+            first_state=first_state,
+            second_state=second_state,
+        )
+        return new_updates, state
+
+    return optax.GradientTransformationExtraArgs(init_fn, update_fn)
+
+
+class LevenbergMarquardtState(NamedTuple):
+    count: jax.Array
+    damping: jax.Array
+
+
+def levenberg_marquardt(
+    init_damping=1e-3,
+    damping_increase=2.0,
+    damping_decrease=3.0,
+    min_damping=1e-10,
+    max_damping=1e10,
+    cg_max_steps=50,
+    cg_tol=1e-5,
+    axis_name=None,
+):
+    """Matrix-free Levenberg-Marquardt, i.e. Gauss-Newton with adaptive damping.
+
+    The loss is the squared norm of a residual vector R, passed as the function
+    `residual_fn` in the extra arguments of `update`, together with `value` and the
+    loss function `value_fn`. The step solves (J^T J + damping I) d = -J^T R by
+    conjugate gradients, where the products with J and J^T are jvps and vjps of
+    `residual_fn`. The step is rejected and the damping increased if it does not
+    decrease the loss, otherwise the damping is decreased.
+
+    Args:
+      init_damping: Initial damping, small values give Gauss-Newton steps.
+      damping_increase: Factor by which the damping grows after a rejected step.
+      damping_decrease: Factor by which the damping shrinks after an accepted step.
+      min_damping: Lower bound of the damping.
+      max_damping: Upper bound of the damping.
+      cg_max_steps: Maximum number of conjugate gradient iterations per step.
+      cg_tol: Relative tolerance of the conjugate gradient solve.
+      axis_name: Mapped axis over which the residuals are split, e.g. "batch" under
+        pmap. The loss and the gradients passed to `update` are means over it.
+    """
+
+    def init_fn(params):
+        return LevenbergMarquardtState(
+            count=jnp.zeros([], jnp.int32),
+            damping=jnp.asarray(init_damping, jnp.result_type(float)),
+        )
+
+    def update_fn(
+        updates,
+        state,
+        params,
+        *,
+        value=None,
+        value_fn=None,
+        residual_fn=None,
+        **extra_args,
+    ):
+        if value_fn is None or residual_fn is None:
+            raise ValueError(
+                "Levenberg-Marquardt needs the extra arguments value_fn and residual_fn!"
+            )
+
+        g, unravel = ravel_pytree(updates)
+        x, _ = ravel_pytree(params)
+        if value is None:
+            value = value_fn(params)
+
+        def mean(v):
+            return v if axis_name is None else lax.pmean(v, axis_name)
+
+        # The gradient of |R|^2 is 2 J^T R, and its Gauss-Newton Hessian is 2 J^T J
+        _, jvp_fn = jax.linearize(lambda x: residual_fn(unravel(x)), x)
+        vjp_fn = jax.linear_transpose(jvp_fn, x)
+
+        def gauss_newton_matvec(v):
+            return mean(vjp_fn(jvp_fn(v))[0])
+
+        damping = state.damping.astype(x.dtype)
+        direction, _ = jax.scipy.sparse.linalg.cg(
+            lambda v: gauss_newton_matvec(v) + damping * v,
+            -0.5 * g,
+            tol=cg_tol,
+            maxiter=cg_max_steps,
+        )
+
+        # Compare the actual decrease with the one predicted by the linearized residuals
+        predicted = -jnp.dot(g, direction) - jnp.dot(
+            direction, gauss_newton_matvec(direction)
+        )
+        actual = value - value_fn(unravel(x + direction))
+        accept = (actual > 0) & (predicted > 0)
+
+        damping = jnp.where(
+            accept, damping / damping_decrease, damping * damping_increase
+        )
+        damping = jnp.clip(damping, min_damping, max_damping)
+
+        state = LevenbergMarquardtState(
+            count=optax.safe_int32_increment(state.count),
+            damping=damping.astype(state.damping.dtype),
+        )
+        return unravel(jnp.where(accept, direction, 0.0)), state
+
+    return optax.GradientTransformationExtraArgs(init_fn, update_fn)
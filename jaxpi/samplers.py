@@ -5,14 +5,17 @@ import jax
 from jax import lax, jit, grad, vmap
 import jax.numpy as jnp
 from jax import random, pmap, local_device_count
-from jax.tree_util import tree_map
+from jax.tree_util import tree_map, tree_leaves
 import numpy as np
+from scipy.stats import qmc
 
 import matplotlib.pyplot as plt
 import os
 
 from torch.utils.data import Dataset
 
+from jaxpi.utils import TracedModule, chunked_map
+
 
 # Function for initializing sampler from config file
 # argument: model reference, sampler name, and specific kwargs from config file 
@@ -32,11 +35,16 @@ def init_sampler(model, config, prev=None):
         return RadCosineAnnealing(model, batch_size, config, prev)
     elif sampler == "adaptive-g":
         return GradientSampler(model, batch_size, config)
+    elif sampler == "rad-persistent":
+        return PersistentRadSampler(model, batch_size, config)
     else:     
         raise NotImplementedError(f"Sampler {sampler} not implemented!")
 
 
-class BaseSampler(Dataset):
+class BaseSampler(Dataset, TracedModule):
+    # RAD samplers keep the train state they were built from, which is never traced
+    _untraced_attrs = ("state",)
+
     def __init__(self, batch_size, rng_key=random.PRNGKey(1234)):
         self.batch_size = batch_size
         self.key = rng_key
@@ -49,7 +57,13 @@ class BaseSampler(Dataset):
         batch = self.data_generation(keys)
         return batch
 
+    @partial(pmap, in_axes=(None, 0))
     def data_generation(self, key):
+        "Generates one batch of data per device"
+        return self.sample(key)
+
+    def sample(self, key):
+        "Generates batch_size samples on a single device"
         raise NotImplementedError("Subclasses should implement this!")
 
 
@@ -59,8 +73,7 @@ class UniformSampler(BaseSampler):
         self.dom = dom
         self.dim = dom.shape[0]
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         batch = random.uniform(
             key,
@@ -77,8 +90,7 @@ class OneDimensionalUniformSampler(BaseSampler):
         self.dom = dom
         self.dim = 1
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         batch = random.uniform(
             key,
@@ -95,11 +107,10 @@ class OneDimensionalRadSampler(BaseSampler):
         self.dim = 1
         self.r_eval = jnp.linspace(model.dom[0], model.dom[1], config.sampler.num_rad_points) # 100k used in paper
         self.state = jax.device_get(tree_map(lambda x: x[0], model.state))
-        res_pred = jnp.abs(model.r_pred_fn(self.state.params, self.r_eval)) # Verify shape on r_eval
+        res_pred = jnp.abs(chunked_map(model.r_pred_fn, self.state.params, self.r_eval, batched=True)) # Verify shape on r_eval
         self.prob = res_pred / jnp.sum(res_pred)
         
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         batch = random.choice(key, self.r_eval, shape=(self.batch_size,), p=self.prob) 
         batch = batch.reshape(-1, 1)
@@ -135,14 +146,13 @@ class OneDimensionalRadSamplerTwo(BaseSampler):
         self.k = config.sampler.k
         
         self.state = jax.device_get(tree_map(lambda x: x[0], model.state))
-        res_pred = jnp.abs(model.r_pred_fn(self.state.params, self.r_eval)) # Verify shape on r_eval
+        res_pred = jnp.abs(chunked_map(model.r_pred_fn, self.state.params, self.r_eval, batched=True)) # Verify shape on r_eval
     
         prob = jnp.power(res_pred, self.k) / jnp.power(res_pred, self.k).mean() + self.c
         self.norm_prob = prob / prob.sum()
         self.norm_prob_uni = jnp.ones_like(self.norm_prob) / len(self.norm_prob)
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         batch = random.choice(key, self.r_eval, shape=(self.batch_size,), p=self.norm_prob) 
         batch = batch.reshape(-1, 1)
@@ -172,6 +182,9 @@ class OneDimensionalRadSamplerTwo(BaseSampler):
 
 
 class RadCosineAnnealing(BaseSampler):
+    # The annealing phase and the split of the batch are restored on resume
+    _state_attrs = ("T_c", "num_uniform", "num_res")
+
     def __init__(self, model, batch_size, config, prev, rng_key=random.PRNGKey(1234)):
         super().__init__(batch_size, rng_key)
         
@@ -185,7 +198,7 @@ class RadCosineAnnealing(BaseSampler):
         
         # Computing residual distribution 
         self.state = jax.device_get(tree_map(lambda x: x[0], model.state))
-        res_pred = jnp.abs(model.r_pred_fn(self.state.params, self.r_eval)) # Verify shape on r_eval  
+        res_pred = jnp.abs(chunked_map(model.r_pred_fn, self.state.params, self.r_eval, batched=True)) # Verify shape on r_eval  
         prob_res = jnp.power(res_pred, self.k) / jnp.power(res_pred, self.k).mean() + self.c
         self.norm_prob_res = prob_res / prob_res.sum()
         self.norm_prob_uni = jnp.ones_like(self.norm_prob_res) / len(self.norm_prob_res)
@@ -210,8 +223,7 @@ class RadCosineAnnealing(BaseSampler):
             return 0.5 * (1 + jnp.cos(jnp.pi * T_c / T))
 
         
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"    
         uni_batch = random.uniform(key, shape=(self.num_uniform, ), minval=self.r_eval[0], maxval=self.r_eval[-1])
         res_batch = random.choice(key, self.r_eval, shape=(self.num_res, ), p=self.current_prob) 
@@ -259,19 +271,14 @@ class GradientSampler(BaseSampler):
         dl_r = jnp.abs(self.batched_gradient_computation(model, self.state.params))
         self.norm_prob =  dl_r / dl_r.sum()
 
+    @partial(jit, static_argnames=("grad_batch_size",))
     def batched_gradient_computation(self, model, params, grad_batch_size=8192):
-        num_batches = len(self.r_eval) // self.batch_size + (len(self.r_eval) % grad_batch_size != 0)
-        all_grads = []
-        for i in range(num_batches):
-            batch_r_eval = self.r_eval[i * grad_batch_size:(i + 1) * grad_batch_size]
-            batch_grads = jax.vmap(lambda r: jax.grad(model.r_net, argnums=1)(params, r))(batch_r_eval)
-            all_grads.append(batch_grads)
-        return jnp.concatenate(all_grads, axis=0)
+        return chunked_map(
+            grad(model.r_net, argnums=1), params, self.r_eval, chunk_size=grad_batch_size
+        )
     
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
-        print("data_generation")
         batch = random.choice(key, self.r_eval, shape=(self.batch_size,), p=self.norm_prob) 
         batch = batch.reshape(-1, 1)
         return batch
@@ -297,13 +304,170 @@ class GradientSampler(BaseSampler):
         plt.close(fig)
 
 
+class PersistentRadSampler(BaseSampler):
+    # RAD2 sampler whose candidate pool, residual cache and CDF stay on device
+    def __init__(self, model, batch_size, config, rng_key=random.PRNGKey(1234)):
+        super().__init__(batch_size, rng_key)
+        self.dim = 1
+        self.r_eval = jnp.linspace(model.dom[0], model.dom[1], config.sampler.num_rad_points)
+        self.c = config.sampler.c
+        self.k = config.sampler.k
+
+        # Number of candidates whose residuals are refreshed per update, in a rolling window
+        num_points = self.r_eval.shape[0]
+        self.refresh_size = max(1, min(num_points, int(config.sampler.refresh_fraction * num_points)))
+        self.offset = jnp.array(0)
+
+        self.res_pred = jnp.zeros_like(self.r_eval)
+        self.cdf = jnp.linspace(0.0, 1.0, num_points + 1)[1:]
+
+        # Fill the residual cache by cycling the window once over the whole pool
+        for _ in range(-(-num_points // self.refresh_size)):
+            self.update(model, model.state)
+
+    @jit
+    def _refresh(self, model, params):
+        num_points = self.r_eval.shape[0]
+        idx = (self.offset + jnp.arange(self.refresh_size)) % num_points
+        res_pred = jnp.abs(model.r_pred_fn(params, self.r_eval[idx]))
+        res_pred = self.res_pred.at[idx].set(res_pred)
+
+        prob = jnp.power(res_pred, self.k) / jnp.power(res_pred, self.k).mean() + self.c
+        cdf = jnp.cumsum(prob)
+        cdf = cdf / cdf[-1]
+
+        offset = (self.offset + self.refresh_size) % num_points
+        return res_pred, cdf, offset
+
+    def update(self, model, state):
+        "Refreshes the residuals of the next window of candidates without leaving the device"
+        # Parameters of the first replica, sliced on device
+        params = tree_map(lambda x: x[0], state.params)
+        self.res_pred, self.cdf, self.offset = self._refresh(model, params)
+
+    def sample(self, key):
+        "Generates data containing batch_size samples"
+        u = random.uniform(key, shape=(self.batch_size,))
+        idx = jnp.searchsorted(self.cdf, u, side="right")
+        idx = jnp.minimum(idx, self.r_eval.shape[0] - 1)
+        batch = self.r_eval[idx]
+        batch = batch.reshape(-1, 1)
+        return batch
+
+    def plot(self, workdir, step, name):
+        norm_prob = jnp.diff(self.cdf, prepend=0.0)
+        norm_prob_uni = jnp.ones_like(norm_prob) / len(norm_prob)
+
+        fig = plt.figure(figsize=(8, 8))
+        plt.xlabel('Radius [m]')
+        plt.ylabel('norm_r_eval')
+        plt.title('Residual distribution')
+        plt.plot(self.r_eval, norm_prob, label='Norm. Residual', color='blue')
+        plt.plot(self.r_eval, norm_prob_uni, label='Uniform dist.', color='red', linestyle='--')
+
+        plt.grid()
+        plt.legend()
+        plt.tight_layout()
+
+        # Save the figure
+        save_dir = os.path.join(workdir, "figures", name)
+        if not os.path.isdir(save_dir):
+            os.makedirs(save_dir)
+
+        fig_path = os.path.join(save_dir, f"rad_persistent_prob_{step}.png")
+        fig.savefig(fig_path, bbox_inches="tight", dpi=800)
+
+        plt.close(fig)
+
+
+def _candidate_pool(pool, dom, num_points, seed=0):
+    "Generates num_points candidates in the box dom of shape (dim, 2)"
+    dom = np.asarray(dom)
+    dim = dom.shape[0]
+
+    if pool == "sobol":
+        points = qmc.Sobol(d=dim, scramble=True, seed=seed).random_base2(
+            int(np.ceil(np.log2(num_points)))
+        )[:num_points]
+    elif pool == "halton":
+        points = qmc.Halton(d=dim, scramble=True, seed=seed).random(num_points)
+    elif pool == "uniform":
+        points = np.random.default_rng(seed).uniform(size=(num_points, dim))
+    elif pool == "mesh":
+        num_per_axis = int(np.round(num_points ** (1 / dim)))
+        axes = [np.linspace(0, 1, num_per_axis)] * dim
+        points = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, dim)
+    else:
+        raise NotImplementedError(f"Candidate pool {pool} not implemented!")
+
+    points = dom[:, 0] + points * (dom[:, 1] - dom[:, 0])
+    return jnp.asarray(points)
+
+
+class RadSampler(BaseSampler):
+    # Residual-based adaptive sampler for domains of any dimension, e.g. (t, x) or (x, y)
+    def __init__(
+        self,
+        dom,
+        batch_size,
+        res_fn,
+        state,
+        num_points=100_000,
+        k=1.0,
+        c=1.0,
+        pool="sobol",
+        rng_key=random.PRNGKey(1234),
+    ):
+        """
+        Args:
+          dom: Domain of shape (dim, 2), as for UniformSampler.
+          res_fn: Batched residual function res_fn(params, *coords) with one array per
+            input dimension, e.g. vmap(model.r_net, (None, 0, 0)). If it returns several
+            residuals, they are normalized by their means and summed.
+          state: Replicated train state used to evaluate the initial residuals.
+          k, c: Exponent and offset of the RAD2 density res^k / mean(res^k) + c.
+          pool: Candidate pool, one of "sobol", "halton", "uniform" or "mesh".
+        """
+        super().__init__(batch_size, rng_key)
+        self.dom = dom
+        self.dim = dom.shape[0]
+        self.res_fn = res_fn
+        self.k = k
+        self.c = c
+
+        self.r_eval = _candidate_pool(pool, dom, num_points)
+        self.update(state)
+
+    @jit
+    def _compute_cdf(self, params):
+        res_pred = chunked_map(self.res_fn, params, *self.r_eval.T, batched=True)
+        res_pred = [jnp.abs(r) for r in tree_leaves(res_pred)]
+        res_pred = sum(r / r.mean() for r in res_pred)
+
+        prob = jnp.power(res_pred, self.k) / jnp.power(res_pred, self.k).mean() + self.c
+        cdf = jnp.cumsum(prob)
+        return cdf / cdf[-1]
+
+    def update(self, state):
+        "Recomputes the sampling distribution from the current residuals"
+        params = tree_map(lambda x: x[0], state.params)
+        self.cdf = self._compute_cdf(params)
+
+    def sample(self, key):
+        "Generates data containing batch_size samples"
+        u = random.uniform(key, shape=(self.batch_size,))
+        idx = jnp.searchsorted(self.cdf, u, side="right")
+        idx = jnp.minimum(idx, self.r_eval.shape[0] - 1)
+        batch = self.r_eval[idx]
+        return batch
+
+
 class SpaceSampler(BaseSampler):
     def __init__(self, coords, batch_size, rng_key=random.PRNGKey(1234)):
         super().__init__(batch_size, rng_key)
         self.coords = coords
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         idx = random.choice(key, self.coords.shape[0], shape=(self.batch_size,))
         batch = self.coords[idx, :]
@@ -320,8 +484,7 @@ class TimeSpaceSampler(BaseSampler):
         self.temporal_dom = temporal_dom
         self.spatial_coords = spatial_coords
 
-    @partial(pmap, static_broadcasted_argnums=(0,))
-    def data_generation(self, key):
+    def sample(self, key):
         "Generates data containing batch_size samples"
         key1, key2 = random.split(key)
 
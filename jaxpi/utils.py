@@ -1,22 +1,332 @@
 import os
+import json
+import threading
+import weakref
+
+from concurrent.futures import ThreadPoolExecutor
 
 from functools import partial
 
+import numpy as np
+
 import jax
 import jax.numpy as jnp
-from jax import jit, grad, tree_map
-from jax.tree_util import tree_map
+from jax import lax, jit, grad, jvp, vmap, random, tree_map
+from jax.tree_util import tree_map, tree_leaves, tree_structure, register_pytree_node
 from jax.flatten_util import ravel_pytree
+from jax.sharding import Mesh, NamedSharding, PartitionSpec
 
 import flax 
+from flax import jax_utils, serialization
 from flax.training import checkpoints
 
+import ml_collections
+
 
 def flatten_pytree(pytree):
     return ravel_pytree(pytree)[0]
 
 
-@partial(jit, static_argnums=(0,))
+def _is_traced_leaf(x):
+    return isinstance(x, (jax.Array, np.ndarray, np.generic, float))
+
+
+def _static_key(value):
+    # Hashable representation of a static attribute used to look up compiled executables
+    if isinstance(value, ml_collections.ConfigDict):
+        value = ml_collections.FrozenConfigDict(value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+
+    # Containers compare by their contents, e.g. the empty physics dict of a PINN
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda item: repr(item[0]))
+        return (dict, tuple((name, _static_key(v)) for name, v in items))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_static_key(v) for v in value))
+
+    # Other unhashable objects fall back to identity, i.e. they never share executables
+    return ("id", id(value))
+
+
+class _StaticAttrs:
+    def __init__(self, cls, traced_names, static_attrs, module):
+        self.cls = cls
+        self.traced_names = traced_names
+        self.static_attrs = static_attrs
+        # The untraced attributes are read from the flattened module when unflattening,
+        # so the compiled executables keyed by this object do not keep them alive
+        self.module = weakref.ref(module)
+        self.key = (
+            cls,
+            traced_names,
+            tuple((name, _static_key(value)) for name, value in static_attrs),
+        )
+        self.hash = hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, _StaticAttrs) and (
+            self is other or (self.hash == other.hash and self.key == other.key)
+        )
+
+    def __hash__(self):
+        return self.hash
+
+
+_static_attrs_cache = weakref.WeakKeyDictionary()
+_unflattened_traced_names = weakref.WeakKeyDictionary()
+
+
+class TracedModule:
+    """Base class for objects passed as traced arguments to `jit` and `pmap`.
+
+    Subclasses are registered as pytrees. Array and float attributes (and pytrees
+    of them, e.g. parameter dicts) become traced leaves, while everything else is
+    static and decides which compiled executable is used. A new instance whose
+    static attributes compare equal therefore reuses the executables of an old one.
+
+    Attributes listed in `_untraced_attrs` are carried along without being traced
+    or compared, e.g. the train state, which is passed explicitly to every step.
+    Unflattened modules read them from the module that was flattened.
+    """
+
+    _untraced_attrs = ()
+
+    # Static attributes that are still part of the state saved by `state_dict`
+    _state_attrs = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        register_pytree_node(cls, cls._tree_flatten, cls._tree_unflatten)
+
+    def _tree_flatten(self):
+        # JAX may rebuild a module with placeholder leaves, e.g. to match `in_axes`,
+        # and flatten it again. Its traced attributes then stay traced.
+        traced_before = _unflattened_traced_names.get(self, ())
+
+        traced_names, children, static_attrs = [], [], []
+        for name, value in sorted(vars(self).items()):
+            if name in self._untraced_attrs:
+                continue
+            # Other modules, e.g. coupled models referring to each other, stay static
+            if not isinstance(value, TracedModule):
+                leaves = tree_leaves(value)
+                if name in traced_before or (
+                    leaves and all(_is_traced_leaf(x) for x in leaves)
+                ):
+                    traced_names.append(name)
+                    children.append(value)
+                    continue
+            static_attrs.append((name, value))
+
+        # Building the key freezes the config, so reuse it while the static attributes
+        # are the same objects. Like static arguments, they must not be mutated in place.
+        signature = (
+            tuple(traced_names),
+            tuple((name, id(value)) for name, value in static_attrs),
+        )
+        cached = _static_attrs_cache.get(self)
+        if cached is not None and cached[0] == signature:
+            aux = cached[1]
+        else:
+            aux = _StaticAttrs(type(self), tuple(traced_names), tuple(static_attrs), self)
+            _static_attrs_cache[self] = (signature, aux)
+
+        return children, aux
+
+    @classmethod
+    def _tree_unflatten(cls, aux, children):
+        obj = object.__new__(aux.cls)
+        obj.__dict__.update(aux.static_attrs)
+        obj.__dict__.update(zip(aux.traced_names, children))
+        module = aux.module()
+        if module is not None:
+            obj.__dict__.update(
+                (name, value)
+                for name, value in vars(module).items()
+                if name in cls._untraced_attrs
+            )
+        _unflattened_traced_names[obj] = aux.traced_names
+        return obj
+
+    def state_dict(self):
+        """Traced attributes and `_state_attrs`, e.g. the pool, CDF and key of a sampler."""
+        children, aux = self._tree_flatten()
+        state = dict(zip(aux.traced_names, children))
+        state.update({name: getattr(self, name) for name in self._state_attrs})
+        return state
+
+    def load_state_dict(self, state):
+        for name, value in state.items():
+            if isinstance(getattr(self, name, None), jax.Array):
+                value = jnp.asarray(value)
+            setattr(self, name, value)
+
+
+def stack_members(trees, axis=0):
+    """Stacks pytrees of equal structure, e.g. train states or models, along `axis`."""
+    treedef = tree_structure(trees[0])
+    for idx, tree in enumerate(trees[1:], start=1):
+        if tree_structure(tree) != treedef:
+            raise ValueError(
+                f"Member {idx} has a different tree structure than member 0, which "
+                "usually means that static attributes such as the config differ!"
+            )
+    return tree_map(lambda *x: jnp.stack(x, axis=axis), *trees)
+
+
+def unstack_members(tree, num_members, axis=0):
+    """Splits a pytree stacked by `stack_members` into a list of its members."""
+    return [tree_map(lambda x: jnp.take(x, idx, axis=axis), tree) for idx in range(num_members)]
+
+
+def shard_subdomains(params, devices=None):
+    """Places the parameters of the subdomain networks of an `Fbpinn`, stacked along
+    their leading axis, across `devices`, by default all local devices.
+
+    Functions compiled with `jit` then evaluate every device's subdomains there and
+    only exchange the blended outputs. `pmap` steps replicate the whole state instead.
+    """
+    devices = jax.local_devices() if devices is None else devices
+    num_subdomains = {x.shape[0] if jnp.ndim(x) else None for x in tree_leaves(params)}
+    if len(num_subdomains) != 1 or None in num_subdomains:
+        raise ValueError("Parameters are not stacked along a leading subdomain axis!")
+
+    num_subdomains = num_subdomains.pop()
+    if num_subdomains % len(devices) != 0:
+        raise ValueError(
+            f"Cannot shard {num_subdomains} subdomains across {len(devices)} devices!"
+        )
+
+    mesh = Mesh(np.asarray(devices), ("subdomains",))
+    sharding = NamedSharding(mesh, PartitionSpec("subdomains"))
+    return jax.device_put(params, sharding)
+
+
+_default_chunk_size = 8192
+_chunk_size_cache = {}
+
+
+def _jaxpr_bytes(jaxpr):
+    # Upper bound on the memory of a jaxpr: inputs plus every intermediate kept alive
+    avals = [v.aval for v in jaxpr.invars]
+    total = 0
+    for eqn in jaxpr.eqns:
+        avals += [v.aval for v in eqn.outvars]
+        for param in eqn.params.values():
+            for sub in param if isinstance(param, (tuple, list)) else (param,):
+                if isinstance(sub, jax.core.ClosedJaxpr):
+                    total += _jaxpr_bytes(sub.jaxpr)
+                elif isinstance(sub, jax.core.Jaxpr):
+                    total += _jaxpr_bytes(sub)
+    for aval in avals:
+        if hasattr(aval, "shape"):
+            total += int(np.prod(aval.shape)) * aval.dtype.itemsize
+    return total
+
+
+def _chunk_size_from_budget(map_fn, params, args, memory_budget):
+    # The traced memory grows linearly with the number of points, so its slope
+    # between chunks of one and two points is the cost per point
+    sizes = [
+        _jaxpr_bytes(
+            jax.make_jaxpr(map_fn)(params, *[jnp.asarray(x)[:n] for x in args]).jaxpr
+        )
+        for n in (1, 2)
+    ]
+    bytes_per_point = max(sizes[1] - sizes[0], 1)
+    return max(1, int(memory_budget // bytes_per_point))
+
+
+def _map_in_chunks(map_fn, args, chunk_size):
+    num_points = args[0].shape[0]
+    num_chunks = -(-num_points // chunk_size)
+    pad = num_chunks * chunk_size - num_points
+
+    # Pad with the last point, so the padded evaluations stay finite
+    def to_chunks(x):
+        x = jnp.pad(x, [(0, pad)] + [(0, 0)] * (x.ndim - 1), mode="edge")
+        return x.reshape((num_chunks, chunk_size) + x.shape[1:])
+
+    outputs = lax.map(lambda chunk: map_fn(*chunk), tuple(to_chunks(x) for x in args))
+    return tree_map(
+        lambda y: y.reshape((num_chunks * chunk_size,) + y.shape[2:])[:num_points],
+        outputs,
+    )
+
+
+@partial(jit, static_argnames=("fn", "chunk_size", "batched"))
+def _chunked_map(fn, owner, params, args, chunk_size, batched):
+    if owner is not None:
+        fn = partial(fn, owner)
+    map_fn = fn if batched else jax.vmap(fn, (None,) + (0,) * len(args))
+    return _map_in_chunks(partial(map_fn, params), args, chunk_size)
+
+
+def chunked_map(fn, params, *args, chunk_size=None, memory_budget=None, batched=False):
+    """Evaluates a point-wise function over a large set of points in fixed-size chunks.
+
+    The points are padded to a multiple of `chunk_size` and streamed through a single
+    compiled `lax.map`, so memory stays bounded and only one executable is built,
+    e.g. `chunked_map(model.r_net, params, r_eval)` or, for the input gradient,
+    `chunked_map(grad(model.r_net, argnums=1), params, r_eval)`.
+
+    `fn` is a static argument, so pass a stable function (methods of a `TracedModule`
+    are fine, the instance is traced) rather than a new lambda on every call.
+
+    Args:
+      fn: Function `fn(params, *coords)`. Unless `batched` is set it is evaluated at
+        a single point and vectorized with `vmap`.
+      params: Network parameters, shared by all chunks.
+      *args: Arrays of equal leading dimension holding the points.
+      chunk_size: Number of points per chunk.
+      memory_budget: Bytes available to one chunk, used to derive `chunk_size` when
+        it is not given. Defaults to chunks of 8192 points.
+      batched: Whether `fn` already takes a batch of points.
+
+    Returns:
+      The outputs of `fn` at all points, stacked along the leading axis.
+    """
+    args = tuple(jnp.asarray(x) for x in args)
+    num_points = args[0].shape[0]
+
+    owner = getattr(fn, "__self__", None)
+    if isinstance(owner, TracedModule):
+        fn = fn.__func__
+    else:
+        owner = None
+
+    if chunk_size is None:
+        if memory_budget is None:
+            chunk_size = _default_chunk_size
+        else:
+            key = (
+                fn,
+                tree_structure(owner),
+                batched,
+                memory_budget,
+                tuple((x.shape, x.dtype) for x in tree_leaves(params)),
+                tuple((x.shape[1:], x.dtype) for x in args),
+            )
+            try:
+                chunk_size = _chunk_size_cache.get(key)
+            except TypeError:
+                key = None
+                chunk_size = None
+            if chunk_size is None:
+                bound_fn = fn if owner is None else partial(fn, owner)
+                map_fn = bound_fn if batched else jax.vmap(bound_fn, (None,) + (0,) * len(args))
+                chunk_size = _chunk_size_from_budget(map_fn, params, args, memory_budget)
+                if key is not None:
+                    _chunk_size_cache[key] = chunk_size
+
+    chunk_size = max(1, min(int(chunk_size), num_points))
+    return _chunked_map(fn, owner, params, args, chunk_size, batched)
+
+
 def jacobian_fn(apply_fn, params, *args):
     # apply_fn needs to be a scalar function
     J = grad(apply_fn, argnums=0)(params, *args)
@@ -24,13 +334,62 @@ def jacobian_fn(apply_fn, params, *args):
     return J
 
 
-@partial(jit, static_argnums=(0,))
 def ntk_fn(apply_fn, params, *args):
     # apply_fn needs to be a scalar function
     J = jacobian_fn(apply_fn, params, *args)
     K = jnp.dot(J, J)
     return K
 
+
+_default_ntk_chunk_size = 256
+
+
+def _broadcast_points(args):
+    # Scalar coordinates, e.g. t0 of an initial condition, are shared by all points
+    return tuple(jnp.atleast_1d(x) for x in jnp.broadcast_arrays(*args))
+
+
+def diag_ntk_fn(apply_fn, params, *args, chunk_size=None):
+    """NTK diagonal of the scalar function `apply_fn` at a batch of points.
+
+    Equal to `vmap(ntk_fn, (None, None, 0, ...))(apply_fn, params, *args)`, but the
+    parameter gradients are only materialized for `chunk_size` points at a time, so
+    memory no longer grows with the batch size times the number of parameters.
+    """
+    args = _broadcast_points(args)
+    chunk_size = min(chunk_size or _default_ntk_chunk_size, args[0].shape[0])
+
+    def map_fn(*chunk):
+        in_axes = (None, None) + (0,) * len(chunk)
+        return vmap(ntk_fn, in_axes)(apply_fn, params, *chunk)
+
+    return _map_in_chunks(map_fn, args, chunk_size)
+
+
+def hutchinson_ntk_fn(apply_fn, params, *args, key, num_probes=8):
+    """Estimates the mean NTK diagonal of the scalar function `apply_fn` at a batch of
+    points from `num_probes` random projections.
+
+    With J the Jacobian of the outputs at all points w.r.t. the parameters, the NTK
+    diagonal sums to tr(J J^T) = E|J u|^2 for Rademacher probes u. Each probe is a single
+    jvp over the batch instead of one parameter gradient per point.
+    """
+    args = _broadcast_points(args)
+    in_axes = (None,) + (0,) * len(args)
+
+    def outputs_fn(params):
+        return vmap(apply_fn, in_axes)(params, *args)
+
+    flat_params, unravel = ravel_pytree(params)
+    probes = random.rademacher(key, (num_probes,) + flat_params.shape, flat_params.dtype)
+
+    def squared_norm(u):
+        _, Ju = jvp(outputs_fn, (params,), (unravel(u),))
+        return jnp.sum(Ju ** 2)
+
+    trace = jnp.mean(lax.map(squared_norm, probes))
+    return trace / args[0].shape[0]
+
 def save_checkpoint(state, workdir, keep=5, name=None):
     #Use legacy checkpointing in order to run in colab 
     flax.config.update('flax_use_orbax_checkpointing', False)
@@ -47,6 +406,171 @@ def save_checkpoint(state, workdir, keep=5, name=None):
         checkpoints.save_checkpoint(workdir, state, step=step, keep=keep)
 
 
+class CheckpointManager:
+    """Saves checkpoints on a background thread while training continues.
+
+    `save` snapshots the first replica of the state on device and starts its transfer
+    to the host, then returns. Serialization and writing happen on a worker thread,
+    so call `wait` before reading the checkpoints or exiting. The files use the legacy
+    flax format of `save_checkpoint`, so `restore_checkpoint` reads them as before.
+
+    Retention keeps the `keep` most recent checkpoints and, if `best_metric` is set,
+    the `keep_best` checkpoints with the best value of that metric, e.g. the
+    "l2_error" of the evaluator's log dict passed to `save`.
+
+    A `context` passed to `save`, e.g. the loop step, sampler state and wandb run id,
+    is written next to the checkpoint, so `restore_context` and `restore` continue a
+    preempted run where it stopped.
+    """
+
+    prefix = "checkpoint_"
+    context_prefix = "context_"
+    metrics_file = "ckpt_metrics.json"
+
+    def __init__(self, workdir, keep=5, best_metric=None, keep_best=1, mode="min"):
+        if mode not in ("min", "max"):
+            raise NotImplementedError(f"Mode {mode} not supported yet!")
+
+        self.workdir = workdir
+        self.keep = keep
+        self.best_metric = best_metric
+        self.keep_best = keep_best if best_metric is not None else 0
+        self.mode = mode
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = []
+        self._lock = threading.Lock()
+
+        # Metrics of earlier runs in the same directory take part in the retention
+        self._metrics = {}
+        path = os.path.join(workdir, self.metrics_file)
+        if os.path.isfile(path):
+            with open(path) as f:
+                self._metrics = {int(k): v for k, v in json.load(f).items()}
+
+    def save(self, state, metrics=None, step=None, context=None):
+        """Schedules a checkpoint of the replicated `state` and returns immediately."""
+        self._check_errors()
+        if jax.process_index() != 0:
+            return
+
+        # Slicing copies the first replica, so later updates of the state do not race
+        # with the write. The transfer to the host then overlaps with the next steps.
+        state = tree_map(lambda x: x[0], state)
+        for x in tree_leaves(state):
+            if isinstance(x, jax.Array):
+                x.copy_to_host_async()
+
+        metric = None
+        if self.best_metric is not None and metrics is not None:
+            metric = float(jax.device_get(metrics[self.best_metric]))
+
+        self._futures.append(
+            self._executor.submit(self._write, state, metric, step, context)
+        )
+
+    def wait(self):
+        """Blocks until all scheduled checkpoints are written and reraises errors."""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def all_steps(self):
+        steps = []
+        if os.path.isdir(self.workdir):
+            for name in os.listdir(self.workdir):
+                if name.startswith(self.prefix) and name[len(self.prefix):].isdigit():
+                    steps.append(int(name[len(self.prefix):]))
+        return sorted(steps)
+
+    def latest_step(self):
+        steps = self.all_steps()
+        return steps[-1] if steps else None
+
+    def restore_context(self, step=None):
+        """Context saved with the checkpoint at `step`, by default the latest one."""
+        step = self.latest_step() if step is None else step
+        path = os.path.join(self.workdir, f"{self.context_prefix}{step}")
+        if step is None or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return serialization.msgpack_restore(f.read())
+
+    def restore(self, state, step=None):
+        """Restores the replicated `state` from the checkpoint at `step`."""
+        state = jax.device_get(tree_map(lambda x: x[0], state))
+        state = restore_checkpoint(state, self.workdir, step=step)
+        return jax_utils.replicate(state)
+
+    def best_step(self):
+        """Step of the best written checkpoint, or None without a best metric."""
+        with self._lock:
+            candidates = {s: m for s, m in self._metrics.items() if s in self.all_steps()}
+        if not candidates:
+            return None
+        select = min if self.mode == "min" else max
+        return select(candidates, key=candidates.get)
+
+    def _check_errors(self):
+        # Surface failed writes early instead of only at `wait`
+        pending = []
+        for future in self._futures:
+            if future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self._futures = pending
+
+    def _write(self, state, metric, step, context):
+        state = jax.device_get(state)
+        step = int(state.step) if step is None else int(step)
+
+        if not os.path.isdir(self.workdir):
+            os.makedirs(self.workdir, exist_ok=True)
+
+        # The context goes first, so every checkpoint found on restore has its context
+        if context is not None:
+            context = serialization.msgpack_serialize(jax.device_get(context))
+            self._write_file(f"{self.context_prefix}{step}", context)
+        self._write_file(f"{self.prefix}{step}", serialization.to_bytes(state))
+
+        with self._lock:
+            if metric is not None:
+                self._metrics[step] = metric
+            self._remove_old_checkpoints()
+
+    def _write_file(self, name, data):
+        # Write to a hidden file first, so a crash never leaves a truncated checkpoint
+        tmp_path = os.path.join(self.workdir, f".{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.workdir, name))
+
+    def _remove_old_checkpoints(self):
+        steps = self.all_steps()
+
+        kept = set(steps if self.keep is None else steps[::-1][: self.keep])
+        if self.keep_best:
+            scored = sorted(
+                (s for s in steps if s in self._metrics),
+                key=self._metrics.get,
+                reverse=self.mode == "max",
+            )
+            kept.update(scored[: self.keep_best])
+
+        for s in steps:
+            if s not in kept:
+                os.remove(os.path.join(self.workdir, f"{self.prefix}{s}"))
+                context_path = os.path.join(self.workdir, f"{self.context_prefix}{s}")
+                if os.path.isfile(context_path):
+                    os.remove(context_path)
+                self._metrics.pop(s, None)
+
+        if self.best_metric is not None:
+            with open(os.path.join(self.workdir, self.metrics_file), "w") as f:
+                json.dump(self._metrics, f)
+
+
 def restore_checkpoint(state, workdir, step=None):
     #Use legacy checkpointing in order to run in colab
     flax.config.update('flax_use_orbax_checkpointing', False)
@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+
+import jax
+import jax.numpy as jnp
+import pytest
+from jax import random, vmap
+
+from jaxpi import archs
+from jaxpi.utils import shard_subdomains
+
+
+def _init(arch, x):
+    return arch.init(random.PRNGKey(0), x)
+
+
+@pytest.mark.parametrize("out_dim", [1, 2])
+def test_spinn_grid_matches_pointwise(out_dim):
+    arch = archs.Spinn(num_layers=2, layer_size=16, rank=8, out_dim=out_dim)
+    t = jnp.linspace(0.0, 1.0, 5)
+    x = jnp.linspace(-1.0, 1.0, 7)
+    params = _init(arch, jnp.zeros(2))
+
+    grid = arch.apply(params, t, x, method=arch.grid)
+    tt, xx = jnp.meshgrid(t, x, indexing="ij")
+    points = jnp.stack([tt.ravel(), xx.ravel()], axis=-1)
+    pointwise = vmap(arch.apply, (None, 0))(params, points)
+
+    assert grid.shape == (5, 7, out_dim)
+    assert jnp.allclose(grid.reshape(-1, out_dim), pointwise, atol=1e-5)
+
+
+def test_fbpinn_batch_matches_pointwise():
+    arch = archs.Fbpinn(
+        subdomain_edges=((0.0, 0.3, 1.0), (-1.0, 0.0, 1.0)), layer_size=16, out_dim=2
+    )
+    points = random.uniform(random.PRNGKey(1), (50, 2), minval=-1.0)
+    params = _init(arch, jnp.zeros(2))
+
+    batch = arch.apply(params, points)
+    pointwise = vmap(arch.apply, (None, 0))(params, points)
+
+    assert batch.shape == (50, 2)
+    assert jnp.allclose(batch, pointwise, atol=1e-6)
+
+
+def test_fbpinn_stacks_one_network_per_subdomain():
+    arch = archs.Fbpinn(subdomain_edges=((0.0, 0.1, 0.5, 1.0),), layer_size=8)
+    params = _init(arch, jnp.zeros(1))
+
+    lower, upper = arch.subdomains()
+    assert lower.shape == upper.shape == (3, 1)
+    leading_axes = {p.shape[0] for p in jax.tree_util.tree_leaves(params)}
+    assert leading_axes == {3}
+
+
+def _period_embs(axis):
+    return archs.PeriodEmbs(period=(2.0, 3.0), axis=axis, trainable=(False, True))
+
+
+@pytest.mark.parametrize("shape", [(3,), (1, 3), (5, 3)])
+def test_period_embs_output_shape(shape):
+    embs = _period_embs(axis=(2, 0))
+    x = random.uniform(random.PRNGKey(0), shape)
+    params = embs.init(random.PRNGKey(1), x)
+    y = embs.apply(params, x)
+
+    # The non-periodic input, then the cosines and sines of inputs 0 and 2
+    assert y.shape == shape[:-1] + (5,)
+    period = jnp.array([3.0, 2.0])
+    phase = period * x[..., jnp.array([0, 2])]
+    assert jnp.allclose(y[..., 0], x[..., 1])
+    assert jnp.allclose(y[..., 1:3], jnp.cos(phase))
+    assert jnp.allclose(y[..., 3:], jnp.sin(phase))
+
+
+@pytest.mark.parametrize("shape", [(1,), (1, 1)])
+def test_period_embs_reject_missing_axes(shape):
+    embs = _period_embs(axis=(0, 1))
+    x = random.uniform(random.PRNGKey(0), shape)
+    with pytest.raises(ValueError, match="out of range"):
+        embs.init(random.PRNGKey(1), x)
+
+
+def test_period_embs_keep_leading_dimensions():
+    embs = archs.PeriodEmbs(period=(2.0,), axis=(0,), trainable=(False,))
+    x = random.uniform(random.PRNGKey(0), (1, 1))
+    y = embs.apply(embs.init(random.PRNGKey(1), x), x)
+
+    assert y.shape == (1, 2)
+    assert jnp.allclose(y, jnp.concatenate([jnp.cos(2.0 * x), jnp.sin(2.0 * x)], -1))
+
+
+def test_grid_embs_accept_restored_params():
+    embs = archs.GridEmbs(num_levels=3, base_resolution=4, table_size=2**6)
+    x = random.uniform(random.PRNGKey(0), (20, 2))
+    params = embs.init(random.PRNGKey(1), x)
+
+    # Checkpoints restore the tables as numpy arrays
+    y = vmap(embs.apply, (None, 0))(params, x)
+    restored = vmap(embs.apply, (None, 0))(jax.device_get(params), x)
+
+    assert y.shape == (20, 6)
+    assert jnp.allclose(y, restored)
+    for table in jax.tree_util.tree_leaves(params):
+        assert jnp.all(jnp.abs(table) <= 1e-4)
+
+
+def test_deeponet_trunk_reuses_the_branch_embedding():
+    arch = archs.DeepONet(num_branch_layers=2, num_trunk_layers=2, layer_size=16)
+    u = random.normal(random.PRNGKey(0), (10,))
+    x = random.uniform(random.PRNGKey(1), (30, 2))
+    params = arch.init(random.PRNGKey(2), u, x[0])
+
+    # One branch embedding for all query points
+    b = arch.apply(params, u, method=arch.branch)
+    cached = arch.apply(params, b, x, method=arch.trunk)
+    pointwise = vmap(arch.apply, (None, None, 0))(params, u, x)
+
+    assert set(params["params"]) == {"branch_net", "trunk_net", "head"}
+    assert b.shape == (16,)
+    assert cached.shape == (30, 1)
+    assert jnp.allclose(cached, pointwise, atol=1e-6)
+
+
+_SHARDED_FBPINN = """
+import os
+import subprocess
+import sys
+
+import jax
+import jax.numpy as jnp
+from jax import jit, random
+
+from jaxpi import archs
+from jaxpi.utils import shard_subdomains
+from jaxpi.utils import shard_subdomains
+
+assert jax.local_device_count() == 4
+arch = archs.Fbpinn(subdomain_edges=((0.0, 0.25, 0.5, 0.75, 1.0),), layer_size=8)
+params = arch.init(random.PRNGKey(0), jnp.zeros(1))
+x = random.uniform(random.PRNGKey(1), (64, 1))
+
+sharded = shard_subdomains(params)
+for p in jax.tree_util.tree_leaves(sharded):
+    assert len(p.sharding.device_set) == 4
+    assert all(s.data.shape[0] == 1 for s in p.addressable_shards)
+
+def loss(params, x):
+    return jnp.mean(arch.apply(params, x) ** 2)
+
+value, grads = jit(jax.value_and_grad(loss))(sharded, x)
+expected_value, expected_grads = jax.value_and_grad(loss)(params, x)
+assert jnp.allclose(value, expected_value, rtol=1e-5)
+for g, expected in zip(jax.tree_util.tree_leaves(grads), jax.tree_util.tree_leaves(expected_grads)):
+    assert jnp.allclose(g, expected, rtol=1e-4, atol=1e-6)
+    assert len(g.sharding.device_set) == 4
+"""
+
+
+def test_fbpinn_subdomains_shard_across_devices():
+    # The device count is fixed when JAX starts, so the check runs in a new process
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, XLA_FLAGS="--xla_force_host_platform_device_count=4")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-c", _SHARDED_FBPINN], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr[-4000:]
+
+
+def test_shard_subdomains_needs_divisible_subdomains():
+    arch = archs.Fbpinn(subdomain_edges=((0.0, 0.5, 1.0),), layer_size=8)
+    params = _init(arch, jnp.zeros(1))
+    with pytest.raises(ValueError):
+        shard_subdomains(params, devices=jax.local_devices() * 3)
+    with pytest.raises(ValueError):
+        shard_subdomains({"params": params, "scale": jnp.ones(())})
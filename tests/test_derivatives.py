@@ -0,0 +1,112 @@
+import jax
+import jax.numpy as jnp
+import pytest
+from jax import grad, random
+
+from jaxpi.derivatives import derivs, fields, grid_derivs
+
+
+def _init_params(key, in_dim=2, width=16, out_dim=1):
+    k1, k2, k3 = random.split(key, 3)
+    return {
+        "w": random.normal(k1, (width, in_dim)),
+        "b": random.normal(k2, (width,)),
+        "v": random.normal(k3, (out_dim, width)) / width,
+    }
+
+
+def _mlp(params, z):
+    return params["v"] @ jnp.tanh(params["w"] @ z + params["b"])
+
+
+def u_net(params, t, x):
+    return _mlp(params, jnp.stack([t, x]))[0]
+
+
+def _nested_grad(fn, argnum, order):
+    for _ in range(order):
+        fn = grad(fn, argnums=argnum)
+    return fn
+
+
+@pytest.fixture
+def params():
+    return _init_params(random.PRNGKey(0))
+
+
+@pytest.mark.parametrize("method", ["jet", "jvp"])
+def test_derivs_matches_nested_grad(params, method):
+    t, x = 0.3, -0.7
+    u, d = derivs(u_net, params, t, x, orders={"t": 2, "x": 3}, method=method)
+
+    assert jnp.allclose(u, u_net(params, t, x))
+    assert set(d) == {"t", "tt", "x", "xx", "xxx"}
+    for name, argnum in (("t", 1), ("x", 2)):
+        for order in range(1, 4 if name == "x" else 3):
+            expected = _nested_grad(u_net, argnum, order)(params, t, x)
+            assert jnp.allclose(d[name * order], expected, rtol=1e-4, atol=1e-5)
+
+
+def test_derivs_accepts_positional_orders(params):
+    _, by_name = derivs(u_net, params, 0.1, 0.2, orders={"x": 2})
+    _, by_position = derivs(u_net, params, 0.1, 0.2, orders={1: 2})
+
+    assert jnp.allclose(by_name["xx"], by_position["xx"])
+
+
+def test_derivs_under_vmap(params):
+    t = jnp.linspace(0.0, 1.0, 5)
+    x = jnp.linspace(-1.0, 1.0, 5)
+    _, d = jax.vmap(lambda t, x: derivs(u_net, params, t, x, orders={"x": 2}))(t, x)
+
+    expected = jax.vmap(_nested_grad(u_net, 2, 2), (None, 0, 0))(params, t, x)
+    assert jnp.allclose(d["xx"], expected, rtol=1e-4, atol=1e-5)
+
+
+def test_derivs_rejects_unknown_arguments(params):
+    with pytest.raises(ValueError):
+        derivs(u_net, params, 0.1, 0.2, orders={"y": 1})
+    with pytest.raises(NotImplementedError):
+        derivs(u_net, params, 0.1, 0.2, orders={"x": 1}, method="finite_differences")
+
+
+def uv_net(params, t, x):
+    u, v = _mlp(params, jnp.stack([t, x]))
+    return u, v
+
+
+@pytest.mark.parametrize("method", ["jet", "jvp"])
+def test_fields_matches_nested_grad_of_each_output(method):
+    params = _init_params(random.PRNGKey(1), out_dim=2)
+    t, x = 0.4, 0.1
+    values, output_derivatives = fields(
+        uv_net, params, t, x, orders={"t": 1, "x": 2}, method=method
+    )
+
+    assert len(values) == len(output_derivatives) == 2
+    for i, (value, d) in enumerate(zip(values, output_derivatives)):
+        output_fn = lambda params, t, x, i=i: uv_net(params, t, x)[i]
+        assert jnp.allclose(value, output_fn(params, t, x))
+        assert set(d) == {"t", "x", "xx"}
+        for label, argnum, order in (("t", 1, 1), ("x", 2, 1), ("xx", 2, 2)):
+            expected = _nested_grad(output_fn, argnum, order)(params, t, x)
+            assert jnp.allclose(d[label], expected, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("method", ["jet", "jvp"])
+def test_grid_derivs_matches_nested_grad(params, method):
+    t = jnp.linspace(0.0, 1.0, 4)
+    x = jnp.linspace(-1.0, 1.0, 6)
+    u_grid = lambda params, t, x: jax.vmap(
+        jax.vmap(u_net, (None, None, 0)), (None, 0, None)
+    )(params, t, x)
+    u, d = grid_derivs(u_grid, params, t, x, orders={"t": 1, "x": 2}, method=method)
+
+    assert u.shape == (4, 6)
+    assert jnp.allclose(u, u_grid(params, t, x), atol=1e-6)
+    for label, argnum, order in (("t", 1, 1), ("x", 2, 1), ("xx", 2, 2)):
+        grad_fn = _nested_grad(u_net, argnum, order)
+        expected = jax.vmap(jax.vmap(grad_fn, (None, None, 0)), (None, 0, None))(
+            params, t, x
+        )
+        assert jnp.allclose(d[label], expected, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,202 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, "examples")
+
+# Shared overrides that shrink a run to a few steps of a small network
+SMALL_RUN = {
+    "training.max_steps": 4,
+    "training.batch_size_per_device": 64,
+    "arch.layer_size": 16,
+    "logging.log_every_steps": 2,
+}
+
+
+# Config file of a run, the example config with overrides, which unlike flags can be None
+_CONFIG_TEMPLATE = """\
+import importlib.util
+
+spec = importlib.util.spec_from_file_location("example_config", {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+
+
+def get_config():
+    config = module.get_config()
+    config.update_from_flattened_dict({overrides!r})
+    return config
+"""
+
+
+def run_example(example, config, tmp_path, **overrides):
+    """Trains an example through its own main.py, on `config` with `overrides`.
+
+    The run works in `tmp_path`, which the files written by the examples' evaluation
+    end up in, with the example's data directory linked into it.
+    """
+    example_dir = os.path.join(EXAMPLES, example)
+    data_dir = os.path.join(example_dir, "data")
+    if os.path.isdir(data_dir) and not (tmp_path / "data").exists():
+        os.symlink(data_dir, tmp_path / "data")
+
+    config_file = tmp_path / "config.py"
+    config_file.write_text(
+        _CONFIG_TEMPLATE.format(
+            path=os.path.join(example_dir, "configs", f"{config}.py"),
+            overrides={**SMALL_RUN, **overrides},
+        )
+    )
+    args = [
+        sys.executable,
+        os.path.join(example_dir, "main.py"),
+        f"--config={config_file}",
+        f"--workdir={tmp_path}",
+    ]
+
+    env = dict(os.environ, WANDB_MODE="disabled", WANDB_DIR=str(tmp_path))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        args, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=900
+    )
+    assert result.returncode == 0, result.stderr[-4000:]
+    return result
+
+
+# laplace_2.5 cannot run without its COMSOL reference data, which is not in the repository
+LAPLACE_2_5_REFERENCE = {
+    "eval.potential_file_path": os.path.join(
+        EXAMPLES, "laplace_2.5", "Case1p5_validation_data_U_vs_x_ninj5e13.txt(1).txt"
+    ),
+    "eval.field_file_path": os.path.join(
+        EXAMPLES, "laplace_2.5", "Case1p5_validation_data_E_vs_x_ninj5e13.txt(1).txt"
+    ),
+}
+needs_laplace_2_5_reference = pytest.mark.skipif(
+    not all(os.path.exists(path) for path in LAPLACE_2_5_REFERENCE.values()),
+    reason="Reference data of laplace_2.5 not found",
+)
+
+
+def test_laplace_adam_lbfgs(tmp_path):
+    run_example(
+        "laplace",
+        "adam_lbfgs",
+        tmp_path,
+        **{"optim.lbfgs_start_step": 2, "optim.history_size": 5},
+    )
+
+
+def test_inverse_geom_adam_lbfgs(tmp_path):
+    run_example(
+        "inverse_geom",
+        "adam_lbfgs",
+        tmp_path,
+        **{"optim.lbfgs_start_step": 2, "optim.history_size": 5},
+    )
+
+
+@needs_laplace_2_5_reference
+def test_laplace_2_5_adam_lbfgs(tmp_path):
+    run_example(
+        "laplace_2.5",
+        "adam_lbfgs",
+        tmp_path,
+        **LAPLACE_2_5_REFERENCE,
+        **{
+            "setting.n_x": 256,
+            "optim.lbfgs_start_step": 2,
+            "optim.history_size": 5,
+            "arch.fourier_emb.embed_dim": 16,
+        },
+    )
+
+
+def test_inverse_geom_levenberg_marquardt(tmp_path):
+    run_example(
+        "inverse_geom",
+        "levenberg_marquardt",
+        tmp_path,
+        **{"optim.cg_max_steps": 5, "arch.fourier_emb.embed_dim": 16},
+    )
+
+
+
+def test_laplace_fbpinn(tmp_path):
+    run_example("laplace", "fbpinn", tmp_path)
+
+def test_drift_diffusion_spinn(tmp_path):
+    run_example("drift_diffusion", "spinn", tmp_path, **{"arch.rank": 4})
+
+
+def test_coupled_case_spinn(tmp_path):
+    run_example("coupled_case", "spinn", tmp_path, **{"arch.rank": 4})
+
+
+def test_drift_diffusion_grid_emb(tmp_path):
+    run_example(
+        "drift_diffusion",
+        "grid_emb",
+        tmp_path,
+        **{"arch.grid_emb.num_levels": 2, "arch.grid_emb.table_size": 2**8},
+    )
+
+
+def test_seq_coupled_case_parametric(tmp_path):
+    run_example(
+        "seq_coupled_case",
+        "parametric",
+        tmp_path,
+        **{
+            "setting.switch_every_step": 2,
+            "arch.num_layers": 2,
+            "arch.fourier_emb.embed_dim": 16,
+            # The COMSOL reference data is not part of the repository
+            "eval.ion_density_file_path": None,
+            "eval.potential_file_path": None,
+            "eval.field_file_path": None,
+        },
+    )
+
+
+def test_ks_chaotic_parallel_in_time_resumes(tmp_path):
+    overrides = {
+        "training.parallel_in_time": True,
+        "training.num_time_windows": 2,
+        "training.batch_size": 64,
+        "arch.num_layers": 2,
+        "arch.fourier_emb.embed_dim": 16,
+        "saving.save_every_steps": 2,
+    }
+    result = run_example("legacy_examples/ks_chaotic", "default", tmp_path, **overrides)
+    assert "Iter:   0" in result.stderr
+
+    ckpt_dir = tmp_path / "ckpt" / "default"
+    for window in ("time_window_1", "time_window_2"):
+        assert {"checkpoint_2", "checkpoint_4"} <= set(os.listdir(ckpt_dir / window))
+
+    # A second run continues from the checkpoints of the first
+    overrides.update({"training.max_steps": 6, "saving.resume": True})
+    result = run_example("legacy_examples/ks_chaotic", "default", tmp_path, **overrides)
+    assert "Iter:   0" not in result.stderr
+    assert "Iter:   4" in result.stderr
+    for window in ("time_window_1", "time_window_2"):
+        assert "checkpoint_6" in os.listdir(ckpt_dir / window)
+
+
+@needs_laplace_2_5_reference
+def test_laplace_2_5_grid_emb(tmp_path):
+    run_example(
+        "laplace_2.5",
+        "grid_emb",
+        tmp_path,
+        **LAPLACE_2_5_REFERENCE,
+        **{
+            "setting.n_x": 256,
+            "arch.grid_emb.num_levels": 2,
+            "arch.grid_emb.table_size": 2**8,
+        },
+    )
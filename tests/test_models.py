@@ -0,0 +1,183 @@
+import gc
+import weakref
+
+import jax
+import jax.numpy as jnp
+import ml_collections
+import numpy as np
+import pytest
+from jax import random, vmap
+
+from jaxpi import models
+
+
+def get_config():
+    config = ml_collections.ConfigDict()
+    config.seed = 0
+    config.input_dim = 1
+
+    config.arch = ml_collections.ConfigDict(
+        {
+            "arch_name": "Mlp",
+            "num_layers": 2,
+            "layer_size": 16,
+            "out_dim": 1,
+            "activation": "tanh",
+            "periodicity": None,
+            "fourier_emb": None,
+            "reparam": None,
+        }
+    )
+    config.optim = ml_collections.ConfigDict(
+        {
+            "optimizer": "Adam",
+            "beta1": 0.9,
+            "beta2": 0.999,
+            "eps": 1e-8,
+            "learning_rate": 1e-3,
+            "decay_rate": 0.9,
+            "decay_steps": 100,
+            "grad_accum_steps": 0,
+        }
+    )
+    config.weighting = ml_collections.ConfigDict(
+        {
+            "scheme": "grad_norm",
+            "init_weights": {"res": 1.0, "bcs": 1.0},
+            "momentum": 0.9,
+        }
+    )
+    return config
+
+
+class Poisson(models.ForwardBVP):
+    # u'' = -1 on [0, 1] with u(0) = u(1) = 0
+    def u_net(self, params, x):
+        return self.state.apply_fn(params, jnp.stack([x]))[0]
+
+    def r_net(self, params, x):
+        u_xx = jax.grad(jax.grad(self.u_net, argnums=1), argnums=1)(params, x)
+        return u_xx + 1.0
+
+    def losses(self, params, batch):
+        x = batch[:, 0]
+        res = vmap(self.r_net, (None, 0))(params, x)
+        bcs = vmap(self.u_net, (None, 0))(params, jnp.array([0.0, 1.0]))
+        return {"res": jnp.mean(res**2), "bcs": jnp.mean(bcs**2)}
+
+
+@pytest.fixture
+def batch():
+    x = random.uniform(random.PRNGKey(0), (jax.local_device_count(), 32, 1))
+    return x
+
+
+def _cache_size(fn):
+    # Number of compiled executables, a method of jit functions and a property of pmap's
+    size = fn._cache_size
+    return size() if callable(size) else size
+
+
+def test_identical_models_share_executables(batch):
+    fns = (models.PINN.step, models.PINN.update_weights, models.PINN.loss)
+    before = [_cache_size(fn) for fn in fns]
+
+    sizes = []
+    for _ in range(3):
+        model = Poisson(get_config())
+        for _ in range(2):
+            model.state = model.step(model.state, batch)
+        model.state = model.update_weights(model.state, batch)
+        params, weights = jax.tree_util.tree_map(
+            lambda x: x[0], (model.state.params, model.state.weights)
+        )
+        model.loss(params, weights, batch[0])
+        sizes.append([_cache_size(fn) - size for fn, size in zip(fns, before)])
+
+    assert sizes == [[1, 1, 1]] * 3
+
+
+def test_train_state_is_not_part_of_the_static_key(batch):
+    model = Poisson(get_config())
+    state = weakref.ref(model.state)
+    _, aux = model._tree_flatten()
+
+    model.state = model.step(model.state, batch)
+
+    # The static attributes are not rebuilt for a new state, and the compiled step
+    # does not keep the old one alive
+    assert model._tree_flatten()[1] is aux
+    gc.collect()
+    assert state() is None
+
+
+def _train(model, batch, num_steps):
+    for _ in range(num_steps):
+        model.state = model.step(model.state, batch)
+
+
+def test_time_marching_resumes_without_warm_start(tmp_path, batch):
+    model = Poisson(get_config())
+    marching = models.TimeMarching(model, model.u_net, str(tmp_path), 3, warm_start=False)
+    for idx, num_steps in enumerate((2, 3)):
+        marching.begin_window(idx)
+        _train(model, batch, num_steps)
+        marching.save(idx, num_steps)
+    marching.wait()
+    assert int(model.state.step[0]) == 3
+
+    # A resumed run continues the restored window instead of resetting it
+    model = Poisson(get_config())
+    marching = models.TimeMarching(model, model.u_net, str(tmp_path), 3, warm_start=False)
+    context = marching.restore()
+    assert (context["window"], context["step"]) == (1, 3)
+
+    marching.begin_window(context["window"])
+    assert int(model.state.step[0]) == 3
+
+    # Later windows start from the initial state again
+    marching.begin_window(2)
+    assert int(model.state.step[0]) == 0
+
+
+class CountedPoisson(Poisson):
+    # Records every evaluation of the losses, once per batch of vmapped members
+    calls = []
+
+    def losses(self, params, batch):
+        jax.debug.callback(lambda: self.calls.append(1))
+        return super().losses(params, batch)
+
+
+def _adam_lbfgs_config():
+    config = get_config()
+    config.optim.optimizer = "AdamLBFGS"
+    config.optim.lbfgs_start_step = 2
+    config.optim.history_size = 5
+    config.optim.max_linesearch_steps = 10
+    return config
+
+
+def test_ensemble_runs_one_phase_of_adam_lbfgs(batch):
+    ensemble = models.Ensemble([CountedPoisson(_adam_lbfgs_config()) for _ in range(2)])
+    model = CountedPoisson(_adam_lbfgs_config())
+
+    # The Adam steps evaluate the losses only for the gradient, without the line
+    # search of L-BFGS
+    for _ in range(2):
+        CountedPoisson.calls.clear()
+        ensemble.state = ensemble.step(ensemble.state, batch)
+        jax.effects_barrier()
+        assert len(CountedPoisson.calls) == 1
+
+    for _ in range(2):
+        ensemble.state = ensemble.step(ensemble.state, batch)
+    _train(model, batch, 4)
+
+    for state in ensemble.member_states():
+        assert int(state.step[0]) == 4
+        jax.tree_util.tree_map(
+            lambda x, y: np.testing.assert_allclose(x, y, rtol=1e-4, atol=1e-6),
+            state.params,
+            model.state.params,
+        )
@@ -0,0 +1,112 @@
+import jax
+import jax.numpy as jnp
+import optax
+import pytest
+from jax import random
+
+from jaxpi import optimizers
+
+
+def _quadratic(key, dim=10, condition_number=100.0):
+    # Ill-conditioned quadratic with its minimum at `x_star`
+    q, _ = jnp.linalg.qr(random.normal(key, (dim, dim)))
+    eigenvalues = jnp.logspace(0.0, jnp.log10(condition_number), dim)
+    A = (q * eigenvalues) @ q.T
+    x_star = jnp.arange(dim, dtype=jnp.float32) / dim
+
+    def loss(params):
+        d = params["x"] - x_star
+        return 0.5 * d @ A @ d
+
+    return loss, x_star
+
+
+def _minimize(tx, loss, params, num_steps, **extra_args):
+    state = tx.init(params)
+    for _ in range(num_steps):
+        value, grads = jax.value_and_grad(loss)(params)
+        updates, state = tx.update(
+            grads, state, params, value=value, value_fn=loss, **extra_args
+        )
+        params = optax.apply_updates(params, updates)
+    return params, state
+
+
+def test_lbfgs_converges_on_a_quadratic():
+    loss, x_star = _quadratic(random.PRNGKey(0))
+    params = {"x": jnp.zeros_like(x_star)}
+
+    params, state = _minimize(optimizers.lbfgs(history_size=10), loss, params, 40)
+
+    assert state.count == 40
+    assert loss(params) < 1e-8
+    assert jnp.allclose(params["x"], x_star, atol=1e-3)
+
+
+def test_lbfgs_needs_the_loss_function():
+    tx = optimizers.lbfgs()
+    params = {"x": jnp.zeros(3)}
+    with pytest.raises(ValueError):
+        tx.update(params, tx.init(params), params)
+
+
+def test_two_phase_switches_after_switch_step():
+    loss, x_star = _quadratic(random.PRNGKey(1))
+    params = {"x": jnp.zeros_like(x_star)}
+    tx = optimizers.two_phase(optax.adam(1e-2), optimizers.lbfgs(), switch_step=5)
+
+    params, state = _minimize(tx, loss, params, 30)
+
+    assert state.count == 30
+    assert state.first_state[0].count == 5
+    assert state.second_state.count == 25
+    assert loss(params) < 1e-6
+
+
+def _exponential_fit(num_points=50):
+    # Nonlinear least squares: fit y = a exp(b x) to noiseless data
+    x = jnp.linspace(0.0, 1.0, num_points)
+    a_star, b_star = 2.0, -1.5
+    y = a_star * jnp.exp(b_star * x)
+
+    def residual_fn(params):
+        return params["a"] * jnp.exp(params["b"] * x) - y
+
+    def loss(params):
+        return jnp.sum(residual_fn(params) ** 2)
+
+    return loss, residual_fn, (a_star, b_star)
+
+
+def test_levenberg_marquardt_solves_least_squares():
+    loss, residual_fn, (a_star, b_star) = _exponential_fit()
+    params = {"a": jnp.asarray(1.0), "b": jnp.asarray(0.0)}
+    tx = optimizers.levenberg_marquardt(init_damping=1.0)
+
+    params, state = _minimize(tx, loss, params, 20, residual_fn=residual_fn)
+
+    assert state.count == 20
+    assert loss(params) < 1e-8
+    assert jnp.allclose(params["a"], a_star, atol=1e-3)
+    assert jnp.allclose(params["b"], b_star, atol=1e-3)
+
+
+def test_levenberg_marquardt_needs_the_residuals():
+    loss, _, _ = _exponential_fit()
+    tx = optimizers.levenberg_marquardt()
+    params = {"a": jnp.asarray(1.0), "b": jnp.asarray(0.0)}
+    with pytest.raises(ValueError):
+        tx.update(params, tx.init(params), params, value_fn=loss)
+
+
+def test_two_phase_runs_the_given_phase():
+    loss, x_star = _quadratic(random.PRNGKey(2))
+    params = {"x": jnp.zeros_like(x_star)}
+    tx = optimizers.two_phase(optax.adam(1e-2), optimizers.lbfgs(), switch_step=5)
+
+    # An explicit phase overrides the update count
+    _, state = _minimize(tx, loss, params, 3, phase=1)
+
+    assert state.count == 3
+    assert state.first_state[0].count == 0
+    assert state.second_state.count == 3
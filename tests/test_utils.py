@@ -0,0 +1,157 @@
+import jax
+import jax.numpy as jnp
+import pytest
+from flax import jax_utils
+from jax import random, vmap
+
+from jaxpi.utils import (
+    CheckpointManager,
+    chunked_map,
+    diag_ntk_fn,
+    hutchinson_ntk_fn,
+    ntk_fn,
+)
+
+
+def _init_params(key, in_dim=2, width=16):
+    k1, k2, k3 = random.split(key, 3)
+    return {
+        "w": random.normal(k1, (width, in_dim)),
+        "b": random.normal(k2, (width,)),
+        "v": random.normal(k3, (width,)) / width,
+    }
+
+
+def u_net(params, t, x):
+    return params["v"] @ jnp.tanh(params["w"] @ jnp.stack([t, x]) + params["b"])
+
+
+def u_net_batched(params, t, x):
+    return vmap(u_net, (None, 0, 0))(params, t, x)
+
+
+@pytest.fixture
+def params():
+    return _init_params(random.PRNGKey(0))
+
+
+@pytest.fixture
+def points():
+    key_t, key_x = random.split(random.PRNGKey(1))
+    return random.uniform(key_t, (1000,)), random.uniform(key_x, (1000,))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 256, 1000, 4096])
+def test_chunked_map_matches_vmap(params, points, chunk_size):
+    expected = vmap(u_net, (None, 0, 0))(params, *points)
+    outputs = chunked_map(u_net, params, *points, chunk_size=chunk_size)
+
+    assert outputs.shape == expected.shape
+    assert jnp.allclose(outputs, expected, atol=1e-6)
+
+
+def test_chunked_map_batched_and_memory_budget(params, points):
+    expected = vmap(u_net, (None, 0, 0))(params, *points)
+
+    batched = chunked_map(u_net_batched, params, *points, chunk_size=64, batched=True)
+    budgeted = chunked_map(u_net, params, *points, memory_budget=2**16)
+
+    assert jnp.allclose(batched, expected, atol=1e-6)
+    assert jnp.allclose(budgeted, expected, atol=1e-6)
+
+
+def test_chunked_map_of_input_gradient(params, points):
+    grad_fn = jax.grad(u_net, argnums=2)
+    expected = vmap(grad_fn, (None, 0, 0))(params, *points)
+    outputs = chunked_map(grad_fn, params, *points, chunk_size=128)
+
+    assert jnp.allclose(outputs, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 64, 300])
+def test_diag_ntk_matches_ntk_fn(params, points, chunk_size):
+    t, x = points[0][:300], points[1][:300]
+    expected = vmap(ntk_fn, (None, None, 0, 0))(u_net, params, t, x)
+    outputs = diag_ntk_fn(u_net, params, t, x, chunk_size=chunk_size)
+
+    assert outputs.shape == expected.shape
+    assert jnp.allclose(outputs, expected, rtol=1e-5)
+
+
+def test_diag_ntk_broadcasts_scalar_coordinates(params, points):
+    x = points[1][:50]
+    expected = vmap(ntk_fn, (None, None, None, 0))(u_net, params, 0.0, x)
+
+    assert jnp.allclose(diag_ntk_fn(u_net, params, 0.0, x, chunk_size=16), expected, rtol=1e-5)
+
+
+def test_hutchinson_ntk_estimates_the_mean(params, points):
+    t, x = points[0][:100], points[1][:100]
+    expected = jnp.mean(vmap(ntk_fn, (None, None, 0, 0))(u_net, params, t, x))
+    estimate = hutchinson_ntk_fn(
+        u_net, params, t, x, key=random.PRNGKey(0), num_probes=2000
+    )
+
+    assert jnp.allclose(estimate, expected, rtol=0.1)
+
+
+def _replicated_state(value):
+    return jax_utils.replicate({"params": jnp.full(3, float(value))})
+
+
+def _saved_steps(ckpt_manager):
+    ckpt_manager.wait()
+    return ckpt_manager.all_steps()
+
+
+@pytest.mark.parametrize("keep, expected", [(2, [30, 40]), (5, [10, 20, 30, 40])])
+def test_checkpoint_manager_keeps_latest(tmp_path, keep, expected):
+    ckpt_manager = CheckpointManager(str(tmp_path), keep=keep)
+    for step in (10, 20, 30, 40):
+        ckpt_manager.save(_replicated_state(step), step=step)
+
+    assert _saved_steps(ckpt_manager) == expected
+
+
+@pytest.mark.parametrize("mode, best", [("min", 20), ("max", 30)])
+def test_checkpoint_manager_keeps_best(tmp_path, mode, best):
+    ckpt_manager = CheckpointManager(
+        str(tmp_path), keep=1, best_metric="l2_error", keep_best=1, mode=mode
+    )
+    for step, error in ((10, 0.5), (20, 0.1), (30, 0.9), (40, 0.3)):
+        ckpt_manager.save(_replicated_state(step), {"l2_error": error}, step=step)
+
+    assert _saved_steps(ckpt_manager) == sorted({best, 40})
+    assert ckpt_manager.best_step() == best
+
+    # Metrics of earlier runs in the same directory take part in the retention
+    ckpt_manager = CheckpointManager(
+        str(tmp_path), keep=1, best_metric="l2_error", keep_best=1, mode=mode
+    )
+    ckpt_manager.save(_replicated_state(50), {"l2_error": 0.5}, step=50)
+    assert _saved_steps(ckpt_manager) == sorted({best, 50})
+
+
+def test_checkpoint_manager_resume_round_trip(tmp_path):
+    ckpt_manager = CheckpointManager(str(tmp_path), keep=2)
+    assert ckpt_manager.restore_context() is None
+
+    key = random.PRNGKey(3)
+    for step in (10, 20):
+        context = {"step": step, "sampler": {"key": key, "offset": step // 10}}
+        ckpt_manager.save(_replicated_state(step), step=step, context=context)
+    ckpt_manager.wait()
+
+    # A new run in the same directory continues from the latest checkpoint
+    ckpt_manager = CheckpointManager(str(tmp_path), keep=2)
+    context = ckpt_manager.restore_context()
+    assert context["step"] == 20
+    assert context["sampler"]["offset"] == 2
+    assert jnp.array_equal(context["sampler"]["key"], key)
+
+    state = ckpt_manager.restore(_replicated_state(0), step=context["step"])
+    assert jnp.array_equal(state["params"][0], jnp.full(3, 20.0))
+
+    earlier = ckpt_manager.restore(_replicated_state(0), step=10)
+    assert jnp.array_equal(earlier["params"][0], jnp.full(3, 10.0))
+    assert ckpt_manager.restore_context(step=10)["step"] == 10